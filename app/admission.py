@@ -0,0 +1,210 @@
+# admission.py
+
+import threading
+import time
+import logging
+from kombu.exceptions import OperationalError
+from redis.exceptions import RedisError
+from app.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# What a failed publish looks like from kombu/redis-py, as opposed to a bug in the caller
+BROKER_ERRORS = (OperationalError, RedisError, ConnectionError, TimeoutError)
+
+
+class Rejection:
+    """Why a request was not admitted: HTTP status, a short reason and Retry-After seconds."""
+
+    def __init__(self, status, reason, retry_after):
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class BrokerUnavailable(Exception):
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Fails broker publishes fast once the broker has failed repeatedly.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and calls
+    raise BrokerUnavailable immediately for ``reset_timeout`` seconds. Then one
+    trial call is let through: success closes the circuit, failure reopens it.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=10.0, errors=BROKER_ERRORS, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.errors = errors
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state(self._clock())
+
+    def _state(self, now):
+        if self._opened_at is None:
+            return self.CLOSED
+        if now - self._opened_at < self.reset_timeout:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def _retry_after(self, now):
+        return max(self.reset_timeout - (now - self._opened_at), 1.0)
+
+    def _before_call(self):
+        with self._lock:
+            now = self._clock()
+            state = self._state(now)
+            if state == self.OPEN or (state == self.HALF_OPEN and self._trial_running):
+                raise BrokerUnavailable("Broker unavailable", self._retry_after(now))
+            if state == self.HALF_OPEN:
+                self._trial_running = True
+
+    def _on_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info("Broker circuit closed")
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def _on_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning("Broker circuit opened after %d failures", self._failures)
+                self._opened_at = self._clock()
+
+    def call(self, fn, *args, **kwargs):
+        self._before_call()
+        try:
+            result = fn(*args, **kwargs)
+        except self.errors as e:
+            self._on_failure()
+            raise BrokerUnavailable(f"Broker unavailable: {e}", self.reset_timeout) from e
+        except BaseException:
+            # Not a broker failure, but a half-open trial must not stay claimed
+            with self._lock:
+                self._trial_running = False
+            raise
+        self._on_success()
+        return result
+
+
+class AdmissionController:
+    """Sheds load when the broker is backed up, slow or short of memory.
+
+    Queue depth, broker memory and round-trip latency are sampled from Redis at
+    most once per ``sample_interval`` seconds; only one thread refreshes while
+    the others keep using the cached sample. A full queue answers 429 so callers
+    back off; a slow or memory-starved broker answers 503. Lower priority
+    queues are shed first: each queue's depth limit is ``max_depth`` times its
+    entry in ``priority_factors``. A failed sample counts against ``breaker``.
+    """
+
+    def __init__(self, redis, queues, max_depth=100000, max_latency=0.25, max_memory=0, max_memory_ratio=0.9,
+                 priority_factors=None, sample_interval=1.0, retry_after=5, breaker=None, clock=time.monotonic):
+        self.redis = redis
+        self.queues = tuple(queues)
+        self.max_depth = max_depth
+        self.max_latency = max_latency
+        self.max_memory = max_memory
+        self.max_memory_ratio = max_memory_ratio
+        self.priority_factors = priority_factors or {}
+        self.sample_interval = sample_interval
+        self.retry_after = retry_after
+        self.breaker = breaker
+        self._clock = clock
+        self._refresh_lock = threading.Lock()
+        self._sample = None
+        self._sampled_at = None
+
+    def _read(self):
+        started = time.perf_counter()
+        with self.redis.pipeline(transaction=False) as pipe:
+            for queue in self.queues:
+                pipe.llen(queue)
+            pipe.info('memory')
+            *depths, memory = pipe.execute()
+        latency = time.perf_counter() - started
+        return {
+            'depth': sum(depths),
+            'latency': latency,
+            'used_memory': memory.get('used_memory', 0),
+            'maxmemory': memory.get('maxmemory', 0),
+        }
+
+    def sample(self):
+        """The cached sample, refreshed if older than ``sample_interval``; None if never read."""
+        now = self._clock()
+        stale = self._sampled_at is None or now - self._sampled_at >= self.sample_interval
+        if stale and self._refresh_lock.acquire(blocking=False):
+            try:
+                call = self.breaker.call if self.breaker is not None else (lambda fn: fn())
+                self._sample = call(self._read)
+            except BrokerUnavailable:
+                self._sample = None
+            finally:
+                self._sampled_at = now
+                self._refresh_lock.release()
+        return self._sample
+
+    def check(self, queue=None):
+        """None if a request for ``queue`` may be published, else a Rejection."""
+        if self.breaker is not None and self.breaker.state == CircuitBreaker.OPEN:
+            return Rejection(503, 'broker_unavailable', self.breaker.reset_timeout)
+        sample = self.sample()
+        if sample is None:
+            return None
+        if sample['latency'] > self.max_latency:
+            return Rejection(503, 'broker_latency', self.retry_after)
+        memory_limit = self.max_memory
+        if sample['maxmemory']:
+            ratio_limit = sample['maxmemory'] * self.max_memory_ratio
+            memory_limit = min(memory_limit, ratio_limit) if memory_limit else ratio_limit
+        if memory_limit and sample['used_memory'] > memory_limit:
+            return Rejection(503, 'broker_memory', self.retry_after)
+        if sample['depth'] > self.max_depth * self.priority_factors.get(queue, 1.0):
+            return Rejection(429, 'queue_depth', self.retry_after)
+        return None
+
+
+def init_admission(app):
+    breaker = CircuitBreaker(
+        failure_threshold=app.config['BROKER_BREAKER_THRESHOLD'],
+        reset_timeout=app.config['BROKER_BREAKER_RESET_TIMEOUT'],
+    )
+    controller = None
+    url = app.config['BROKER_STATS_REDIS_URL']
+    if app.config['ADMISSION_ENABLED'] and url:
+        controller = AdmissionController(
+            get_redis(url),
+            app.config['TASK_PRIORITIES'],
+            max_depth=app.config['ADMISSION_MAX_QUEUE_DEPTH'],
+            max_latency=app.config['ADMISSION_MAX_BROKER_LATENCY'],
+            max_memory=app.config['ADMISSION_MAX_BROKER_MEMORY'],
+            max_memory_ratio=app.config['ADMISSION_MAX_BROKER_MEMORY_RATIO'],
+            priority_factors=app.config['ADMISSION_PRIORITY_FACTORS'],
+            sample_interval=app.config['ADMISSION_SAMPLE_INTERVAL'],
+            retry_after=app.config['ADMISSION_RETRY_AFTER'],
+            breaker=breaker,
+        )
+    app.extensions['publish_breaker'] = breaker
+    app.extensions['admission'] = controller
+    return controller
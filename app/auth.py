@@ -1,16 +1,34 @@
-import os
 from functools import wraps
-from flask import request, jsonify
+from flask import request, jsonify, make_response, current_app, g
+from app.metrics import stage, record_auth_failure, record_rate_limited
+
+def is_valid_api_key(api_key):
+    return current_app.extensions['api_key_store'].is_valid(api_key)
 
 def api_key_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         api_key = request.headers.get("x-api-key")
         if not api_key:
-            return jsonify({"error": "API key is missing"}), 400
+            record_auth_failure('missing')
+            return make_response(jsonify({"error": "API key is missing"}), 400)
+
+        with stage('auth'):
+            valid = is_valid_api_key(api_key)
+        if not valid:
+            record_auth_failure('invalid')
+            return make_response(jsonify({"error": "Invalid API key"}), 403)
 
-        if not os.path.isdir(f"./app/api_keys/{api_key}"):
-            return jsonify({"error": "Invalid API key"}), 403
+        limiter = current_app.extensions['rate_limiter']
+        if limiter is not None:
+            with stage('rate_limit'):
+                decision = limiter.check(api_key, request.endpoint)
+            if decision is not None:
+                # Headers are added to whatever response is sent, see init_rate_limiter
+                g.rate_limit = decision
+                if not decision.allowed:
+                    record_rate_limited()
+                    return make_response(jsonify({"error": "Rate limit exceeded"}), 429)
 
         return f(*args, **kwargs)
 
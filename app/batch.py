@@ -0,0 +1,72 @@
+# batch.py
+
+import logging
+from celery import group
+from app.admission import BrokerUnavailable
+from app.key_store import new_task_id
+from app.streaming import StreamParseError
+from app.tasks import process_task
+from app.validation import LENIENT, normalize
+
+logger = logging.getLogger(__name__)
+
+
+class BatchTooLarge(ValueError):
+    pass
+
+
+def _enqueue(chunk, queue, tenant, breaker, schema_version):
+    # One group publish per chunk: every message goes out over a single producer connection
+    signature = group(process_task.s(data, tenant=tenant).set(task_id=new_task_id(tenant)) for _, data in chunk)
+    options = {'queue': queue, 'headers': {'schema_version': schema_version}}
+    if breaker is None:
+        result = signature.apply_async(**options)
+    else:
+        result = breaker.call(signature.apply_async, **options)
+    return [{"index": index, "task_id": task.id} for (index, _), task in zip(chunk, result.results)]
+
+
+def submit_batch(items, compiled_schema, max_items, chunk_size, mode=LENIENT, queue=None, tenant=None,
+                 breaker=None):
+    """Validate ``(index, item)`` pairs and enqueue the valid ones in chunks.
+
+    Items are consumed lazily, so at most ``chunk_size`` validated payloads are held
+    before they are published. ``mode`` is the validation mode (see
+    app.validation.normalize). Tasks are published to ``queue`` on behalf of
+    ``tenant``, through ``breaker`` when given. Returns the accepted tasks and the
+    per-item errors. Raises StreamParseError for malformed input, BatchTooLarge
+    past ``max_items`` and BrokerUnavailable when a publish fails; all carry the
+    tasks already published in ``tasks``.
+    """
+    tasks = []
+    errors = []
+    chunk = []
+
+    try:
+        for index, item in items:
+            if index >= max_items:
+                raise BatchTooLarge(f"Batch exceeds the maximum of {max_items} items")
+            if isinstance(item, StreamParseError):
+                errors.append({"index": index, "error": [str(item)]})
+                continue
+
+            item_errors, payload, _ = normalize(compiled_schema, item, mode)
+            if item_errors:
+                errors.append({"index": index, "error": item_errors})
+                continue
+
+            # The batch is routed as a whole, so a per-item priority is dropped
+            payload.pop('priority', None)
+            chunk.append((index, payload))
+            if len(chunk) >= chunk_size:
+                tasks.extend(_enqueue(chunk, queue, tenant, breaker, compiled_schema.version))
+                chunk = []
+        if chunk:
+            tasks.extend(_enqueue(chunk, queue, tenant, breaker, compiled_schema.version))
+    except (StreamParseError, BatchTooLarge, BrokerUnavailable) as e:
+        # Chunks already published stay queued; the pending chunk is dropped
+        e.tasks = tasks
+        raise
+
+    logger.debug("Batch accepted %d items, rejected %d", len(tasks), len(errors))
+    return {"tasks": tasks, "errors": errors, "accepted": len(tasks), "rejected": len(errors)}
@@ -1,16 +1,128 @@
+import os
 from celery import Celery, Task
+from celery.signals import worker_process_init
+from flask import has_app_context
+from kombu import Queue
+from app.config import Config
+from app.json_codec import set_backend
+from app.queues import weighted_cycle
 
-celery = Celery(__name__)
+# Flask config keys and the Celery settings they are copied to
+CELERY_SETTINGS = {
+    'CELERY_BROKER_URL': 'broker_url',
+    'CELERY_RESULT_BACKEND': 'result_backend',
+    'CELERY_ALWAYS_EAGER': 'task_always_eager',
+    'CELERY_STORE_EAGER_RESULT': 'task_store_eager_result',
+    'CELERY_TASK_SERIALIZER': 'task_serializer',
+    'CELERY_RESULT_SERIALIZER': 'result_serializer',
+    'CELERY_TASK_COMPRESSION': 'task_compression',
+    'CELERY_RESULT_COMPRESSION': 'result_compression',
+    'CELERY_BROKER_CONNECTION_TIMEOUT': 'broker_connection_timeout',
+    'CELERY_TASK_PUBLISH_RETRY_POLICY': 'task_publish_retry_policy',
+    'CELERY_BROKER_POOL_LIMIT': 'broker_pool_limit',
+    'CELERY_REDIS_MAX_CONNECTIONS': 'redis_max_connections',
+    'CELERY_TASK_IGNORE_RESULT': 'task_ignore_result',
+}
+CELERY_SHARED_KEYS = (
+    'CELERY_TASK_SERIALIZER', 'CELERY_RESULT_SERIALIZER', 'CELERY_TASK_COMPRESSION', 'CELERY_RESULT_COMPRESSION',
+    'CELERY_TASK_IGNORE_RESULT', 'CELERY_REDIS_MAX_CONNECTIONS',
+)
+SHARED_KEYS = CELERY_SHARED_KEYS + ('JSON_BACKEND', 'TASK_PRIORITIES', 'TASK_QUEUE_WEIGHTS', 'TASK_DEFAULT_PRIORITY',
+                                    'BROKER_SOCKET_TIMEOUT', 'REDIS_SOCKET_KEEPALIVE', 'REDIS_HEALTH_CHECK_INTERVAL')
+
+def shared_settings(config):
+    """Settings the web app and the worker must agree on: serializers, result storage,
+    priority queues and broker connections."""
+    set_backend(config['JSON_BACKEND'])
+    settings = {CELERY_SETTINGS[key]: config[key] for key in CELERY_SHARED_KEYS}
+    accept = sorted({'json', settings['task_serializer'], settings['result_serializer']})
+    settings.update(
+        accept_content=accept,
+        result_accept_content=accept,
+        task_queues=[Queue(name) for name in config['TASK_PRIORITIES']],
+        task_default_queue=config['TASK_DEFAULT_PRIORITY'],
+        broker_transport_options={
+            'queue_order_strategy': weighted_cycle(config['TASK_QUEUE_WEIGHTS']),
+            'socket_timeout': config['BROKER_SOCKET_TIMEOUT'],
+            'socket_connect_timeout': config['BROKER_SOCKET_TIMEOUT'],
+            'socket_keepalive': config['REDIS_SOCKET_KEEPALIVE'],
+            'health_check_interval': config['REDIS_HEALTH_CHECK_INTERVAL'],
+        },
+        redis_socket_timeout=config['BROKER_SOCKET_TIMEOUT'],
+        redis_socket_connect_timeout=config['BROKER_SOCKET_TIMEOUT'],
+        redis_socket_keepalive=config['REDIS_SOCKET_KEEPALIVE'],
+        redis_backend_health_check_interval=config['REDIS_HEALTH_CHECK_INTERVAL'],
+    )
+    return settings
 
 class ContextTask(Task):
+    """Runs tasks in the Flask app's context, pushing one only when none is active.
+
+    The web app binds itself through init_celery. A worker has no app until it
+    builds a slim one (app.worker_app) in each pool process, or on the first task
+    that needs it. With WORKER_APP_CONTEXT = 'process' that app's context stays
+    pushed for the life of the pool process, with flask.g emptied before each
+    task; request contexts around eager calls are reused as they are. Tasks that
+    never touch Flask state can opt out with ``flask_context=False``.
+    """
+
+    flask_app = None
+    # Set per task, e.g. @celery.task(flask_context=False)
+    flask_context = True
+
+    def in_app_context(self, fn, *args, **kwargs):
+        """``fn(*args, **kwargs)`` in the Flask app context, as the task body runs."""
+        if not self.flask_context:
+            return fn(*args, **kwargs)
+        if _worker_context is not None:
+            # Nothing a task leaves on flask.g reaches the next one
+            _worker_context.g = _worker_context.app.app_ctx_globals_class()
+        if has_app_context():
+            return fn(*args, **kwargs)
+        with (self.flask_app or init_worker_app()).app_context():
+            return fn(*args, **kwargs)
+
     def __call__(self, *args, **kwargs):
-        with self.app.app_context():
-            return self.run(*args, **kwargs)
+        return self.in_app_context(self.run, *args, **kwargs)
+
+# The app context a worker pool process keeps pushed (WORKER_APP_CONTEXT = 'process')
+_worker_context = None
+
+# ContextTask is the base from the start, so tasks finalized before init_celery still get it
+celery = Celery(__name__, task_cls=ContextTask)
+# The worker never calls init_celery, so it takes these settings from Config here
+celery.conf.update(shared_settings({key: getattr(Config, key) for key in SHARED_KEYS}))
+if Config.TASK_BATCH_SIZE > 1:
+    # Batches fill from the messages a worker has reserved (see app.task_batching)
+    celery.conf.worker_prefetch_multiplier = max(celery.conf.worker_prefetch_multiplier, Config.TASK_BATCH_SIZE)
 
 def init_celery(app):
-    celery.conf.update(app.config)
-    celery.conf.broker_url = app.config['CELERY_BROKER_URL']
-    celery.conf.result_backend = app.config['CELERY_RESULT_BACKEND']
+    # Only the keys in CELERY_SETTINGS are Celery's; old-style CELERY_* names (e.g.
+    # CELERY_ALWAYS_EAGER) can't be mixed with lowercase settings, so they are translated
+    celery.conf.update({new: app.config[old] for old, new in CELERY_SETTINGS.items() if old in app.config})
+    celery.conf.update(shared_settings(app.config))
     celery.autodiscover_tasks(['app.main'])
-    celery.Task = ContextTask
-    celery.Task.app = app  # Bind Flask app to the ContextTask
+    # Bind Flask app to the ContextTask; Task.app is the Celery app and is set per task
+    ContextTask.flask_app = app
+
+def init_worker_app():
+    """Create the worker's Flask app, once per process, unless one is already bound.
+
+    With WORKER_APP_CONTEXT = 'process' its app context is pushed for good, so
+    tasks skip pushing their own and only get a fresh flask.g.
+    """
+    global _worker_context
+    if ContextTask.flask_app is not None:
+        return ContextTask.flask_app
+    # app.worker_app imports this module
+    from app.worker_app import create_worker_app
+    app = create_worker_app(os.environ.get('FLASK_CONFIG', 'app.config.ProductionConfig'))
+    if app.config['WORKER_APP_CONTEXT'] == 'process':
+        _worker_context = app.app_context()
+        _worker_context.push()
+    return app
+
+@worker_process_init.connect
+def on_worker_process_init(**kwargs):
+    # Sent in each prefork child, and by the solo pool in the worker itself
+    init_worker_app()
@@ -1,16 +1,182 @@
+import json
 import os
 
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'you-will-never-guess'
-    CELERY_BROKER_URL = 'redis://redis:6379/0'
-    CELERY_RESULT_BACKEND = 'redis://redis:6379/0'
+    # Broker, task results and the app's own keys (idempotency, rate limits, tenant slots,
+    # webhook dead letters) live in separate Redis DBs so they can be moved to separate
+    # instances and flushed alone
+    CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL') or 'redis://redis:6379/0'
+    CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND') or 'redis://redis:6379/1'
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL') or 'redis://redis:6379/2'
+    # Connections per process for the app's Redis clients; callers wait up to
+    # REDIS_POOL_TIMEOUT seconds for a free one. Idle connections are pinged before
+    # reuse once they are REDIS_HEALTH_CHECK_INTERVAL seconds old.
+    REDIS_MAX_CONNECTIONS = int(os.environ.get('REDIS_MAX_CONNECTIONS', 20))
+    REDIS_POOL_TIMEOUT = float(os.environ.get('REDIS_POOL_TIMEOUT', 5))
+    REDIS_SOCKET_TIMEOUT = float(os.environ.get('REDIS_SOCKET_TIMEOUT', 5))
+    REDIS_SOCKET_KEEPALIVE = True
+    REDIS_HEALTH_CHECK_INTERVAL = int(os.environ.get('REDIS_HEALTH_CHECK_INTERVAL', 30))
+    # Broker connections each process keeps for publishing (Celery's producer pool;
+    # 0 opens a connection per publish), and result backend connections
+    CELERY_BROKER_POOL_LIMIT = int(os.environ.get('CELERY_BROKER_POOL_LIMIT', 10))
+    CELERY_REDIS_MAX_CONNECTIONS = int(os.environ.get('CELERY_REDIS_MAX_CONNECTIONS', 20))
+    # Don't store task results, for callers that only use webhooks; the status
+    # endpoints then report PENDING. The worker reads this too.
+    CELERY_TASK_IGNORE_RESULT = os.environ.get('CELERY_TASK_IGNORE_RESULT', 'false').lower() == 'true'
+    CELERY_ALWAYS_EAGER = False
+    CELERY_STORE_EAGER_RESULT = False
+    # 'fastjson' uses JSON_BACKEND; 'json' is kombu's stdlib codec and 'msgpack' needs msgpack
+    # installed. The worker reads these too, so change them through the environment.
+    CELERY_TASK_SERIALIZER = os.environ.get('CELERY_TASK_SERIALIZER', 'fastjson')
+    CELERY_RESULT_SERIALIZER = os.environ.get('CELERY_RESULT_SERIALIZER', 'fastjson')
+    CELERY_TASK_COMPRESSION = os.environ.get('CELERY_TASK_COMPRESSION')  # e.g. 'gzip', 'zlib'
+    CELERY_RESULT_COMPRESSION = os.environ.get('CELERY_RESULT_COMPRESSION')
+    # 'auto' uses orjson when installed and falls back to the stdlib json module
+    JSON_BACKEND = os.environ.get('JSON_BACKEND', 'auto')
+    OUTPUT_DIR = os.environ.get('OUTPUT_DIR') or './output'
+    API_KEYS_DIR = os.environ.get('API_KEYS_DIR') or os.path.join(OUTPUT_DIR, 'api_keys')
+    # Task results over RESULT_INLINE_MAX_BYTES go to files under RESULT_DIR instead of
+    # the result backend; the status API links them as RESULT_BASE_URL + task id, an
+    # endpoint that only serves them to the API key that owns the task
+    RESULT_DIR = os.environ.get('RESULT_DIR') or os.path.join(OUTPUT_DIR, 'results')
+    RESULT_BASE_URL = os.environ.get('RESULT_BASE_URL') or '/process/results/'
+    # nginx internal location over RESULT_DIR; the endpoint hands files to it with
+    # X-Accel-Redirect. Empty to send them from the app instead
+    RESULT_ACCEL_REDIRECT = os.environ.get('RESULT_ACCEL_REDIRECT', '/files/results/')
+    RESULT_INLINE_MAX_BYTES = int(os.environ.get('RESULT_INLINE_MAX_BYTES', 65536))
+    # Result files are deleted this long after they are written, matching Celery's result_expires
+    RESULT_FILE_TTL = int(os.environ.get('RESULT_FILE_TTL', 86400))
+    # Seconds between sweeps in each worker node; 0 disables the sweeper
+    RESULT_SWEEP_INTERVAL = int(os.environ.get('RESULT_SWEEP_INTERVAL', 600))
+    API_KEY_REFRESH_INTERVAL = float(os.environ.get('API_KEY_REFRESH_INTERVAL', 5))
+    API_KEY_NEGATIVE_TTL = float(os.environ.get('API_KEY_NEGATIVE_TTL', 30))
+    API_KEY_NEGATIVE_CACHE_SIZE = 10000
+    # Bodies over this many bytes get a 413 before they are read; Flask enforces it
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_BODY_BYTES', 1024 ** 3))
+    # Deepest nesting of objects and arrays accepted in a request body
+    JSON_MAX_DEPTH = int(os.environ.get('JSON_MAX_DEPTH', 32))
+    # Single requests at least this large (or chunked) are parsed as they arrive
+    # when their schema has arrays of objects; smaller ones are read whole
+    STREAMING_MIN_BYTES = int(os.environ.get('STREAMING_MIN_BYTES', 1024 * 1024))
+    # Longest single item (array element or NDJSON line) a streamed body may hold, in
+    # characters of JSON text; bigger ones are rejected before they are fully buffered
+    STREAM_MAX_ITEM_SIZE = int(os.environ.get('STREAM_MAX_ITEM_SIZE', 8 * 1024 * 1024))
+    BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', 100000))
+    BATCH_ENQUEUE_CHUNK_SIZE = int(os.environ.get('BATCH_ENQUEUE_CHUNK_SIZE', 500))
+    # Worker side: with TASK_BATCH_SIZE over 1, process_task messages are run in batches
+    # of up to that many, a partial batch waiting at most TASK_BATCH_INTERVAL seconds
+    TASK_BATCH_SIZE = int(os.environ.get('TASK_BATCH_SIZE', 1))
+    TASK_BATCH_INTERVAL = float(os.environ.get('TASK_BATCH_INTERVAL', 0.05))
+    # Worker side: 'process' keeps one app context pushed in each pool process; 'task'
+    # pushes a fresh one per task, so nothing set on flask.g carries over between tasks
+    WORKER_APP_CONTEXT = os.environ.get('WORKER_APP_CONTEXT', 'process')
+    STATUS_MAX_WAIT = int(os.environ.get('STATUS_MAX_WAIT', 30))
+    STATUS_BULK_MAX_IDS = 1000
+    STATUS_CACHE_SIZE = 10000
+    # Priority queues in order, and how often each is polled first (see queues.WeightedCycle)
+    TASK_PRIORITIES = ('high', 'normal', 'low')
+    TASK_QUEUE_WEIGHTS = {'high': 6, 'normal': 3, 'low': 1}
+    TASK_DEFAULT_PRIORITY = 'normal'
+    BATCH_PRIORITY = 'low'
+    # Tenant id (key_store.tenant_id of the API key) -> tier, e.g. API_KEY_TIERS='{"3f2a9c0d1e4b5a6f": "premium"}',
+    # so raw keys never go in config; a tier caps the priority its keys get
+    API_KEY_TIERS = json.loads(os.environ.get('API_KEY_TIERS', '{}'))
+    DEFAULT_TIER = 'standard'
+    TIER_PRIORITIES = {'premium': 'high', 'standard': 'normal', 'bulk': 'low'}
+    # Tasks of one API key running at once across all workers; 0 disables the cap
+    TENANT_MAX_CONCURRENCY = int(os.environ.get('TENANT_MAX_CONCURRENCY', 4))
+    TENANT_SLOT_LEASE = 600
+    # A task over the cap is retried after TENANT_RETRY_DELAY seconds, doubling per retry up
+    # to TENANT_RETRY_MAX_DELAY, and fails once it has been retried TENANT_MAX_RETRIES times
+    TENANT_RETRY_DELAY = 1.0
+    TENANT_RETRY_MAX_DELAY = float(os.environ.get('TENANT_RETRY_MAX_DELAY', 60))
+    TENANT_MAX_RETRIES = int(os.environ.get('TENANT_MAX_RETRIES', 30))
+    # Tenant slots and per-tenant queued counts
+    QUEUE_REDIS_URL = os.environ.get('QUEUE_REDIS_URL') or CACHE_REDIS_URL
+    # Only read from, never written: queue depths (its lists) and memory for the
+    # celery_queue_depth gauge and load shedding. Must be the broker's DB
+    BROKER_STATS_REDIS_URL = os.environ.get('BROKER_STATS_REDIS_URL') or CELERY_BROKER_URL
+    # Load shedding: the broker is sampled at most every ADMISSION_SAMPLE_INTERVAL seconds.
+    # Queued messages over ADMISSION_MAX_QUEUE_DEPTH (scaled per priority) answer 429; a broker
+    # slower than ADMISSION_MAX_BROKER_LATENCY seconds or over its memory limit answers 503.
+    # ADMISSION_MAX_BROKER_MEMORY is in bytes (0 = none); the ratio applies when Redis has maxmemory.
+    # The broker is read through BROKER_STATS_REDIS_URL.
+    ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', 'true').lower() == 'true'
+    ADMISSION_SAMPLE_INTERVAL = float(os.environ.get('ADMISSION_SAMPLE_INTERVAL', 1.0))
+    ADMISSION_MAX_QUEUE_DEPTH = int(os.environ.get('ADMISSION_MAX_QUEUE_DEPTH', 1000000))
+    ADMISSION_PRIORITY_FACTORS = {'high': 1.0, 'normal': 0.8, 'low': 0.5}
+    ADMISSION_MAX_BROKER_LATENCY = float(os.environ.get('ADMISSION_MAX_BROKER_LATENCY', 0.5))
+    ADMISSION_MAX_BROKER_MEMORY = int(os.environ.get('ADMISSION_MAX_BROKER_MEMORY', 0))
+    ADMISSION_MAX_BROKER_MEMORY_RATIO = float(os.environ.get('ADMISSION_MAX_BROKER_MEMORY_RATIO', 0.9))
+    ADMISSION_RETRY_AFTER = int(os.environ.get('ADMISSION_RETRY_AFTER', 5))
+    # Consecutive failed publishes that open the broker circuit, and seconds before it is retried
+    BROKER_BREAKER_THRESHOLD = int(os.environ.get('BROKER_BREAKER_THRESHOLD', 5))
+    BROKER_BREAKER_RESET_TIMEOUT = float(os.environ.get('BROKER_BREAKER_RESET_TIMEOUT', 10))
+    # Keep a publish to a dead broker from holding a web worker for kombu's defaults
+    BROKER_SOCKET_TIMEOUT = float(os.environ.get('BROKER_SOCKET_TIMEOUT', 5))
+    CELERY_BROKER_CONNECTION_TIMEOUT = float(os.environ.get('CELERY_BROKER_CONNECTION_TIMEOUT', 2))
+    CELERY_TASK_PUBLISH_RETRY_POLICY = {'max_retries': 1, 'interval_start': 0, 'interval_step': 0.2}
+    # Duplicate requests (same Idempotency-Key, or same payload without one) within
+    # IDEMPOTENCY_TTL seconds return the first task instead of enqueueing again
+    IDEMPOTENCY_REDIS_URL = os.environ.get('IDEMPOTENCY_REDIS_URL') or CACHE_REDIS_URL
+    IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', 86400))
+    # Requests without the header are only deduped by payload for this long; 0 disables that
+    IDEMPOTENCY_PAYLOAD_TTL = int(os.environ.get('IDEMPOTENCY_PAYLOAD_TTL', 300))
+    # How long a worker's claim on a running task blocks a redelivered copy of it
+    IDEMPOTENCY_TASK_TTL = int(os.environ.get('IDEMPOTENCY_TASK_TTL', 3600))
+    IDEMPOTENCY_LOCAL_CACHE_SIZE = 10000
+    # Token-bucket limits per API key, keyed by Flask endpoint name with a 'default'
+    # fallback; every limit listed for an endpoint applies. Formats: N/second|minute|hour|day
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    RATE_LIMIT_REDIS_URL = os.environ.get('RATE_LIMIT_REDIS_URL') or CACHE_REDIS_URL
+    RATE_LIMITS = {
+        'default': ['50/second', '1000000/day'],
+        'process_process_request_batch': ['2/second', '10000/day'],
+    }
+    # Tokens each process takes from Redis per round trip, and how long it may hold them
+    RATE_LIMIT_LEASE_SIZE = int(os.environ.get('RATE_LIMIT_LEASE_SIZE', 10))
+    RATE_LIMIT_LEASE_TTL = float(os.environ.get('RATE_LIMIT_LEASE_TTL', 1.0))
+    # 'lenient' strips properties the schema does not declare, 'strict' rejects them;
+    # VALIDATION_MODES overrides the default per route, e.g. {'process_request_batch': 'strict'}
+    VALIDATION_MODE = os.environ.get('VALIDATION_MODE', 'lenient')
+    VALIDATION_MODES = {}
+    # Seconds between checks of app/json_schemas for changed files (0 disables hot
+    # reload), and how many versions of each schema are kept for in-flight work
+    SCHEMA_RELOAD_INTERVAL = float(os.environ.get('SCHEMA_RELOAD_INTERVAL', 2.0))
+    SCHEMA_KEEP_VERSIONS = int(os.environ.get('SCHEMA_KEEP_VERSIONS', 5))
+    # Schemas are compiled to Python validators (see schema_compiler)
+    SCHEMA_COMPILE = os.environ.get('SCHEMA_COMPILE', 'true').lower() == 'true'
+    WEBHOOK_URL = os.environ.get('WEBHOOK_URL')
+    WEBHOOK_TIMEOUT = float(os.environ.get('WEBHOOK_TIMEOUT', 10))
+    WEBHOOK_MAX_RETRIES = int(os.environ.get('WEBHOOK_MAX_RETRIES', 5))
+    WEBHOOK_BACKOFF_BASE = 0.5
+    WEBHOOK_BACKOFF_MAX = 30.0
+    WEBHOOK_MAX_PER_HOST = int(os.environ.get('WEBHOOK_MAX_PER_HOST', 10))
+    WEBHOOK_POOL_MAXSIZE = 20
+    WEBHOOK_DLQ_URL = os.environ.get('WEBHOOK_DLQ_URL') or CACHE_REDIS_URL
+    WEBHOOK_DLQ_KEY = 'webhooks:dead_letter'
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')
+    # Fraction of request payloads written to the debug log, with LOG_REDACT_FIELDS masked
+    LOG_PAYLOAD_SAMPLE_RATE = float(os.environ.get('LOG_PAYLOAD_SAMPLE_RATE', 0))
+    LOG_REDACT_FIELDS = ('password', 'token', 'secret', 'api_key', 'x-api-key')
 
 class DevelopmentConfig(Config):
     DEBUG = True
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'DEBUG').upper()
+    LOG_PAYLOAD_SAMPLE_RATE = float(os.environ.get('LOG_PAYLOAD_SAMPLE_RATE', 1))
 
 class TestingConfig(Config):
     TESTING = True
     CELERY_ALWAYS_EAGER = True
+    CELERY_STORE_EAGER_RESULT = True
+    CELERY_RESULT_BACKEND = 'cache+memory://'
+    WEBHOOK_DLQ_URL = None
+    IDEMPOTENCY_REDIS_URL = None
+    RATE_LIMIT_REDIS_URL = None
+    QUEUE_REDIS_URL = None
+    BROKER_STATS_REDIS_URL = None
 
 class ProductionConfig(Config):
     DEBUG = False
@@ -0,0 +1,50 @@
+# gunicorn.conf.py
+#
+# Production serving settings for app.wsgi:app. Every value can be overridden
+# from the environment so the same image can be sized per deployment.
+#
+# Graceful reload: `kill -HUP <master pid>` starts new workers and lets the old
+# ones finish in-flight requests (up to graceful_timeout). With preload_app the
+# master holds the app, so code changes need `kill -USR2` (binary upgrade)
+# followed by `kill -WINCH`/`kill -QUIT` on the old master.
+
+import multiprocessing
+import os
+
+bind = os.environ.get('WEB_BIND', '0.0.0.0:5000')
+
+# gthread workers keep connections alive between requests; sync workers don't
+worker_class = os.environ.get('WEB_WORKER_CLASS', 'gthread')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('WEB_THREADS', 4))
+
+# Build the app once before forking. Broker, result backend and Redis
+# connections are opened lazily and per process, so nothing is shared.
+preload_app = os.environ.get('WEB_PRELOAD', 'true').lower() in ('1', 'true', 'yes')
+
+# Must outlive nginx's upstream keepalive_timeout (60s in nginx/nginx.conf) so
+# nginx, not gunicorn, closes idle upstream connections
+keepalive = int(os.environ.get('WEB_KEEPALIVE', 75))
+timeout = int(os.environ.get('WEB_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30))
+
+# Recycle workers periodically to bound memory growth
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.environ.get('WEB_MAX_REQUESTS_JITTER', 1000))
+
+accesslog = os.environ.get('WEB_ACCESS_LOG', None)
+errorlog = '-'
+loglevel = os.environ.get('WEB_LOG_LEVEL', 'info')
+
+
+# With PROMETHEUS_MULTIPROC_DIR set, every worker writes its metrics to files
+# there and /metrics aggregates them; stale files are cleared at startup and a
+# worker's live gauges are dropped when it exits.
+def on_starting(server):
+    from app.metrics import clear_multiprocess_dir
+    clear_multiprocess_dir()
+
+
+def child_exit(server, worker):
+    from app.metrics import mark_process_dead
+    mark_process_dead(worker.pid)
@@ -0,0 +1,174 @@
+# idempotency.py
+
+import hashlib
+import threading
+import time
+import logging
+from collections import OrderedDict
+from redis.exceptions import RedisError
+from app import json_codec
+from app.key_store import tenant_id
+from app.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+_RUNNING = b'running'
+_DONE = b'done'
+
+
+class IdempotencyConflict(ValueError):
+    """An Idempotency-Key was reused with a different payload."""
+
+
+def _hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def payload_fingerprint(payload):
+    """Hash of the canonical (sorted-key) JSON encoding of ``payload``."""
+    return _hash(json_codec.dumps(payload, sort_keys=True))
+
+
+def request_key(api_key, idempotency_key, fingerprint):
+    """Dedup key for a request, scoped to the caller's API key.
+
+    Uses the client's Idempotency-Key when given, otherwise the payload fingerprint.
+    """
+    scope = tenant_id(api_key) if api_key else 'anonymous'
+    if idempotency_key:
+        return f'{scope}:key:{idempotency_key}'
+    return f'{scope}:body:{fingerprint}'
+
+
+class IdempotencyStore:
+    """Remembers which task each request key was enqueued as.
+
+    Redis ``SET NX EX`` makes the first claim win across every web process; a
+    small in-process LRU answers hot repeats without a round trip; its entries
+    live at most ``local_ttl`` seconds so a released key is not remembered for
+    long. Without a Redis client only the LRU is used, which dedupes within one
+    process. Redis errors fail open: the request is enqueued rather than rejected.
+    """
+
+    def __init__(self, redis=None, ttl=86400, task_ttl=3600, local_cache_size=10000, local_ttl=60,
+                 prefix='idempotency', clock=time.monotonic):
+        self.redis = redis
+        self.ttl = ttl
+        self.task_ttl = task_ttl
+        self.local_cache_size = local_cache_size
+        self.local_ttl = local_ttl
+        self.prefix = prefix
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._local = OrderedDict()
+
+    def _local_get(self, key):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires <= self._clock():
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            return value
+
+    def _local_set(self, key, value, ttl, only_if_missing=False):
+        if self.redis is not None:
+            ttl = min(ttl, self.local_ttl)
+        with self._lock:
+            entry = self._local.get(key)
+            if only_if_missing and entry is not None and entry[1] > self._clock():
+                return False
+            self._local[key] = (value, self._clock() + ttl)
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_cache_size:
+                self._local.popitem(last=False)
+            return True
+
+    def _local_delete(self, key):
+        with self._lock:
+            self._local.pop(key, None)
+
+    def _claim(self, key, value, ttl):
+        """Set ``key`` to ``value`` unless it exists; return None if claimed, else the existing value."""
+        existing = self._local_get(key)
+        if existing is not None:
+            return existing
+        if self.redis is None:
+            return None if self._local_set(key, value, ttl, only_if_missing=True) else self._local_get(key)
+        redis_key = f'{self.prefix}:{key}'
+        try:
+            # A second attempt covers the key expiring between SET and GET
+            for _ in range(2):
+                if self.redis.set(redis_key, value, nx=True, ex=ttl):
+                    self._local_set(key, value, ttl)
+                    return None
+                existing = self.redis.get(redis_key)
+                if existing is not None:
+                    self._local_set(key, existing, ttl)
+                    return existing
+        except RedisError:
+            logger.warning("Idempotency check skipped, Redis unavailable", exc_info=True)
+        return None
+
+    def _set(self, key, value, ttl):
+        self._local_set(key, value, ttl)
+        if self.redis is not None:
+            try:
+                self.redis.set(f'{self.prefix}:{key}', value, ex=ttl)
+            except RedisError:
+                logger.warning("Could not record idempotency key", exc_info=True)
+
+    def _delete(self, key):
+        self._local_delete(key)
+        if self.redis is not None:
+            try:
+                self.redis.delete(f'{self.prefix}:{key}')
+            except RedisError:
+                logger.warning("Could not release idempotency key", exc_info=True)
+
+    def claim_request(self, key, task_id, fingerprint, ttl=None):
+        """Reserve ``key`` for ``task_id`` for ``ttl`` seconds (default ``self.ttl``).
+
+        Returns None if this call claimed the key, or the task id it was first
+        enqueued as. Raises IdempotencyConflict if that request had another payload.
+        """
+        value = f'{task_id} {fingerprint}'.encode('ascii')
+        existing = self._claim(f'request:{key}', value, ttl or self.ttl)
+        if existing is None:
+            return None
+        existing_task_id, existing_fingerprint = existing.decode('ascii').split(' ', 1)
+        if existing_fingerprint != fingerprint:
+            raise IdempotencyConflict(f"{IDEMPOTENCY_HEADER} was already used with a different payload")
+        return existing_task_id
+
+    def release_request(self, key):
+        """Forget a claim whose task could not be enqueued, so a retry can enqueue it."""
+        self._delete(f'request:{key}')
+
+    def begin_task(self, task_id):
+        """Mark ``task_id`` as running; False if another delivery already ran or is running it."""
+        return self._claim(f'task:{task_id}', _RUNNING, self.task_ttl) is None
+
+    def finish_task(self, task_id):
+        self._set(f'task:{task_id}', _DONE, self.ttl)
+
+    def abandon_task(self, task_id):
+        """Drop the running mark after a failure so a redelivery can try again."""
+        self._delete(f'task:{task_id}')
+
+
+def init_idempotency(app):
+    url = app.config['IDEMPOTENCY_REDIS_URL']
+    store = IdempotencyStore(
+        redis=get_redis(url) if url else None,
+        ttl=app.config['IDEMPOTENCY_TTL'],
+        task_ttl=app.config['IDEMPOTENCY_TASK_TTL'],
+        local_cache_size=app.config['IDEMPOTENCY_LOCAL_CACHE_SIZE'],
+    )
+    app.extensions['idempotency'] = store
+    return store
@@ -0,0 +1,147 @@
+# json_codec.py
+
+import json
+import logging
+from flask.json.provider import DefaultJSONProvider
+from kombu.serialization import register
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+CELERY_SERIALIZER = 'fastjson'
+CELERY_CONTENT_TYPE = 'application/x-fastjson'
+
+
+class StdlibBackend:
+    name = 'stdlib'
+
+    def dumps(self, obj, default=None, sort_keys=False):
+        return json.dumps(
+            obj, default=default, sort_keys=sort_keys, ensure_ascii=False, separators=(',', ':')
+        ).encode('utf-8')
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class OrjsonBackend:
+    name = 'orjson'
+
+    def __init__(self):
+        self._fallback = StdlibBackend()
+
+    def dumps(self, obj, default=None, sort_keys=False):
+        option = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if default is not None:
+            # Let the caller's default format these, as the stdlib encoder would
+            option |= orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        try:
+            return orjson.dumps(obj, default=default, option=option)
+        except TypeError:
+            # orjson rejects integers wider than 64 bits and a few other edge cases
+            return self._fallback.dumps(obj, default=default, sort_keys=sort_keys)
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+
+def get_backend(name='auto'):
+    """Return the JSON backend called ``name``; ``auto`` picks orjson when it is installed."""
+    if name == 'auto':
+        name = 'orjson' if orjson is not None else 'stdlib'
+    if name == 'orjson':
+        if orjson is None:
+            raise ImportError("JSON_BACKEND is 'orjson' but orjson is not installed")
+        return OrjsonBackend()
+    if name == 'stdlib':
+        return StdlibBackend()
+    raise ValueError(f"Unknown JSON backend: {name}")
+
+
+_backend = None
+
+
+def dumps(obj, sort_keys=False):
+    return _backend.dumps(obj, sort_keys=sort_keys)
+
+
+def loads(data):
+    return _backend.loads(data)
+
+
+def iterdumps(obj):
+    """``dumps(obj)`` in pieces, one per top-level item of a dict or list.
+
+    Only one item is encoded at a time, so a large result can be written out
+    without holding all of its encoding in memory.
+    """
+    if isinstance(obj, dict):
+        yield b'{'
+        for index, item in enumerate(obj.items()):
+            # Encoded as a one-item dict so keys are converted exactly as dumps does
+            yield (b',' if index else b'') + _backend.dumps(dict((item,)))[1:-1]
+        yield b'}'
+    elif isinstance(obj, (list, tuple)):
+        yield b'['
+        for index, value in enumerate(obj):
+            yield (b',' if index else b'') + _backend.dumps([value])[1:-1]
+        yield b']'
+    else:
+        yield _backend.dumps(obj)
+
+
+def set_backend(name):
+    """Switch the process-wide backend used by ``dumps``/``loads`` and the Celery serializer."""
+    global _backend
+    _backend = get_backend(name)
+    register(CELERY_SERIALIZER, _backend.dumps, _backend.loads, CELERY_CONTENT_TYPE, 'utf-8')
+    logger.debug("Using %s JSON backend", _backend.name)
+    return _backend
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by the codec backend.
+
+    Output matches the default provider's except that non-ASCII text is emitted as
+    UTF-8 rather than ``\\u`` escapes. Indented (debug) output still goes through
+    the stdlib.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if kwargs.keys() - {'default', 'sort_keys'}:
+            return super().dumps(obj, **kwargs)
+        return self._encode(obj, **kwargs).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return _backend.loads(s)
+
+    def response(self, *args, **kwargs):
+        if self.compact is False or (self.compact is None and self._app.debug):
+            return super().response(*args, **kwargs)
+        body = self._encode(self._prepare_response_obj(args, kwargs))
+        return self._app.response_class(body + b'\n', mimetype=self.mimetype)
+
+    def _encode(self, obj, default=None, sort_keys=None):
+        return _backend.dumps(
+            obj,
+            default=default or self.default,
+            sort_keys=self.sort_keys if sort_keys is None else sort_keys,
+        )
+
+
+def init_json(app):
+    """Install the fast provider on ``app`` and register the Celery serializer for JSON_BACKEND."""
+    set_backend(app.config['JSON_BACKEND'])
+    app.json = FastJSONProvider(app)
+
+
+# Registered on import so a worker that never builds the Flask app can still decode
+set_backend('auto')
@@ -0,0 +1,139 @@
+# key_store.py
+
+import hashlib
+import os
+import threading
+import time
+import uuid
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def _digest(api_key):
+    return hashlib.sha256(api_key.encode('utf-8')).digest()
+
+
+def tenant_id(api_key):
+    """Short stable id for an API key, safe to use in Redis keys and metric labels."""
+    return _digest(api_key).hex()[:16]
+
+
+def new_task_id(tenant):
+    """A task id that starts with ``tenant``, so status and result reads can check who asks."""
+    return f'{tenant}-{uuid.uuid4()}' if tenant else str(uuid.uuid4())
+
+
+def owns_task(api_key, task_id):
+    """Whether ``task_id`` was issued for ``api_key`` (see new_task_id)."""
+    return task_id.startswith(tenant_id(api_key) + '-')
+
+
+class ApiKeyStore:
+    """In-memory index of the API keys in ``key_dir``.
+
+    Each key is a directory named after the key. Only SHA-256 digests are kept in
+    memory. The directory is rescanned when its mtime changes, checked at most once
+    per ``refresh_interval`` seconds. Unknown keys are remembered for ``negative_ttl``
+    seconds so repeated bad keys are rejected without touching the filesystem.
+    """
+
+    def __init__(self, key_dir, refresh_interval=5.0, negative_ttl=30.0, negative_cache_size=10000,
+                 clock=time.monotonic):
+        self.key_dir = key_dir
+        self.refresh_interval = refresh_interval
+        self.negative_ttl = negative_ttl
+        self.negative_cache_size = negative_cache_size
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._digests = frozenset()
+        self._dir_mtime = None
+        self._next_refresh = 0.0
+        self._negative = OrderedDict()
+        self.refresh(force=True)
+
+    def __len__(self):
+        return len(self._digests)
+
+    def _scan(self):
+        try:
+            with os.scandir(self.key_dir) as entries:
+                return frozenset(_digest(entry.name) for entry in entries if entry.is_dir())
+        except FileNotFoundError:
+            return frozenset()
+
+    def refresh(self, force=False):
+        """Rescan the key directory if its mtime changed since the last scan."""
+        with self._lock:
+            self._next_refresh = self._clock() + self.refresh_interval
+            try:
+                mtime = os.stat(self.key_dir).st_mtime_ns
+            except FileNotFoundError:
+                mtime = None
+            if not force and mtime == self._dir_mtime:
+                return False
+            digests = self._scan()
+            added = digests - self._digests
+            removed = self._digests - digests
+            self._digests = digests
+            self._dir_mtime = mtime
+            for digest in added:
+                self._negative.pop(digest, None)
+        if added or removed:
+            logger.info("API key index refreshed: %d added, %d removed, %d total",
+                        len(added), len(removed), len(digests))
+        return True
+
+    def _is_negative(self, digest, now):
+        expires = self._negative.get(digest)
+        if expires is None:
+            return False
+        if expires > now:
+            return True
+        self._negative.pop(digest, None)
+        return False
+
+    def _remember_negative(self, digest, now):
+        with self._lock:
+            self._negative[digest] = now + self.negative_ttl
+            self._negative.move_to_end(digest)
+            while len(self._negative) > self.negative_cache_size:
+                self._negative.popitem(last=False)
+
+    def _probe(self, api_key, digest):
+        # Picks up a key created since the last scan without waiting for the next refresh
+        if not os.path.isdir(os.path.join(self.key_dir, api_key)):
+            return False
+        with self._lock:
+            self._digests = self._digests | {digest}
+        return True
+
+    def is_valid(self, api_key):
+        if not api_key or os.sep in api_key or api_key in ('.', '..'):
+            return False
+
+        now = self._clock()
+        if now >= self._next_refresh:
+            self.refresh()
+
+        digest = _digest(api_key)
+        if digest in self._digests:
+            return True
+        if self._is_negative(digest, now):
+            return False
+        if self._probe(api_key, digest):
+            return True
+        self._remember_negative(digest, now)
+        return False
+
+
+def init_key_store(app):
+    store = ApiKeyStore(
+        app.config['API_KEYS_DIR'],
+        refresh_interval=app.config['API_KEY_REFRESH_INTERVAL'],
+        negative_ttl=app.config['API_KEY_NEGATIVE_TTL'],
+        negative_cache_size=app.config['API_KEY_NEGATIVE_CACHE_SIZE'],
+    )
+    app.extensions['api_key_store'] = store
+    return store
@@ -0,0 +1,114 @@
+# logging_config.py
+
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+REDACTED = '[REDACTED]'
+
+_listener = None
+_payload_settings = {'sample_rate': 0.0, 'redact_fields': frozenset()}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for log shippers."""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, self.datefmt),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'process': record.process,
+        }
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def _build_formatter(log_format):
+    if log_format == 'json':
+        return JsonFormatter()
+    return logging.Formatter('%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s')
+
+
+def _start_listener(log_queue, handler):
+    global _listener
+    _listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+
+
+def _stop_listener():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def _restart_listener_after_fork():
+    # The listener thread does not survive fork (gunicorn preload, Celery prefork),
+    # so each child starts its own to drain the queue it inherited
+    global _listener
+    if _listener is not None:
+        _listener = QueueListener(_listener.queue, *_listener.handlers, respect_handler_level=True)
+        _listener.start()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_listener_after_fork)
+atexit.register(_stop_listener)
+
+
+def configure_logging(app, stream=None):
+    """Route all logging through a QueueHandler so request threads never block on I/O.
+
+    The level, format and payload logging policy come from the app config.
+    Calling this again (e.g. for another app in the same process) replaces the
+    previous setup.
+    """
+    _stop_listener()
+
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(_build_formatter(app.config['LOG_FORMAT']))
+    log_queue = queue.SimpleQueue()
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        if isinstance(existing, QueueHandler):
+            root.removeHandler(existing)
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(app.config['LOG_LEVEL'])
+    _start_listener(log_queue, handler)
+    configure_payload_logging(app.config)
+
+
+def configure_payload_logging(config):
+    """Only the payload logging policy, for processes (the worker) that keep their own handlers."""
+    _payload_settings['sample_rate'] = config['LOG_PAYLOAD_SAMPLE_RATE']
+    _payload_settings['redact_fields'] = frozenset(config['LOG_REDACT_FIELDS'])
+
+
+def redact(data, redact_fields):
+    if isinstance(data, dict):
+        return {k: REDACTED if k in redact_fields else redact(v, redact_fields) for k, v in data.items()}
+    if isinstance(data, list):
+        return [redact(item, redact_fields) for item in data]
+    return data
+
+
+def log_payload(logger, message, data, level=logging.DEBUG):
+    """Log a request payload, sampled at LOG_PAYLOAD_SAMPLE_RATE and with sensitive fields redacted.
+
+    Nothing is copied or formatted unless the record will actually be emitted.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    sample_rate = _payload_settings['sample_rate']
+    if sample_rate <= 0 or (sample_rate < 1 and random.random() >= sample_rate):
+        return
+    logger.log(level, message, redact(data, _payload_settings['redact_fields']))
@@ -1,15 +1,31 @@
 import json
-import os
-from flask import Flask, request, jsonify, make_response
-from flask_restx import Api, Resource, fields  # Ensure fields is imported
-from app.auth import api_key_required
+import math
+from flask import Flask, g, request, jsonify, make_response, send_file
+from flask_restx import Api, fields  # Ensure fields is imported
+from app.auth import api_key_required, is_valid_api_key
+from app.key_store import init_key_store, new_task_id, owns_task, tenant_id
+from app.redis_client import init_redis
+from app.queues import init_queues, resolve_priority
+from app.rate_limit import init_rate_limiter
+from app.result_store import init_result_store, is_pointer
+from app.admission import BrokerUnavailable, init_admission
 from app.celery_app import celery, init_celery
-from app.utils import load_schema, validate_data
+from app.schema_compiler import compiler
+from app.schema_registry import SCHEMA_VERSION_HEADER, registry
+from app.validation import normalize, normalize_stream
 from app.tasks import process_task
-from .restx_utils import load_and_convert_schema
+from app.batch import submit_batch, BatchTooLarge
+from app.streaming import check_depth, iter_batch, StreamParseError
+from app.task_status import get_statuses, configure_status_cache
+from .restx_utils import InstrumentedResource as Resource, convert_json_schema_to_restx_model
+from app.logging_config import configure_logging, log_payload
+from app.json_codec import init_json
+from app.idempotency import (
+    IDEMPOTENCY_HEADER, MAX_KEY_LENGTH, IdempotencyConflict, init_idempotency, payload_fingerprint, request_key,
+)
+from app.metrics import init_metrics, stage, record_load_shed, record_validation_failure
 
 import logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 def create_app(config_class=None):
@@ -22,7 +38,18 @@ def create_app(config_class=None):
     app.config.setdefault('CELERY_BROKER_URL', 'redis://redis:6379/0')
     app.config.setdefault('CELERY_RESULT_BACKEND', 'redis://redis:6379/0')
 
+    configure_logging(app)
+    init_redis(app)
+    init_json(app)
+    init_metrics(app)
     init_celery(app)
+    init_key_store(app)
+    init_idempotency(app)
+    init_rate_limiter(app)
+    init_queues(app)
+    init_admission(app)
+    init_result_store(app)
+    configure_status_cache(app.config['STATUS_CACHE_SIZE'])
 
     api = Api(app, doc='/docs', title='My API', description='API documentation')
 
@@ -33,7 +60,71 @@ def create_app(config_class=None):
         'x-api-key': fields.String(required=True, description='API key', location='headers')
     })
 
-    process_request_model = load_and_convert_schema(process_ns, 'process_request')
+    # Schemas are compiled here and then only recompiled when their files change
+    compiler.configure(app.config['SCHEMA_COMPILE'])
+    registry.configure(app.config['SCHEMA_RELOAD_INTERVAL'], app.config['SCHEMA_KEEP_VERSIONS'])
+    registry.load()
+    idempotency = app.extensions['idempotency']
+    queue_tracker = app.extensions['queue_tracker']
+    admission = app.extensions['admission']
+    publish_breaker = app.extensions['publish_breaker']
+    result_store = app.extensions['result_store']
+
+    # The restx model only documents the payload; validation runs once against the JSON schema
+    process_request_model = convert_json_schema_to_restx_model(
+        process_ns, 'process_request', registry.get('process_request', 'request').schema
+    )
+
+    def update_docs(compiled):
+        # Swagger looks models up by name, so re-registering updates /swagger.json
+        if (compiled.endpoint, compiled.config_type) == ('process_request', 'request'):
+            convert_json_schema_to_restx_model(process_ns, 'process_request', compiled.schema)
+
+    # Named, so only the latest app's docs follow the files rather than every app built in this process
+    registry.subscribe(update_docs, name='docs')
+
+    @app.after_request
+    def add_schema_version(response):
+        version = g.pop('schema_version', None)
+        if version is not None:
+            response.headers[SCHEMA_VERSION_HEADER] = version
+        return response
+
+    def request_schema(endpoint):
+        """The current request schema, recorded as the version serving this request."""
+        compiled = registry.get(endpoint, 'request')
+        g.schema_version = compiled.version
+        return compiled
+
+    def response_defaults(endpoint):
+        compiled = registry.get(endpoint, 'response')
+        return compiled.defaults if compiled else {}
+
+    def streamed(compiled):
+        """Whether to validate this request's body while it is read rather than after."""
+        if not compiled.streamed:
+            return False
+        content_length = request.content_length
+        return content_length is None or content_length >= app.config['STREAMING_MIN_BYTES']
+
+    def validation_mode(route):
+        return app.config['VALIDATION_MODES'].get(route, app.config['VALIDATION_MODE'])
+
+    def shed(status, reason, retry_after, **body):
+        record_load_shed(reason)
+        response = make_response(jsonify({"error": "Service overloaded, retry later", **body}), status)
+        response.headers['Retry-After'] = str(max(math.ceil(retry_after), 1))
+        return response
+
+    def admit(queue):
+        """A 429/503 response if the broker is too loaded to take work for ``queue``, else None."""
+        if admission is None:
+            return None
+        with stage('admission'):
+            rejection = admission.check(queue)
+        if rejection is None:
+            return None
+        return shed(rejection.status, rejection.reason, rejection.retry_after)
 
     @auth_ns.route("/authenticate")
     class Authenticate(Resource):
@@ -43,51 +134,226 @@ def create_app(config_class=None):
             if not api_key:
                 return make_response(jsonify({"error": "API key is missing"}), 400)
 
-            output_dir = os.getenv('OUTPUT_DIR', './output')
-            api_key_path = os.path.join(output_dir, 'api_keys', api_key)
-            
-            if os.path.isdir(api_key_path):
+            if is_valid_api_key(api_key):
                 return make_response(jsonify({"message": "API key is valid"}), 200)
             else:
                 return make_response(jsonify({"error": "Invalid API key"}), 403)
 
     @process_ns.route("/process_request")
     class ProcessRequest(Resource):
+        def streams_body(self):
+            return streamed(registry.get('process_request', 'request'))
+
         @process_ns.doc('process_request')
-        @process_ns.expect(process_request_model, validate=True)
+        @process_ns.expect(process_request_model)
         @api_key_required
         def post(self):
             if not request.is_json:
                 logger.debug("Invalid JSON payload")
                 return make_response(jsonify({"error": "Invalid JSON payload"}), 400)
 
+            compiled = request_schema('process_request')
+            mode = validation_mode('process_request')
+            max_depth = app.config['JSON_MAX_DEPTH']
             try:
-                data = request.get_json()
-                if not data:
-                    raise ValueError("No JSON data")
-            except ValueError:
+                if streamed(compiled):
+                    # Array items are validated as they arrive instead of after the whole body is read
+                    with stage('validate'):
+                        errors, payload, reason = normalize_stream(
+                            compiled, request.stream, mode, max_depth,
+                            max_item_size=app.config['STREAM_MAX_ITEM_SIZE'],
+                        )
+                else:
+                    data = request.get_json()
+                    if not data:
+                        raise ValueError("No JSON data")
+                    check_depth(data, max_depth)
+                    with stage('validate'):
+                        errors, payload, reason = normalize(compiled, data, mode)
+            except StreamParseError as e:
+                logger.debug("Rejected JSON payload: %s", e)
+                return make_response(jsonify({"error": str(e)}), 400)
+            except (ValueError, RecursionError):
                 logger.debug("Invalid JSON payload")
                 return make_response(jsonify({"error": "Invalid JSON payload"}), 400)
 
-            schema = load_schema("process_request", "request")
-            errors, validated_data = validate_data(schema, data)
-
-            logger.debug(f"Validation errors: {errors}")
-            logger.debug(f"Validated data: {validated_data}")
-
             if errors:
+                logger.debug("Validation errors: %s", errors)
+                record_validation_failure(reason)
                 return make_response(jsonify({"error": errors}), 400)
 
-            # Filter out any additional fields not in the schema
-            filtered_data = {k: v for k, v in validated_data.items() if k in schema["properties"]}
+            log_payload(logger, "Validated data: %s", payload)
+            api_key = request.headers.get("x-api-key")
+            # Routing only; the task gets the payload without it
+            queue = resolve_priority(app.config, api_key, payload.pop('priority', None))
+            rejected = admit(queue)
+            if rejected is not None:
+                return rejected
+
+            idempotency_key = request.headers.get(IDEMPOTENCY_HEADER)
+            if idempotency_key is not None and not 0 < len(idempotency_key) <= MAX_KEY_LENGTH:
+                return make_response(jsonify({"error": f"{IDEMPOTENCY_HEADER} must be 1-{MAX_KEY_LENGTH} characters"}), 400)
+            payload_ttl = app.config['IDEMPOTENCY_PAYLOAD_TTL']
+            claim_key = None
+            # Chosen up front so the claim can name it before publishing
+            task_id = new_task_id(tenant_id(api_key))
+            if idempotency_key or payload_ttl:
+                fingerprint = payload_fingerprint(payload)
+                claim_key = request_key(api_key, idempotency_key, fingerprint)
+                try:
+                    with stage('idempotency'):
+                        existing = idempotency.claim_request(
+                            claim_key, task_id, fingerprint, ttl=None if idempotency_key else payload_ttl
+                        )
+                except IdempotencyConflict as e:
+                    return make_response(jsonify({"error": str(e)}), 422)
+                if existing:
+                    logger.debug("Duplicate request for task %s", existing)
+                    response = {"task_id": existing, "status": celery.AsyncResult(existing).status}
+                    response.update(response_defaults('process_request'))
+                    replay = make_response(jsonify(response), 202)
+                    replay.headers['Idempotent-Replayed'] = 'true'
+                    return replay
 
             # Task creation logic
-            task = process_task.apply_async(args=[filtered_data])
-            response_schema = load_schema("process_request", "response")
+            try:
+                with stage('publish'):
+                    task = publish_breaker.call(
+                        process_task.apply_async,
+                        args=[payload], kwargs={'tenant': tenant_id(api_key)}, task_id=task_id, queue=queue,
+                        headers={'schema_version': compiled.version},
+                    )
+            except Exception as e:
+                if claim_key:
+                    idempotency.release_request(claim_key)
+                if isinstance(e, BrokerUnavailable):
+                    logger.warning("Publish failed: %s", e)
+                    return shed(503, 'broker_unavailable', e.retry_after)
+                raise
+            queue_tracker.published(tenant_id(api_key))
             response = {"task_id": task.id, "status": task.status}
-            response.update({k: v["default"] for k, v in response_schema["properties"].items() if "default" in v})
+            response.update(response_defaults('process_request'))
             return make_response(jsonify(response), 202)
 
+    @process_ns.route("/process_request/batch")
+    class ProcessRequestBatch(Resource):
+        @process_ns.doc('process_request_batch', description='Accepts a JSON array or NDJSON body of process_request payloads')
+        @api_key_required
+        def post(self):
+            # Parse from the raw stream so large batches are never held in memory whole
+            items = iter_batch(request.stream, request.mimetype, max_depth=app.config['JSON_MAX_DEPTH'],
+                               max_item_size=app.config['STREAM_MAX_ITEM_SIZE'])
+            api_key = request.headers.get("x-api-key")
+            tenant = tenant_id(api_key)
+            queue = resolve_priority(app.config, api_key, app.config['BATCH_PRIORITY'])
+            rejected = admit(queue)
+            if rejected is not None:
+                return rejected
+            tasks = []
+            try:
+                with stage('batch_submit'):
+                    result = submit_batch(
+                        items,
+                        request_schema('process_request'),
+                        max_items=app.config['BATCH_MAX_ITEMS'],
+                        chunk_size=app.config['BATCH_ENQUEUE_CHUNK_SIZE'],
+                        mode=validation_mode('process_request_batch'),
+                        queue=queue,
+                        tenant=tenant,
+                        breaker=publish_breaker,
+                    )
+                tasks = result["tasks"]
+            except BatchTooLarge as e:
+                tasks = e.tasks
+                return make_response(jsonify({"error": str(e), "tasks": e.tasks}), 413)
+            except StreamParseError as e:
+                tasks = e.tasks
+                return make_response(jsonify({"error": str(e), "tasks": e.tasks}), 400)
+            except BrokerUnavailable as e:
+                tasks = e.tasks
+                logger.warning("Batch publish failed after %d tasks: %s", len(tasks), e)
+                return shed(503, 'broker_unavailable', e.retry_after, tasks=e.tasks)
+            finally:
+                queue_tracker.published(tenant, len(tasks))
+
+            status_code = 400 if result["rejected"] and not result["accepted"] else 202
+            return make_response(jsonify(result), status_code)
+
+    def not_found(task_ids):
+        return make_response(jsonify({"error": "Task not found", "task_ids": task_ids}), 404)
+
+    def parse_wait():
+        try:
+            wait = float(request.args.get('wait', 0))
+        except ValueError:
+            return None
+        # nan and inf would slip past the STATUS_MAX_WAIT cap
+        if not math.isfinite(wait) or wait < 0:
+            return None
+        return min(wait, app.config['STATUS_MAX_WAIT'])
+
+    @process_ns.route("/status/<string:task_id>")
+    class TaskStatus(Resource):
+        @process_ns.doc('task_status', params={'wait': 'Seconds to block until the task finishes'})
+        @api_key_required
+        def get(self, task_id):
+            wait = parse_wait()
+            if wait is None:
+                return make_response(jsonify({"error": "Invalid wait parameter"}), 400)
+            # Another key's task looks the same as one that does not exist
+            if not owns_task(request.headers.get("x-api-key"), task_id):
+                return not_found([task_id])
+            status, = get_statuses(celery, [task_id], wait=wait)
+            return make_response(jsonify(result_store.present(status)), 200)
+
+    @process_ns.route("/status")
+    class TaskStatusBulk(Resource):
+        @process_ns.doc('task_status_bulk', params={
+            'ids': 'Comma-separated task ids',
+            'wait': 'Seconds to block until all tasks finish',
+        })
+        @api_key_required
+        def get(self):
+            task_ids = [task_id for value in request.args.getlist('ids') for task_id in value.split(',') if task_id]
+            if not task_ids:
+                return make_response(jsonify({"error": "No task ids given"}), 400)
+            if len(task_ids) > app.config['STATUS_BULK_MAX_IDS']:
+                return make_response(jsonify({"error": f"At most {app.config['STATUS_BULK_MAX_IDS']} ids per request"}), 400)
+            wait = parse_wait()
+            if wait is None:
+                return make_response(jsonify({"error": "Invalid wait parameter"}), 400)
+            api_key = request.headers.get("x-api-key")
+            foreign = [task_id for task_id in task_ids if not owns_task(api_key, task_id)]
+            if foreign:
+                return not_found(foreign)
+            statuses = get_statuses(celery, task_ids, wait=wait)
+            return make_response(jsonify({"tasks": [result_store.present(status) for status in statuses]}), 200)
+
+    @process_ns.route("/results/<string:task_id>")
+    class TaskResult(Resource):
+        @process_ns.doc('task_result')
+        @api_key_required
+        def get(self, task_id):
+            """The result file of a task whose result was too large to return inline."""
+            if not owns_task(request.headers.get("x-api-key"), task_id):
+                return not_found([task_id])
+            status, = get_statuses(celery, [task_id])
+            result = status.get('result')
+            if not is_pointer(result):
+                return not_found([task_id])
+            relative, path = result_store.locate(result)
+            if result_store.accel_url:
+                # nginx sends the file from its internal location
+                response = make_response('', 200)
+                response.headers['X-Accel-Redirect'] = result_store.accel_url + relative
+                response.mimetype = 'application/json'
+                return response
+            try:
+                return send_file(path, mimetype='application/json')
+            except FileNotFoundError:
+                # Swept after RESULT_FILE_TTL
+                return not_found([task_id])
+
     return app
 
 if __name__ == "__main__":
@@ -0,0 +1,174 @@
+# metrics.py
+
+import os
+import time
+import logging
+from contextlib import contextmanager
+from celery.signals import before_task_publish, task_prerun, task_postrun, worker_init, worker_process_shutdown
+from flask import Response, g, request, has_request_context
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+    start_http_server,
+)
+from app.queues import queue_depth_collector
+
+logger = logging.getLogger(__name__)
+
+STAGE_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+WEBHOOK_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TASK_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Request latency by endpoint', ['endpoint', 'method', 'status'],
+)
+STAGE_LATENCY = Histogram(
+    'request_stage_duration_seconds', 'Latency of each request pipeline stage', ['endpoint', 'stage'],
+    buckets=STAGE_BUCKETS,
+)
+VALIDATION_FAILURES = Counter(
+    'validation_failures_total', 'Rejected payloads by failing schema keyword', ['endpoint', 'reason'],
+)
+AUTH_FAILURES = Counter('auth_failures_total', 'Rejected API keys', ['reason'])
+RATE_LIMITED = Counter('rate_limited_total', 'Requests rejected by the rate limiter', ['endpoint'])
+LOAD_SHED = Counter('load_shed_total', 'Requests rejected because the broker is saturated', ['endpoint', 'reason'])
+TASK_RUNTIME = Histogram(
+    'celery_task_runtime_seconds', 'Task execution time', ['task', 'state'], buckets=TASK_BUCKETS,
+)
+TASK_QUEUE_WAIT = Histogram(
+    'celery_task_queue_wait_seconds', 'Time from publish to start of execution', ['task'], buckets=TASK_BUCKETS,
+)
+WEBHOOK_ATTEMPTS = Counter(
+    'webhook_attempts_total', 'Webhook delivery attempts by destination host and outcome', ['host', 'outcome'],
+)
+WEBHOOK_LATENCY = Histogram(
+    'webhook_attempt_duration_seconds', 'Time taken by each webhook delivery attempt', ['host'],
+    buckets=WEBHOOK_BUCKETS,
+)
+
+PUBLISHED_AT_HEADER = 'published_at'
+
+# Queue depths are read from Redis at scrape time, not recorded per process
+REGISTRY.register(queue_depth_collector)
+
+
+def _endpoint():
+    return (request.endpoint or 'unmatched') if has_request_context() else 'none'
+
+
+@contextmanager
+def stage(name):
+    """Time a block of the request pipeline under ``name`` for the current endpoint."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.labels(_endpoint(), name).observe(time.perf_counter() - start)
+
+
+def record_validation_failure(reason):
+    VALIDATION_FAILURES.labels(_endpoint(), reason).inc()
+
+
+def record_auth_failure(reason):
+    AUTH_FAILURES.labels(reason).inc()
+
+
+def record_rate_limited():
+    RATE_LIMITED.labels(_endpoint()).inc()
+
+
+def record_load_shed(reason):
+    LOAD_SHED.labels(_endpoint(), reason).inc()
+
+
+def record_webhook_delivery(host, result):
+    """Record one attempt of a webhooks.DeliveryResult: delivered, retrying or failed."""
+    if result.delivered:
+        outcome = 'delivered'
+    elif result.retry_in is not None:
+        outcome = 'retrying'
+    else:
+        outcome = 'failed'
+    WEBHOOK_ATTEMPTS.labels(host, outcome).inc()
+    WEBHOOK_LATENCY.labels(host).observe(result.latency)
+
+
+def _metrics_registry():
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        # Aggregate the per-process files written by every gunicorn/Celery worker
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(queue_depth_collector)
+        return registry
+    return REGISTRY
+
+
+def metrics_view():
+    return Response(generate_latest(_metrics_registry()), mimetype=CONTENT_TYPE_LATEST)
+
+
+def init_metrics(app):
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def observe_request(response):
+        started = g.pop('request_started', None)
+        if started is not None and request.endpoint != 'metrics':
+            REQUEST_LATENCY.labels(_endpoint(), request.method, response.status_code).observe(
+                time.perf_counter() - started
+            )
+        return response
+
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+
+
+@before_task_publish.connect
+def stamp_publish_time(headers=None, **kwargs):
+    if headers is not None:
+        headers.setdefault(PUBLISHED_AT_HEADER, time.time())
+
+
+@task_prerun.connect
+def start_task_timer(task=None, **kwargs):
+    task.request._metrics_started = time.perf_counter()
+    published_at = getattr(task.request, PUBLISHED_AT_HEADER, None)
+    if published_at is not None:
+        TASK_QUEUE_WAIT.labels(task.name).observe(max(time.time() - float(published_at), 0))
+
+
+@task_postrun.connect
+def observe_task_runtime(task=None, state=None, **kwargs):
+    started = getattr(task.request, '_metrics_started', None)
+    if started is not None:
+        TASK_RUNTIME.labels(task.name, state or 'UNKNOWN').observe(time.perf_counter() - started)
+
+
+def clear_multiprocess_dir():
+    """Remove stale per-process files; call once in the parent before workers start."""
+    path = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        os.makedirs(path, exist_ok=True)
+        for name in os.listdir(path):
+            if name.endswith('.db'):
+                os.remove(os.path.join(path, name))
+
+
+def mark_process_dead(pid):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(pid)
+
+
+@worker_process_shutdown.connect
+def mark_worker_process_dead(pid=None, **kwargs):
+    mark_process_dead(pid or os.getpid())
+
+
+@worker_init.connect
+def start_worker_metrics_server(**kwargs):
+    clear_multiprocess_dir()
+    port = os.environ.get('WORKER_METRICS_PORT')
+    if port:
+        start_http_server(int(port), registry=_metrics_registry())
+        logger.info("Serving worker metrics on port %s", port)
@@ -0,0 +1,216 @@
+# queues.py
+
+import random
+import threading
+import logging
+from prometheus_client.core import GaugeMetricFamily
+from redis.exceptions import RedisError
+from app.key_store import tenant_id
+from app.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+TENANT_QUEUED_KEY = 'tenants:queued'
+TENANT_RUNNING_PREFIX = 'tenants:running'
+
+# Adds the task to the tenant's running set unless the set is full. Entries older
+# than the lease belong to workers that died mid-task and are dropped first.
+# KEYS[1]: running set. ARGV: task id, max concurrency, lease seconds.
+ACQUIRE_SLOT_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local lease = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - lease)
+if redis.call('ZSCORE', KEYS[1], ARGV[1]) then
+    return 1
+end
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now, ARGV[1])
+redis.call('EXPIRE', KEYS[1], math.ceil(lease))
+return 1
+"""
+
+
+def resolve_priority(config, api_key, requested=None):
+    """Queue for a request: the key's tier sets the highest priority it may use.
+
+    ``requested`` (from the payload) can lower the priority but never raise it
+    above the tier's.
+    """
+    priorities = config['TASK_PRIORITIES']
+    tier = config['API_KEY_TIERS'].get(tenant_id(api_key), config['DEFAULT_TIER'])
+    ceiling = config['TIER_PRIORITIES'].get(tier, config['TASK_DEFAULT_PRIORITY'])
+    if requested not in priorities:
+        return ceiling
+    return max(requested, ceiling, key=priorities.index)
+
+
+class WeightedCycle:
+    """kombu Redis queue cycle that puts a weighted-random queue first on every poll.
+
+    BRPOP returns from the first non-empty queue it is given, so a queue with
+    weight 6 is served first about six times as often as one with weight 1. The
+    rest follow in weight order, so low priority work still drains while higher
+    queues are busy instead of starving as with kombu's 'priority' strategy.
+    """
+
+    weights = {}
+
+    def __init__(self, it=None):
+        self.items = it if it is not None else []
+
+    def update(self, it):
+        self.items[:] = it
+
+    def consume(self, n):
+        items = sorted(self.items[:n], key=lambda queue: -self.weights.get(queue, 1))
+        if len(items) < 2:
+            return items
+        first = random.choices(items, [self.weights.get(queue, 1) for queue in items])[0]
+        return [first] + [queue for queue in items if queue != first]
+
+    def rotate(self, last_used):
+        return last_used
+
+
+def weighted_cycle(weights):
+    """A WeightedCycle class for ``weights``, for the ``queue_order_strategy`` transport option."""
+    return type('WeightedCycle', (WeightedCycle,), {'weights': dict(weights)})
+
+
+def slot_retry_delay(retries, base, maximum):
+    """Countdown for a task retried because its tenant had no free slot.
+
+    Doubles with each retry up to ``maximum``, then adds up to as much again in
+    jitter so a tenant's retried tasks do not all come back at once.
+    """
+    return min(base * 2 ** retries, maximum) * (1 + random.random())
+
+
+class TenantSlots:
+    """Caps how many tasks of one tenant run at once across all workers.
+
+    A task that cannot get a slot is retried later (see slot_retry_delay), which
+    puts it behind other tenants' work in the queue. Slots are held in a Redis sorted set per tenant
+    and expire after ``lease`` seconds in case a worker dies without releasing.
+    Without Redis the cap applies per worker process. Redis errors fail open.
+    """
+
+    def __init__(self, max_concurrency, redis=None, lease=600):
+        self.max_concurrency = max_concurrency
+        self.redis = redis
+        self.lease = lease
+        self._script = redis.register_script(ACQUIRE_SLOT_LUA) if redis is not None else None
+        self._lock = threading.Lock()
+        self._running = {}
+
+    def acquire(self, tenant, task_id):
+        if not self.max_concurrency or not tenant:
+            return True
+        if self.redis is None:
+            with self._lock:
+                running = self._running.setdefault(tenant, set())
+                if task_id not in running and len(running) >= self.max_concurrency:
+                    return False
+                running.add(task_id)
+                return True
+        try:
+            return bool(self._script(keys=[f'{TENANT_RUNNING_PREFIX}:{tenant}'],
+                                     args=[task_id, self.max_concurrency, self.lease]))
+        except RedisError:
+            logger.warning("Tenant slot check skipped, Redis unavailable", exc_info=True)
+            return True
+
+    def release(self, tenant, task_id):
+        if not self.max_concurrency or not tenant:
+            return
+        if self.redis is None:
+            with self._lock:
+                self._running.get(tenant, set()).discard(task_id)
+            return
+        try:
+            self.redis.zrem(f'{TENANT_RUNNING_PREFIX}:{tenant}', task_id)
+        except RedisError:
+            logger.warning("Could not release tenant slot", exc_info=True)
+
+
+class QueueDepthCollector:
+    """Reports queue depth per priority and queued tasks per tenant at scrape time."""
+
+    def __init__(self):
+        self.redis = None
+        self.broker = None
+        self.queues = ()
+
+    def configure(self, redis, queues, broker=None):
+        """``broker`` holds the queue lists, ``redis`` the tenant counts kept by QueueTracker."""
+        self.redis = redis
+        self.broker = broker
+        self.queues = tuple(queues)
+
+    def collect(self):
+        depths = tenants = None
+        try:
+            if self.broker is not None:
+                with self.broker.pipeline(transaction=False) as pipe:
+                    for queue in self.queues:
+                        pipe.llen(queue)
+                    depths = pipe.execute()
+            if self.redis is not None:
+                tenants = self.redis.hgetall(TENANT_QUEUED_KEY)
+        except RedisError:
+            logger.warning("Could not read queue depths", exc_info=True)
+            return
+        if depths is not None:
+            queue_depth = GaugeMetricFamily('celery_queue_depth', 'Messages waiting per priority queue', labels=['queue'])
+            for queue, depth in zip(self.queues, depths):
+                queue_depth.add_metric([queue], depth)
+            yield queue_depth
+        if tenants is None:
+            return
+        tenant_queued = GaugeMetricFamily(
+            'celery_tenant_queued', 'Tasks published but not yet started per tenant', labels=['tenant'],
+        )
+        for tenant, count in tenants.items():
+            # The counter can drift below zero if a message is lost; never report that
+            tenant_queued.add_metric([tenant.decode()], max(int(count), 0))
+        yield tenant_queued
+
+
+queue_depth_collector = QueueDepthCollector()
+
+
+class QueueTracker:
+    """Counts tasks per tenant between publish and start, for celery_tenant_queued."""
+
+    def __init__(self, redis=None):
+        self.redis = redis
+
+    def _add(self, tenant, count):
+        if self.redis is None or not tenant:
+            return
+        try:
+            self.redis.hincrby(TENANT_QUEUED_KEY, tenant, count)
+        except RedisError:
+            logger.warning("Could not update tenant queue count", exc_info=True)
+
+    def published(self, tenant, count=1):
+        self._add(tenant, count)
+
+    def started(self, tenant, count=1):
+        self._add(tenant, -count)
+
+
+def init_queues(app):
+    url = app.config['QUEUE_REDIS_URL']
+    redis = get_redis(url) if url else None
+    app.extensions['tenant_slots'] = TenantSlots(
+        app.config['TENANT_MAX_CONCURRENCY'], redis=redis, lease=app.config['TENANT_SLOT_LEASE'],
+    )
+    app.extensions['queue_tracker'] = QueueTracker(redis)
+    broker_url = app.config['BROKER_STATS_REDIS_URL']
+    queue_depth_collector.configure(
+        redis, app.config['TASK_PRIORITIES'], broker=get_redis(broker_url) if broker_url else None,
+    )
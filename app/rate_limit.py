@@ -0,0 +1,237 @@
+# rate_limit.py
+
+import math
+import threading
+import time
+import logging
+from flask import g
+from redis.exceptions import RedisError
+from app.key_store import tenant_id
+from app.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+MAX_LEASES = 100000
+
+# Token buckets for every limit on a key, refilled from the Redis server clock.
+# First puts back the ARGV[2] tokens an expired lease did not spend. Then grants
+# up to ARGV[1] tokens, but no more than the emptiest bucket holds, and takes
+# them from all buckets together so the limits stay consistent.
+# KEYS: one bucket per limit. ARGV: requested, refund, then (capacity, rate) per key.
+# Returns {granted, remaining_1, seconds_until_next_token_1, ...} as strings.
+TOKEN_BUCKET_LUA = """
+local requested = tonumber(ARGV[1])
+local refund = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local tokens = {}
+local granted = requested
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2 + 1])
+    local rate = tonumber(ARGV[i * 2 + 2])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local available = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    available = math.min(capacity, available + refund + math.max(0, now - ts) * rate)
+    tokens[i] = available
+    granted = math.min(granted, math.floor(available))
+end
+local result = {tostring(granted)}
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2 + 1])
+    local rate = tonumber(ARGV[i * 2 + 2])
+    local left = tokens[i] - granted
+    redis.call('HSET', key, 'tokens', tostring(left), 'ts', tostring(now))
+    redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+    table.insert(result, tostring(left))
+    table.insert(result, tostring(math.max(0, 1 - left) / rate))
+end
+return result
+"""
+
+
+def parse_limit(limit):
+    """``'100/minute'`` -> ``(100, 60)``."""
+    count, _, period = limit.partition('/')
+    try:
+        return int(count), PERIODS[period.strip()]
+    except (KeyError, ValueError):
+        raise ValueError(f"Invalid rate limit: {limit!r}") from None
+
+
+class Decision:
+    """Outcome of one check, and the values for its RateLimit-* headers."""
+
+    def __init__(self, allowed, limit, remaining, reset, retry_after=0):
+        self.allowed = allowed
+        self.limit = limit
+        self.remaining = remaining
+        self.reset = reset
+        self.retry_after = retry_after
+
+    def headers(self):
+        headers = {
+            'RateLimit-Limit': str(self.limit),
+            'RateLimit-Remaining': str(max(int(self.remaining), 0)),
+            'RateLimit-Reset': str(math.ceil(self.reset)),
+        }
+        if not self.allowed:
+            headers['Retry-After'] = str(max(math.ceil(self.retry_after), 1))
+        return headers
+
+
+class LocalBuckets:
+    """In-process token buckets with the same semantics as TOKEN_BUCKET_LUA."""
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._buckets = {}
+
+    def take(self, keys, limits, requested, refund=0):
+        now = self._clock()
+        tokens = []
+        for key, (capacity, rate) in zip(keys, limits):
+            available, ts = self._buckets.get(key, (capacity, now))
+            tokens.append(min(capacity, available + refund + max(0.0, now - ts) * rate))
+        granted = min([requested] + [math.floor(available) for available in tokens])
+        result = [granted]
+        for key, (capacity, rate), available in zip(keys, limits, tokens):
+            left = available - granted
+            self._buckets[key] = (left, now)
+            result.extend([left, max(0.0, 1 - left) / rate])
+        return result
+
+
+class _Lease:
+    __slots__ = ('tokens', 'expires', 'limit', 'period', 'remaining', 'retry_after')
+
+    def __init__(self, tokens, expires, limit, period, remaining, retry_after=0.0):
+        self.tokens = tokens
+        self.expires = expires
+        self.limit = limit
+        self.period = period
+        self.remaining = remaining
+        self.retry_after = retry_after
+
+    def decision(self, now):
+        if self.retry_after:
+            return Decision(False, self.limit, 0, self.retry_after, self.expires - now)
+        remaining = self.remaining + self.tokens
+        # Seconds until the reported bucket is full again
+        reset = max(self.limit - remaining, 0) * self.period / self.limit
+        return Decision(True, self.limit, remaining, reset)
+
+
+class RateLimiter:
+    """Per API key and endpoint limits, enforced with token buckets.
+
+    Each process leases up to ``lease_size`` tokens from Redis at a time and
+    spends them locally until they run out or ``lease_ttl`` seconds pass, so
+    most checks never leave the process. A denial is also cached until the next
+    token is due. Across N processes a key can overshoot by at most
+    N * lease_size requests. Tokens an expired lease did not spend go back to
+    the buckets when the process next takes a lease for the key, so sparse
+    traffic over many processes costs one token per request; only a key that
+    goes quiet holds up to lease_size tokens per process until its buckets
+    refill. Without Redis the buckets are per process. Redis errors fail open.
+    """
+
+    def __init__(self, limits, redis=None, lease_size=10, lease_ttl=1.0, prefix='ratelimit', clock=time.monotonic):
+        self.limits = {endpoint: [parse_limit(limit) for limit in values] for endpoint, values in limits.items()}
+        self.redis = redis
+        self.lease_size = lease_size
+        self.lease_ttl = lease_ttl
+        self.prefix = prefix
+        self._clock = clock
+        self._local = LocalBuckets(clock) if redis is None else None
+        self._script = redis.register_script(TOKEN_BUCKET_LUA) if redis is not None else None
+        self._lock = threading.Lock()
+        self._leases = {}
+
+    def limits_for(self, endpoint):
+        return self.limits.get(endpoint, self.limits.get('default', []))
+
+    def _bucket_keys(self, scope, endpoint, limits):
+        return [f'{self.prefix}:{scope}:{endpoint}:{count}/{period}' for count, period in limits]
+
+    def _take(self, keys, bucket_limits, requested, refund):
+        if self._local is not None:
+            with self._lock:
+                return self._local.take(keys, bucket_limits, requested, refund)
+        args = [requested, refund]
+        for capacity, rate in bucket_limits:
+            args.extend([capacity, rate])
+        return [float(value) for value in self._script(keys=keys, args=args)]
+
+    def check(self, api_key, endpoint):
+        """Spend one token for ``api_key`` on ``endpoint``; None if unlimited or Redis is down."""
+        limits = self.limits_for(endpoint)
+        if not limits:
+            return None
+        # Hashed, so raw API keys are neither kept in the lease cache nor appear in Redis key names
+        scope = tenant_id(api_key)
+        lease_key = (scope, endpoint)
+        now = self._clock()
+
+        with self._lock:
+            lease = self._leases.get(lease_key)
+            if lease is not None and lease.expires > now and (lease.tokens > 0 or lease.retry_after):
+                if not lease.retry_after:
+                    lease.tokens -= 1
+                return lease.decision(now)
+            # Claimed under the lock so concurrent checks never refund the same tokens twice
+            refund = 0
+            if lease is not None:
+                refund, lease.tokens = lease.tokens, 0
+
+        bucket_limits = [(count, count / period) for count, period in limits]
+        # Never lease more than a tenth of the smallest bucket, so small limits stay exact
+        requested = max(1, min(self.lease_size, min(count for count, _ in limits) // 10))
+        try:
+            result = self._take(self._bucket_keys(scope, endpoint, limits), bucket_limits, requested, refund)
+        except RedisError:
+            logger.warning("Rate limit check skipped, Redis unavailable", exc_info=True)
+            return None
+
+        granted = int(result[0])
+        remaining = result[1::2]
+        # Headers describe whichever limit is closest to running out
+        index = min(range(len(limits)), key=lambda i: remaining[i] / limits[i][0])
+        limit, period = limits[index]
+        if granted:
+            lease = _Lease(granted - 1, now + self.lease_ttl, limit, period, remaining[index])
+        else:
+            retry_after = max(max(result[2::2]), 0.001)
+            lease = _Lease(0, now + retry_after, limit, period, 0, retry_after)
+        with self._lock:
+            self._leases[lease_key] = lease
+            if len(self._leases) > MAX_LEASES:
+                self._prune(now)
+        return lease.decision(now)
+
+    def _prune(self, now):
+        for key in [key for key, lease in self._leases.items() if lease.expires <= now]:
+            del self._leases[key]
+
+
+def init_rate_limiter(app):
+    limiter = None
+    if app.config['RATE_LIMIT_ENABLED']:
+        url = app.config['RATE_LIMIT_REDIS_URL']
+        limiter = RateLimiter(
+            app.config['RATE_LIMITS'],
+            redis=get_redis(url) if url else None,
+            lease_size=app.config['RATE_LIMIT_LEASE_SIZE'],
+            lease_ttl=app.config['RATE_LIMIT_LEASE_TTL'],
+        )
+
+    @app.after_request
+    def add_rate_limit_headers(response):
+        decision = g.pop('rate_limit', None)
+        if decision is not None:
+            response.headers.update(decision.headers())
+        return response
+
+    app.extensions['rate_limiter'] = limiter
+    return limiter
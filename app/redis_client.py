@@ -0,0 +1,44 @@
+# redis_client.py
+
+import os
+import redis
+from app.config import Config
+
+_clients = {}
+
+
+def pool_options(config):
+    """Connection pool settings from the REDIS_* config keys."""
+    return {
+        'max_connections': config['REDIS_MAX_CONNECTIONS'],
+        'timeout': config['REDIS_POOL_TIMEOUT'],
+        'socket_keepalive': config['REDIS_SOCKET_KEEPALIVE'],
+        'socket_timeout': config['REDIS_SOCKET_TIMEOUT'],
+        'socket_connect_timeout': config['REDIS_SOCKET_TIMEOUT'],
+        'health_check_interval': config['REDIS_HEALTH_CHECK_INTERVAL'],
+    }
+
+
+# The worker never calls init_redis, so it starts from Config
+_pool_options = pool_options(vars(Config))
+
+
+def get_redis(url):
+    """Return a Redis client for ``url``, shared within the current process.
+
+    Clients are keyed by pid as well so a forked worker never reuses its parent's
+    connection pool. The pool blocks for up to ``timeout`` seconds when all of
+    its ``max_connections`` are in use instead of opening more.
+    """
+    options = tuple(sorted(_pool_options.items()))
+    key = (url, os.getpid(), options)
+    client = _clients.get(key)
+    if client is None:
+        pool = redis.BlockingConnectionPool.from_url(url, **_pool_options)
+        client = _clients[key] = redis.Redis(connection_pool=pool)
+    return client
+
+
+def init_redis(app):
+    _pool_options.clear()
+    _pool_options.update(pool_options(app.config))
@@ -1,24 +1,30 @@
 # restx_utils.py
 
-import os
-import json
-from flask_restx import fields
-from werkzeug.exceptions import BadRequest
+from flask import request
+from flask_restx import Resource, fields
+from werkzeug.exceptions import BadRequest, HTTPException
+from app.metrics import stage, record_validation_failure
+from app.schema_registry import registry
 
-# Simple in-memory cache
-schema_cache = {}
+class InstrumentedResource(Resource):
+    """Resource that times JSON parsing and restx ``expect`` validation as separate stages."""
 
-def load_schema_from_file(schema_file):
-    if schema_file in schema_cache:
-        return schema_cache[schema_file]
-    
-    if not os.path.exists(schema_file):
-        raise FileNotFoundError(f"JSON schema file not found: {schema_file}")
-    
-    with open(schema_file) as f:
-        schema = json.load(f)
-        schema_cache[schema_file] = schema
-        return schema
+    def streams_body(self):
+        """True when the handler reads this request's body from request.stream itself."""
+        return False
+
+    def validate_payload(self, func):
+        # Only parse up front when restx is going to validate a body anyway;
+        # streaming routes read request.stream themselves
+        if getattr(func, '__apidoc__', {}).get('expect') and request.is_json and not self.streams_body():
+            with stage('parse'):
+                request.get_json(silent=True)
+        try:
+            with stage('restx_validate'):
+                super().validate_payload(func)
+        except HTTPException:
+            record_validation_failure('restx')
+            raise
 
 def get_field_type(property_details):
     field_type = property_details.get('type')
@@ -42,6 +48,8 @@ def convert_json_schema_to_restx_model(api, name, schema):
                 field = fields.String(required=required, description=property_details.get('description', ''), enum=property_details['enum'])
             else:
                 field = fields.String(required=required, description=property_details.get('description', ''), default=property_details.get('default', ''))
+        elif field_type == 'integer':
+            field = fields.Integer(required=required, description=property_details.get('description', ''), default=property_details.get('default', 0))
         elif field_type == 'number':
             field = fields.Float(required=required, description=property_details.get('description', ''), default=property_details.get('default', 0))
         elif field_type == 'boolean':
@@ -64,10 +72,8 @@ def convert_json_schema_to_restx_model(api, name, schema):
     return api.model(name, model_fields)
 
 def load_and_convert_schema(api, endpoint_name):
-    schema_file = f'json_schemas/{endpoint_name}_request.json'
-    try:
-        schema = load_schema_from_file(schema_file)
-        return convert_json_schema_to_restx_model(api, endpoint_name, schema)
-    except (FileNotFoundError, json.JSONDecodeError) as e:
-        raise BadRequest(str(e))
-
+    # Schemas come from the registry, which only rereads files that changed
+    compiled = registry.get(endpoint_name, 'request')
+    if compiled is None:
+        raise BadRequest(f"No request schema for {endpoint_name}")
+    return convert_json_schema_to_restx_model(api, endpoint_name, compiled.schema)
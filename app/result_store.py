@@ -0,0 +1,199 @@
+# result_store.py
+
+import os
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from celery.signals import worker_ready, worker_shutdown
+from app import json_codec
+
+logger = logging.getLogger(__name__)
+
+# Marks a stored result as a pointer to a file rather than the result itself
+POINTER_KEY = '__result_file__'
+SUFFIX = '.json'
+TMP_PREFIX = '.tmp-'
+# Attempts at creating a temporary file whose directory the sweeper keeps removing
+OPEN_ATTEMPTS = 3
+
+
+class ResultStore:
+    """Keeps large task results on disk and only a small pointer in the result backend.
+
+    Results up to ``inline_limit`` encoded bytes are returned unchanged and stored
+    by Celery as usual. Larger ones are written to
+    ``root/<tenant>/<shard>/<task_id>.json``, where the shard is the last two
+    characters of the task id (ids start with the tenant, see
+    key_store.new_task_id) so no directory grows unbounded. Files are written
+    to a temporary name and renamed into place, so a reader never sees a partial
+    file. Status responses link a result as ``base_url + task_id``, the API
+    endpoint that checks the caller owns the task; it serves the file itself,
+    or hands it to nginx's internal location at ``accel_url`` when one is set.
+    """
+
+    def __init__(self, root, base_url, accel_url='', inline_limit=65536, ttl=86400, clock=time.time):
+        self.root = os.path.abspath(root)
+        self.base_url = base_url.rstrip('/') + '/'
+        self.accel_url = accel_url.rstrip('/') + '/' if accel_url else ''
+        self.inline_limit = inline_limit
+        self.ttl = ttl
+        self._clock = clock
+
+    def path_for(self, tenant, task_id):
+        relative = os.path.join(tenant or 'anonymous', task_id[-2:], task_id + SUFFIX)
+        return relative, os.path.join(self.root, relative)
+
+    def locate(self, pointer):
+        """``(relative, path)`` of the file a pointer result refers to."""
+        relative = pointer[POINTER_KEY]
+        return relative, os.path.join(self.root, *relative.split('/'))
+
+    @contextmanager
+    def writer(self, tenant, task_id):
+        """Binary file to stream a result into; yields ``(file, pointer)``.
+
+        The file only appears under its final name once the block exits cleanly.
+        """
+        relative, path = self.path_for(tenant, task_id)
+        directory = os.path.dirname(path)
+        tmp = os.path.join(directory, f'{TMP_PREFIX}{os.getpid()}-{os.path.basename(path)}')
+        pointer = {POINTER_KEY: relative.replace(os.sep, '/'), 'size': 0}
+        for attempt in range(OPEN_ATTEMPTS):
+            os.makedirs(directory, exist_ok=True)
+            try:
+                file = open(tmp, 'wb')
+                break
+            except FileNotFoundError:
+                # The sweeper removed the directory while it was still empty
+                if attempt == OPEN_ATTEMPTS - 1:
+                    raise
+        try:
+            with file:
+                yield file, pointer
+                file.flush()
+                os.fsync(file.fileno())
+                pointer['size'] = file.tell()
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def save(self, tenant, task_id, result):
+        """``result`` itself if it is small enough to store inline, else a pointer to its file."""
+        if result is None:
+            return None
+        # Encode piece by piece: only the first inline_limit bytes are buffered
+        chunks = json_codec.iterdumps(result)
+        head, size = [], 0
+        for chunk in chunks:
+            head.append(chunk)
+            size += len(chunk)
+            if size > self.inline_limit:
+                break
+        else:
+            return result
+        with self.writer(tenant, task_id) as (file, pointer):
+            file.writelines(head)
+            del head
+            file.writelines(chunks)
+        return pointer
+
+    def present(self, status):
+        """Replace a pointer result in a status dict with the URL to download it from."""
+        result = status.get('result')
+        if not is_pointer(result):
+            return status
+        status = dict(status)
+        del status['result']
+        status['result_url'] = self.base_url + status['task_id']
+        status['result_size'] = result['size']
+        return status
+
+    def sweep(self):
+        """Delete result files older than ``ttl`` and leftover temporary files; returns the count."""
+        cutoff = self._clock() - self.ttl
+        removed = 0
+        for directory, subdirs, files in os.walk(self.root, topdown=False):
+            for name in files:
+                if not (name.endswith(SUFFIX) or name.startswith(TMP_PREFIX)):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    if os.stat(path).st_mtime < cutoff:
+                        os.unlink(path)
+                        removed += 1
+                except FileNotFoundError:
+                    continue
+            if directory != self.root:
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    # Not empty, or a writer just created it
+                    pass
+        return removed
+
+
+def is_pointer(result):
+    return isinstance(result, dict) and POINTER_KEY in result
+
+
+class ResultSweeper(threading.Thread):
+    """Daemon thread that runs ``store.sweep()`` every ``interval`` seconds."""
+
+    def __init__(self, store, interval):
+        super().__init__(name='result-sweeper', daemon=True)
+        self.store = store
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                removed = self.store.sweep()
+            except Exception:
+                logger.exception("Result sweep failed")
+                continue
+            if removed:
+                logger.info("Removed %d expired result files", removed)
+
+    def stop(self):
+        self._stopped.set()
+
+
+def build_result_store(config):
+    return ResultStore(
+        config['RESULT_DIR'],
+        config['RESULT_BASE_URL'],
+        accel_url=config['RESULT_ACCEL_REDIRECT'],
+        inline_limit=config['RESULT_INLINE_MAX_BYTES'],
+        ttl=config['RESULT_FILE_TTL'],
+    )
+
+
+def init_result_store(app):
+    app.extensions['result_store'] = build_result_store(app.config)
+
+
+_sweeper = None
+
+
+@worker_ready.connect
+def start_result_sweeper(**kwargs):
+    # Once per worker node, in the main process; several nodes sweeping the same
+    # directory only race on unlinks, which are ignored
+    global _sweeper
+    from app.config import Config
+    interval = Config.RESULT_SWEEP_INTERVAL
+    if interval:
+        _sweeper = ResultSweeper(build_result_store(vars(Config)), interval)
+        _sweeper.start()
+
+
+@worker_shutdown.connect
+def stop_result_sweeper(**kwargs):
+    if _sweeper is not None:
+        _sweeper.stop()
@@ -0,0 +1,356 @@
+# schema_compiler.py
+
+import copy
+import hashlib
+import json
+import re
+import threading
+import logging
+from collections import OrderedDict
+from numbers import Number
+from jsonschema import Draft7Validator, SchemaError
+from app.validation import LENIENT, STRICT
+
+logger = logging.getLogger(__name__)
+
+# Plain Draft 7 validation, as jsonschema.validate does; LENIENT and STRICT also
+# normalize, as app.validation's validators of those modes do
+PLAIN = 'plain'
+
+DRAFT7_URIS = ('http://json-schema.org/draft-07/schema#', 'http://json-schema.org/draft-07/schema')
+
+# Keywords without effect on the verdict
+_ANNOTATIONS = frozenset({
+    '$schema', '$id', '$comment', 'title', 'description', 'default', 'examples', 'format',
+    'readOnly', 'writeOnly', 'definitions',
+})
+_KEYWORDS = frozenset({
+    'type', 'enum', 'const',
+    'minLength', 'maxLength', 'pattern',
+    'minimum', 'maximum', 'exclusiveMinimum', 'exclusiveMaximum',
+    'items', 'minItems', 'maxItems',
+    'properties', 'required', 'additionalProperties',
+})
+_STRING_KEYWORDS = ('minLength', 'maxLength', 'pattern')
+_NUMBER_KEYWORDS = ('minimum', 'maximum', 'exclusiveMinimum', 'exclusiveMaximum')
+_ARRAY_KEYWORDS = ('items', 'minItems', 'maxItems')
+_OBJECT_KEYWORDS = ('properties', 'required', 'additionalProperties')
+
+# Draft 7 type checks, as jsonschema's draft 6+ type checker defines them
+_TYPE_CHECKS = {
+    'object': 'isinstance({v}, dict)',
+    'array': 'isinstance({v}, list)',
+    'string': 'isinstance({v}, str)',
+    'boolean': 'isinstance({v}, bool)',
+    'null': '{v} is None',
+    'number': '(isinstance({v}, Number) and not isinstance({v}, bool))',
+    'integer': ('((isinstance({v}, int) and not isinstance({v}, bool))'
+                ' or (isinstance({v}, float) and {v}.is_integer()))'),
+}
+
+_MISSING = object()
+_DELETE = object()
+
+
+def _equal(one, two):
+    """JSON equality as jsonschema applies it for enum: true is not 1, but 1 is 1.0."""
+    if isinstance(one, str) or isinstance(two, str):
+        return one == two
+    if isinstance(one, (list, tuple)) and isinstance(two, (list, tuple)):
+        return len(one) == len(two) and all(_equal(a, b) for a, b in zip(one, two))
+    if isinstance(one, dict) and isinstance(two, dict):
+        return one.keys() == two.keys() and all(_equal(one[key], two[key]) for key in one)
+    if isinstance(one, bool) or isinstance(two, bool):
+        return one is two
+    return one == two
+
+
+def _in_enum(value, options):
+    return any(_equal(option, value) for option in options)
+
+
+# Names the generated code may use besides its own constants
+_NAMESPACE = {
+    'Number': Number, 're': re, 'deepcopy': copy.deepcopy, 'in_enum': _in_enum,
+    'MISSING': _MISSING, 'DELETE': _DELETE,
+}
+
+
+class Unsupported(Exception):
+    """The schema uses a keyword the compiler does not generate code for."""
+
+
+class _Generator:
+    """Builds the source of ``check(data)`` for one schema and mode.
+
+    ``check`` returns whether ``data`` is valid. In the normalizing modes it
+    records the keys to delete and the defaults to set while it checks, and only
+    applies them once the whole payload passed, so rejected data is left as it
+    was for the error reporting that follows.
+    """
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.constants = []
+        self.lines = []
+        self.names = 0
+
+    def name(self, prefix='v'):
+        self.names += 1
+        return f'{prefix}{self.names}'
+
+    def constant(self, expression):
+        name = self.name('c')
+        self.constants.append(f'{name} = {expression}')
+        return name
+
+    def emit(self, depth, line):
+        self.lines.append('    ' * depth + line)
+
+    def source(self, schema):
+        normalizing = self.mode != PLAIN
+        self.emit(0, 'def check(data):')
+        if normalizing:
+            self.emit(1, 'actions = []')
+        self.node(schema, 'data', 1)
+        if normalizing:
+            self.emit(1, 'for target, key, value in actions:')
+            self.emit(2, 'if value is DELETE:')
+            self.emit(3, 'del target[key]')
+            self.emit(2, 'elif isinstance(value, (dict, list)):')
+            self.emit(3, 'target[key] = deepcopy(value)')
+            self.emit(2, 'else:')
+            self.emit(3, 'target[key] = value')
+        self.emit(1, 'return True')
+        return '\n'.join([*self.constants, '', *self.lines, ''])
+
+    def node(self, schema, v, depth):
+        if schema is True:
+            return
+        if schema is False:
+            self.emit(depth, 'return False')
+            return
+        if not isinstance(schema, dict):
+            raise Unsupported(f"schema {schema!r}")
+        unknown = set(schema) - _KEYWORDS - _ANNOTATIONS
+        if unknown:
+            raise Unsupported(', '.join(sorted(unknown)))
+
+        known_type = None
+        if 'type' in schema:
+            types = schema['type'] if isinstance(schema['type'], list) else [schema['type']]
+            if any(t not in _TYPE_CHECKS for t in types):
+                raise Unsupported(f"type {schema['type']!r}")
+            self.emit(depth, f"if not ({' or '.join(_TYPE_CHECKS[t].format(v=v) for t in types)}):")
+            self.emit(depth + 1, 'return False')
+            if len(types) == 1:
+                known_type = types[0]
+
+        if 'enum' in schema:
+            self.enum(schema['enum'], v, depth)
+        if 'const' in schema:
+            self.enum([schema['const']], v, depth)
+
+        for type_name, keywords, block in (
+            ('string', _STRING_KEYWORDS, self.string),
+            ('number', _NUMBER_KEYWORDS, self.number),
+            ('array', _ARRAY_KEYWORDS, self.array),
+            ('object', _OBJECT_KEYWORDS, self.object),
+        ):
+            if not any(keyword in schema for keyword in keywords):
+                continue
+            inner = depth
+            # integer is a number too, so number keywords need no guard either
+            if known_type != type_name and not (type_name == 'number' and known_type == 'integer'):
+                self.emit(depth, f"if {_TYPE_CHECKS[type_name].format(v=v)}:")
+                inner = depth + 1
+            before = len(self.lines)
+            block(schema, v, inner)
+            if len(self.lines) == before and inner != depth:
+                self.lines.pop()
+
+    def enum(self, options, v, depth):
+        if options and all(isinstance(option, str) for option in options):
+            allowed = self.constant(f'frozenset({sorted(options)!r})')
+            self.emit(depth, f"if not (isinstance({v}, str) and {v} in {allowed}):")
+        else:
+            allowed = self.constant(repr(options))
+            self.emit(depth, f"if not in_enum({v}, {allowed}):")
+        self.emit(depth + 1, 'return False')
+
+    def string(self, schema, v, depth):
+        if 'minLength' in schema:
+            self.emit(depth, f"if len({v}) < {schema['minLength']!r}:")
+            self.emit(depth + 1, 'return False')
+        if 'maxLength' in schema:
+            self.emit(depth, f"if len({v}) > {schema['maxLength']!r}:")
+            self.emit(depth + 1, 'return False')
+        if 'pattern' in schema:
+            pattern = self.constant(f"re.compile({schema['pattern']!r})")
+            self.emit(depth, f"if not {pattern}.search({v}):")
+            self.emit(depth + 1, 'return False')
+
+    def number(self, schema, v, depth):
+        for keyword, operator in (('minimum', '<'), ('maximum', '>'), ('exclusiveMinimum', '<='),
+                                  ('exclusiveMaximum', '>=')):
+            if keyword in schema:
+                self.emit(depth, f"if {v} {operator} {schema[keyword]!r}:")
+                self.emit(depth + 1, 'return False')
+
+    def array(self, schema, v, depth):
+        if 'minItems' in schema:
+            self.emit(depth, f"if len({v}) < {schema['minItems']!r}:")
+            self.emit(depth + 1, 'return False')
+        if 'maxItems' in schema:
+            self.emit(depth, f"if len({v}) > {schema['maxItems']!r}:")
+            self.emit(depth + 1, 'return False')
+        if 'items' in schema:
+            items = schema['items']
+            if isinstance(items, list):
+                raise Unsupported("items as a list")
+            if items is True or items == {}:
+                return
+            item = self.name()
+            self.emit(depth, f"for {item} in {v}:")
+            before = len(self.lines)
+            self.node(items, item, depth + 1)
+            if len(self.lines) == before:
+                self.emit(depth + 1, 'pass')
+
+    def object(self, schema, v, depth):
+        properties = schema.get('properties', {})
+        required = schema.get('required', [])
+        for name in required:
+            self.emit(depth, f"if {name!r} not in {v}:")
+            self.emit(depth + 1, 'return False')
+
+        if 'patternProperties' in schema:
+            raise Unsupported("patternProperties")
+        additional = schema.get('additionalProperties', True)
+        if not isinstance(additional, bool):
+            raise Unsupported("additionalProperties as a schema")
+        # Matches app.validation: unknown keys are handled where a schema lists
+        # properties and says nothing about additional ones
+        normalizes = self.mode != PLAIN and 'properties' in schema and 'additionalProperties' not in schema
+        if normalizes and self.mode == LENIENT and not set(required) <= set(properties):
+            # Stripping would remove a required key and the verdict would depend on keyword order
+            raise Unsupported("required properties missing from properties")
+        if additional is False or (normalizes and self.mode == STRICT):
+            known = self.constant(f'frozenset({sorted(properties)!r})')
+            self.emit(depth, f"for key in {v}:")
+            self.emit(depth + 1, f"if key not in {known}:")
+            self.emit(depth + 2, 'return False')
+        elif normalizes:
+            known = self.constant(f'frozenset({sorted(properties)!r})')
+            self.emit(depth, f"for key in {v}:")
+            self.emit(depth + 1, f"if key not in {known}:")
+            self.emit(depth + 2, f"actions.append(({v}, key, DELETE))")
+
+        for name, subschema in properties.items():
+            default = (
+                self.mode != PLAIN and isinstance(subschema, dict) and 'default' in subschema
+                and name not in required
+            )
+            value = self.name()
+            self.emit(depth, f"{value} = {v}.get({name!r}, MISSING)")
+            self.emit(depth, f"if {value} is not MISSING:")
+            before = len(self.lines)
+            self.node(subschema, value, depth + 1)
+            if len(self.lines) == before:
+                self.emit(depth + 1, 'pass')
+            if default:
+                self.emit(depth, 'else:')
+                self.emit(depth + 1, f"actions.append(({v}, {name!r}, {self.constant(repr(subschema['default']))}))")
+
+
+def generate(schema, mode=PLAIN):
+    """Source of a module defining ``check(data)`` for ``schema``; raises Unsupported."""
+    if isinstance(schema, dict) and schema.get('$schema', DRAFT7_URIS[0]) not in DRAFT7_URIS:
+        raise Unsupported(f"$schema {schema['$schema']}")
+    return _Generator(mode).source(schema)
+
+
+def schema_key(schema, mode):
+    content = json.dumps(schema, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(f'{mode}:{content}'.encode()).hexdigest()[:32]
+
+
+class SchemaCompiler:
+    """Turns schemas into specialized Python ``check`` functions, cached by content hash.
+
+    ``compile`` returns None for schemas using keywords the generator does not
+    cover (anyOf, $ref, patternProperties, ...), and for invalid schemas;
+    callers then fall back to jsonschema. Generated code only ever lives in
+    memory: it is executed, so it is never read back from a file another
+    process could have written.
+    """
+
+    def __init__(self, enabled=True, recent_size=256):
+        self.enabled = enabled
+        self.recent_size = recent_size
+        self._lock = threading.Lock()
+        self._compiled = {}
+        # (id(schema), mode) -> (schema, check), so callers passing the same dict skip hashing it
+        self._recent = OrderedDict()
+
+    def configure(self, enabled):
+        self.enabled = enabled
+
+    def compile(self, schema, mode=PLAIN):
+        if not self.enabled:
+            return None
+        try:
+            key = schema_key(schema, mode)
+        except (TypeError, ValueError):
+            return None
+        try:
+            return self._compiled[key]
+        except KeyError:
+            pass
+        check = self._build(schema, mode, key)
+        self._compiled[key] = check
+        return check
+
+    def for_schema(self, schema, mode=PLAIN):
+        """``compile`` for callers that pass the same schema dict repeatedly.
+
+        Schemas are treated as immutable once compiled.
+        """
+        if not self.enabled:
+            return None
+        recent_key = (id(schema), mode)
+        with self._lock:
+            entry = self._recent.get(recent_key)
+            if entry is not None and entry[0] is schema:
+                self._recent.move_to_end(recent_key)
+                return entry[1]
+        check = self.compile(schema, mode)
+        with self._lock:
+            self._recent[recent_key] = (schema, check)
+            while len(self._recent) > self.recent_size:
+                self._recent.popitem(last=False)
+        return check
+
+    def _build(self, schema, mode, key):
+        try:
+            Draft7Validator.check_schema(schema)
+        except SchemaError:
+            return None
+        try:
+            source = generate(schema, mode)
+        except Unsupported as e:
+            logger.debug("Not compiling schema (%s mode): unsupported %s", mode, e)
+            return None
+        except RecursionError:
+            return None
+        namespace = dict(_NAMESPACE)
+        try:
+            exec(compile(source, f'<schema {key}>', 'exec'), namespace)
+        except (SyntaxError, RecursionError, MemoryError):
+            # e.g. nesting beyond the interpreter's static block limit
+            logger.debug("Compiled schema %s is too deeply nested; using jsonschema", key)
+            return None
+        return namespace['check']
+
+
+compiler = SchemaCompiler()
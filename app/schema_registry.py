@@ -0,0 +1,220 @@
+# schema_registry.py
+
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+import logging
+from collections import OrderedDict
+from jsonschema import Draft7Validator, SchemaError
+from app.schema_compiler import PLAIN, compiler
+from app.validation import MODES, build_normalizers
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'json_schemas')
+CONFIG_TYPES = ('request', 'response')
+# Response header naming the schema version a request was validated against
+SCHEMA_VERSION_HEADER = 'Schema-Version'
+
+
+def schema_version(content):
+    """Version id of a schema file: a short hash of its bytes, so equal files share a version."""
+    return hashlib.sha256(content).hexdigest()[:12]
+
+
+class CompiledSchema:
+    """A schema checked once and kept with everything the request path needs from it."""
+
+    def __init__(self, endpoint, config_type, schema, version=None):
+        Draft7Validator.check_schema(schema)
+        self.endpoint = endpoint
+        self.config_type = config_type
+        self.schema = schema
+        self.version = version
+        self.validator = Draft7Validator(schema)
+        self.normalizers = build_normalizers(schema)
+        # Generated validators answer valid/invalid (None when the schema is not
+        # supported); jsonschema still reports the errors of invalid data
+        self.check = compiler.compile(schema, PLAIN)
+        self.fast_normalizers = {}
+        if self.normalizers is not None:
+            self.fast_normalizers = {mode: compiler.compile(schema, mode) for mode in MODES}
+        properties = schema.get('properties', {})
+        self.allowed_properties = frozenset(properties)
+        self.defaults = {k: v['default'] for k, v in properties.items() if 'default' in v}
+        # Arrays of objects are validated item by item as the body streams in;
+        # ``outer`` checks the rest of the object, those arrays' items excluded
+        self.streamed = {}
+        self.outer = self
+        if config_type == 'request' and self.normalizers is not None:
+            self.streamed = {
+                name: CompiledSchema(endpoint, 'item', prop['items'], version)
+                for name, prop in properties.items()
+                if prop.get('type') == 'array' and isinstance(prop.get('items'), dict)
+                and prop['items'].get('type') == 'object'
+            }
+            if self.streamed:
+                outer = dict(schema, properties={
+                    name: {k: v for k, v in prop.items() if not (name in self.streamed and k == 'items')}
+                    for name, prop in properties.items()
+                })
+                self.outer = CompiledSchema(endpoint, 'outer', outer, version)
+
+
+class _Entry:
+    """The versions kept for one schema file, oldest first, and the stat of the file they came from.
+
+    Entries are never modified once published; a change builds a new one.
+    """
+
+    __slots__ = ('versions', 'stat', 'current')
+
+    def __init__(self, stat=None, versions=None, current=None):
+        self.versions = versions if versions is not None else OrderedDict()
+        self.stat = stat
+        self.current = current
+
+
+class SchemaRegistry:
+    """Compiled schemas from ``schema_dir``, reloaded when their files change.
+
+    Files are stat'ed at most once per ``reload_interval`` seconds (0 disables
+    reloading); a file is only read again when its mtime or size changed, and only
+    recompiled when its content hash did. A new version replaces the current one
+    in a single assignment, so a request sees either the old or the new schema.
+    The last ``keep_versions`` versions of each file this process has loaded stay
+    available through ``get(..., version=)``, so a task is checked against the
+    version it was accepted under (see tasks._check_schema_version). A file that
+    fails to parse or compile on reload is logged and the current version kept.
+    """
+
+    def __init__(self, schema_dir=SCHEMA_DIR, reload_interval=0, keep_versions=5, clock=time.monotonic):
+        self.schema_dir = schema_dir
+        self.reload_interval = reload_interval
+        self.keep_versions = keep_versions
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._next_check = 0.0
+        self._entries = {}
+        self._listeners = {}
+
+    def configure(self, reload_interval, keep_versions):
+        self.reload_interval = reload_interval
+        self.keep_versions = keep_versions
+
+    def subscribe(self, listener, name=None):
+        """Call ``listener(compiled)`` whenever a new version of a schema is swapped in.
+
+        A listener subscribed under a ``name`` replaces the previous one of that
+        name, so code that runs once per app can subscribe without piling up
+        listeners across apps.
+        """
+        self._listeners[name if name is not None else listener] = listener
+
+    def _path(self, endpoint, config_type):
+        return os.path.join(self.schema_dir, f'{endpoint}_{config_type}.json')
+
+    def _stat(self, file_path):
+        try:
+            stat = os.stat(file_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _update(self, key, entry):
+        """``entry`` brought up to date with its file, and the newly compiled schema or None."""
+        file_path = self._path(*key)
+        stat = self._stat(file_path)
+        if stat is None or stat == entry.stat:
+            return entry, None
+        with open(file_path, 'rb') as file:
+            content = file.read()
+        versions = OrderedDict(entry.versions)
+        version = schema_version(content)
+        if version in versions:
+            # Touched, or reverted to a version still kept: nothing to parse
+            versions.move_to_end(version)
+            compiled = versions[version] if versions[version] is not entry.current else None
+        else:
+            compiled = versions[version] = CompiledSchema(*key, json.loads(content), version=version)
+            while len(versions) > max(self.keep_versions, 1):
+                versions.popitem(last=False)
+            logger.debug("Compiled schema %s_%s version %s", key[0], key[1], version)
+        return _Entry(stat, versions, versions[version]), compiled
+
+    def load(self):
+        """Compile every ``*_request.json`` and ``*_response.json`` in the schema directory."""
+        entries = dict(self._entries)
+        for config_type in CONFIG_TYPES:
+            suffix = f'_{config_type}.json'
+            for file_path in sorted(glob.glob(os.path.join(self.schema_dir, f'*{suffix}'))):
+                key = (os.path.basename(file_path)[:-len(suffix)], config_type)
+                entries[key], _ = self._update(key, entries.get(key, _Entry()))
+        self._entries = entries
+        self._next_check = self._clock() + self.reload_interval
+        return self
+
+    def refresh(self):
+        """Swap in new versions of changed schema files; returns the ones compiled."""
+        entries = dict(self._entries)
+        changed = []
+        for config_type in CONFIG_TYPES:
+            suffix = f'_{config_type}.json'
+            for file_path in glob.glob(os.path.join(self.schema_dir, f'*{suffix}')):
+                key = (os.path.basename(file_path)[:-len(suffix)], config_type)
+                entries.setdefault(key, _Entry())
+        for key, entry in list(entries.items()):
+            try:
+                entries[key], compiled = self._update(key, entry)
+            except (OSError, ValueError, SchemaError):
+                logger.exception("Keeping schema %s_%s; the changed file could not be loaded", *key)
+                continue
+            if compiled is not None:
+                logger.info("Schema %s_%s now at version %s", key[0], key[1], compiled.version)
+                changed.append(compiled)
+        self._entries = entries
+        for compiled in changed:
+            for listener in list(self._listeners.values()):
+                listener(compiled)
+        return changed
+
+    def _maybe_refresh(self):
+        if not self.reload_interval or self._clock() < self._next_check:
+            return
+        # One thread checks the files; the others carry on with the current versions
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._next_check = self._clock() + self.reload_interval
+            self.refresh()
+        finally:
+            self._lock.release()
+
+    def get(self, endpoint, config_type, version=None):
+        """Return the CompiledSchema for an endpoint, or None if it has no schema file.
+
+        With ``version``, return that version if it is still kept, else None.
+        """
+        self._maybe_refresh()
+        key = (endpoint.lstrip('/'), config_type)
+        entry = self._entries.get(key)
+        if entry is None:
+            entry, _ = self._update(key, _Entry())
+            self._entries = {**self._entries, key: entry}
+        if version is not None:
+            return entry.versions.get(version)
+        return entry.current
+
+    def versions(self, endpoint, config_type):
+        """Versions kept for an endpoint's schema, oldest first."""
+        entry = self._entries.get((endpoint.lstrip('/'), config_type))
+        return list(entry.versions) if entry is not None else []
+
+    def clear(self):
+        self._entries = {}
+
+
+registry = SchemaRegistry()
@@ -0,0 +1,304 @@
+# streaming.py
+
+import codecs
+import json
+from app import json_codec
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl', 'application/x-jsonlines')
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\r\n'
+# Distinct property names remembered while streaming one object's arrays
+MAX_SHARED_KEYS = 10000
+# Longest token the decoder reports an error at the start of ('-Infinity', a \\uXXXX escape)
+_MAX_TOKEN = 9
+
+
+class StreamParseError(ValueError):
+    def __init__(self, message, index=None):
+        super().__init__(message)
+        self.index = index
+
+
+def _iter_text(stream, chunk_size):
+    """Decode a binary stream as UTF-8; invalid bytes raise StreamParseError."""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    # Bytes read before the current chunk
+    offset = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        # The decoder holds back the start of a character split across chunks
+        pending = len(decoder.getstate()[0])
+        try:
+            text = decoder.decode(chunk, final=not chunk)
+        except UnicodeDecodeError as e:
+            raise StreamParseError(f"Invalid UTF-8 at byte {offset - pending + e.start}") from None
+        if text:
+            yield text
+        if not chunk:
+            return
+        offset += len(chunk)
+
+
+def iter_ndjson(stream, chunk_size=DEFAULT_CHUNK_SIZE, max_depth=None, max_line_size=None):
+    """Yield ``(index, item)`` for each non-blank line of an NDJSON stream.
+
+    A line that is not valid JSON, nests deeper than ``max_depth`` or is longer
+    than ``max_line_size`` characters yields ``(index, StreamParseError)`` instead
+    so the caller can report it and carry on with the next line. The rest of an
+    overlong line is skipped as it arrives rather than buffered.
+    """
+    index = 0
+    # The unfinished line so far, and whether it was already reported as too long
+    parts = []
+    size = 0
+    skipping = False
+    for text in _iter_text(stream, chunk_size):
+        *lines, rest = text.split('\n')
+        for line in lines:
+            if not skipping:
+                line = ''.join(parts) + line
+                if line.strip():
+                    yield index, _parse_line(line, index, max_depth, max_line_size)
+                    index += 1
+            parts, size, skipping = [], 0, False
+        if rest and not skipping:
+            parts.append(rest)
+            size += len(rest)
+            if max_line_size is not None and size > max_line_size:
+                yield index, _line_too_long(index, max_line_size)
+                index += 1
+                parts, size, skipping = [], 0, True
+    line = ''.join(parts)
+    if line.strip():
+        yield index, _parse_line(line, index, max_depth, max_line_size)
+
+
+def _line_too_long(index, max_line_size):
+    return StreamParseError(f"Line {index + 1} is longer than {max_line_size} characters", index)
+
+
+def _parse_line(line, index, max_depth, max_line_size=None):
+    if max_line_size is not None and len(line) > max_line_size:
+        return _line_too_long(index, max_line_size)
+    try:
+        item = json_codec.loads(line)
+        if max_depth is not None:
+            check_depth(item, max_depth, f"line {index + 1}")
+        return item
+    except json.JSONDecodeError as e:
+        return StreamParseError(f"Invalid JSON on line {index + 1}: {e.msg}", index)
+    except RecursionError:
+        return StreamParseError(f"JSON nested too deeply on line {index + 1}", index)
+    except StreamParseError as e:
+        e.index = index
+        return e
+
+
+class _Reader:
+    """Incremental JSON reader over the decoded text of a byte stream.
+
+    Holds the unconsumed text and decodes one value at a time, pulling in more
+    input only when a value is not complete yet. A value longer than
+    ``max_value_size`` characters is rejected once that much of it is buffered.
+    """
+
+    def __init__(self, stream, chunk_size, max_value_size=None):
+        self.chunks = _iter_text(stream, chunk_size)
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.max_value_size = max_value_size
+
+    def fill(self, min_chars=1):
+        parts = []
+        size = 0
+        while size < min_chars:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                self.eof = True
+                break
+            parts.append(chunk)
+            size += len(chunk)
+        if not parts:
+            return False
+        self.buffer = self.buffer[self.pos:] + ''.join(parts)
+        self.pos = 0
+        return True
+
+    def grow(self):
+        # Double the pending text so a large item is re-decoded O(log n) times
+        return self.fill(max(len(self.buffer) - self.pos, 1))
+
+    def check_size(self, size, describe):
+        if self.max_value_size is not None and size > self.max_value_size:
+            raise StreamParseError(f"{describe} is longer than {self.max_value_size} characters")
+
+    def peek(self):
+        """Next non-whitespace character, or '' at the end of input."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ''
+
+    def value(self, describe):
+        """Decode the next value; ``describe`` names it in error messages."""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as e:
+                # More input only helps if the value runs off the end of what has been read
+                if self.eof or not _truncated(self.buffer, e):
+                    raise StreamParseError(f"Invalid JSON in {describe}: {e.msg}")
+                self.check_size(len(self.buffer) - self.pos, describe)
+                if not self.grow():
+                    raise StreamParseError(f"Invalid JSON in {describe}: {e.msg}")
+                continue
+            except RecursionError:
+                raise StreamParseError(f"JSON nested too deeply in {describe}") from None
+            self.check_size(end - self.pos, describe)
+            # A number at the end of the buffer, or cut off before its fraction or
+            # exponent ('1.', '1e-'), may continue in the next chunk
+            if not self.eof and (end == len(self.buffer) or _number(value) and end >= len(self.buffer) - 2):
+                if self.grow():
+                    continue
+            self.pos = end
+            return value
+
+    def expect(self, chars, message):
+        char = self.peek()
+        if not char or char not in chars:
+            raise StreamParseError(message)
+        self.pos += 1
+        return char
+
+    def items(self, describe='item'):
+        """Yield ``(index, value)`` for each element of the array starting at the next character."""
+        self.expect('[', "Expected a JSON array")
+        index = 0
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            try:
+                item = self.value(f"{describe} {index}")
+            except StreamParseError as e:
+                e.index = index
+                raise
+            yield index, item
+            index += 1
+            if not self.peek():
+                raise StreamParseError("Unterminated JSON array", index)
+            if self.expect(',]', f"Expected ',' or ']' after {describe} {index - 1}") == ']':
+                return
+
+    def end(self, message):
+        if self.peek():
+            raise StreamParseError(message)
+
+
+def _number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _truncated(text, error):
+    """Whether decoding ``text`` failed only because it ends mid-value, not on a syntax error."""
+    return error.msg.startswith('Unterminated string') or error.pos > len(text) - _MAX_TOKEN
+
+
+def check_depth(value, max_depth, describe='body'):
+    """Raise StreamParseError if containers in ``value`` nest deeper than ``max_depth``."""
+    stack = [(value, 1)]
+    while stack:
+        value, depth = stack.pop()
+        if isinstance(value, dict):
+            children = value.values()
+        elif isinstance(value, list):
+            children = value
+        else:
+            continue
+        if depth > max_depth:
+            raise StreamParseError(f"JSON in {describe} is nested deeper than {max_depth} levels")
+        stack.extend((child, depth + 1) for child in children if isinstance(child, (dict, list)))
+
+
+def _share_keys(value, memo):
+    # Each raw_decode call has its own key cache, so items decoded one at a time
+    # would otherwise keep a separate copy of every property name
+    if isinstance(value, dict):
+        return {memo.setdefault(key, key): _share_keys(item, memo) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_share_keys(item, memo) for item in value]
+    return value
+
+
+def iter_json_array(stream, chunk_size=DEFAULT_CHUNK_SIZE, max_depth=None, max_item_size=None):
+    """Yield ``(index, item)`` for each element of a top-level JSON array.
+
+    Elements are decoded as soon as they are complete, so only the current element
+    and one chunk of input are held in memory. Malformed input, or an element
+    nesting deeper than ``max_depth`` or longer than ``max_item_size``
+    characters, raises StreamParseError.
+    """
+    reader = _Reader(stream, chunk_size, max_item_size)
+    for index, item in reader.items():
+        if max_depth is not None:
+            try:
+                check_depth(item, max_depth, f"item {index}")
+            except StreamParseError as e:
+                e.index = index
+                raise
+        yield index, item
+    reader.end("Unexpected data after JSON array")
+
+
+def read_object(stream, arrays, max_depth, chunk_size=DEFAULT_CHUNK_SIZE, max_item_size=None):
+    """Decode a top-level JSON object, streaming the arrays named in ``arrays``.
+
+    ``arrays`` maps a property name to ``handler(index, item)``, called as each
+    element is decoded; its return value is what the array keeps. A handler can
+    raise to stop reading, so a bad element rejects the body before the rest of
+    it arrives. Other values are decoded whole. Every value is checked against
+    ``max_depth``, counting the top-level object as one level, and no array
+    element or other value may be longer than ``max_item_size`` characters.
+    """
+    reader = _Reader(stream, chunk_size, max_item_size)
+    reader.expect('{', "Expected a JSON object")
+    result = {}
+    keys = {}
+    if reader.peek() == '}':
+        reader.pos += 1
+    else:
+        while True:
+            if reader.peek() != '"':
+                raise StreamParseError("Expected a property name")
+            key = reader.value("property name")
+            reader.expect(':', f"Expected ':' after {key!r}")
+            handler = arrays.get(key)
+            if handler is not None and reader.peek() == '[':
+                items = []
+                for index, item in reader.items(f"{key} item"):
+                    check_depth(item, max_depth - 2, f"{key}[{index}]")
+                    if len(keys) > MAX_SHARED_KEYS:
+                        keys.clear()
+                    items.append(handler(index, _share_keys(item, keys)))
+                result[key] = items
+            else:
+                value = reader.value(repr(key))
+                check_depth(value, max_depth - 1, repr(key))
+                result[key] = value
+            if reader.expect(',}', f"Expected ',' or '}}' after {key!r}") == '}':
+                break
+    reader.end("Unexpected data after JSON object")
+    return result
+
+
+def iter_batch(stream, mimetype, chunk_size=DEFAULT_CHUNK_SIZE, max_depth=None, max_item_size=None):
+    if mimetype in NDJSON_MIMETYPES:
+        return iter_ndjson(stream, chunk_size, max_depth, max_item_size)
+    return iter_json_array(stream, chunk_size, max_depth, max_item_size)
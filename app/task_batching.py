@@ -0,0 +1,222 @@
+# task_batching.py
+
+import logging
+import time
+import traceback
+from celery import signals, states
+from celery.app.task import Context
+from celery.exceptions import Retry
+from celery.worker.state import task_ready
+from app.celery_app import ContextTask, celery
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class BatchItem:
+    """One task message of a batch, as the batch handler sees it.
+
+    The handler settles every item with ``succeed``, ``fail``, ``retry`` or
+    ``ignore``; an item it leaves unsettled fails.
+    """
+
+    def __init__(self, task, request):
+        self.task = task
+        self.request = Context(request, called_directly=False, is_eager=False)
+        self.id = self.request.id
+        self.args = self.request.args
+        self.kwargs = self.request.kwargs
+        self.state = None
+        self.result = None
+
+    def succeed(self, result=None):
+        self.state, self.result = states.SUCCESS, result
+
+    def fail(self, exc):
+        self.state, self.result = states.FAILURE, exc
+
+    def ignore(self):
+        self.state = states.IGNORED
+
+    def retry(self, **options):
+        """Publish the message again, as ``Task.retry`` does, with these retry options.
+
+        The item fails instead once it has used up ``max_retries``.
+        """
+        self.task.request_stack.push(self.request)
+        try:
+            self.task.retry(**options)
+        except Retry as e:
+            self.state, self.result = states.RETRY, e
+        except self.task.MaxRetriesExceededError as e:
+            self.fail(e)
+        finally:
+            self.task.pop_request()
+
+    def store(self):
+        backend = self.task.backend
+        if self.state == states.SUCCESS:
+            if not (self.task.ignore_result or self.request.ignore_result):
+                backend.mark_as_done(self.id, self.result, request=self.request)
+        elif self.state == states.FAILURE:
+            tb = ''.join(traceback.format_exception(type(self.result), self.result, self.result.__traceback__))
+            backend.mark_as_failure(self.id, self.result, tb, request=self.request)
+        elif self.state == states.RETRY:
+            backend.mark_as_retry(self.id, self.result.exc, request=self.request)
+
+
+def _send(signal, task, item, **kwargs):
+    # Signal handlers (e.g. app.metrics) read the running task's request
+    task.request_stack.push(item.request)
+    try:
+        signal.send(sender=task, task_id=item.id, task=task, args=item.args, kwargs=item.kwargs, **kwargs)
+    finally:
+        task.pop_request()
+
+
+def execute_batch(task_name, requests):
+    """Run one batch in a pool process; returns the state of each request, in order."""
+    task = celery.tasks[task_name]
+    return task.in_app_context(task.run_batch, requests)
+
+
+def batch_time_limits(task, requests):
+    """``(soft, hard)`` pool time limits for a batch: each message's limits, added up.
+
+    A message's limits come from its ``timelimit`` header (``apply_async(time_limit=...)``)
+    or else the task's, as for a message run alone. The batch has no limit of a kind
+    when any of its messages has none.
+    """
+    soft = hard = 0
+    for request in requests:
+        time_limit, soft_time_limit = request.time_limits
+        soft_time_limit = soft_time_limit or task.soft_time_limit
+        time_limit = time_limit or task.time_limit
+        soft = soft + soft_time_limit if soft is not None and soft_time_limit else None
+        hard = hard + time_limit if hard is not None and time_limit else None
+    return soft, hard
+
+
+class _Batcher:
+    """Collects a task's requests in the worker's consumer and hands them to the pool in batches.
+
+    Runs in the consumer's event loop, like the timer that flushes a partial
+    batch, so it needs no locking.
+    """
+
+    def __init__(self, task, consumer):
+        self.task = task
+        self.pool = consumer.pool
+        self.timer = consumer.timer
+        self.buffer = []
+        self.flush_entry = None
+
+    def add(self, request):
+        self.buffer.append(request)
+        if len(self.buffer) >= self.task.batch_size:
+            self.flush()
+        elif self.flush_entry is None:
+            self.flush_entry = self.timer.call_after(self.task.batch_interval, self.flush)
+
+    def flush(self):
+        if self.flush_entry is not None:
+            self.flush_entry.cancel()
+            self.flush_entry = None
+        requests = [request for request in self.buffer if not request.revoked()]
+        self.buffer = []
+        if not requests:
+            return
+        task = self.task
+
+        def on_accepted(pid, time_accepted):
+            for request in requests:
+                request.on_accepted(pid, time_accepted)
+
+        def on_done(batch_states):
+            for request, state in zip(requests, batch_states):
+                if state == states.SUCCESS:
+                    request.on_success((False, None, 0))
+                    continue
+                task_ready(request)
+                if task.acks_late:
+                    request.acknowledge()
+
+        def on_failure(exc_info):
+            for request in requests:
+                request.on_failure(exc_info)
+
+        def on_timeout(soft, timeout):
+            for request in requests:
+                request.on_timeout(soft, timeout)
+
+        soft_time_limit, time_limit = batch_time_limits(task, requests)
+        self.pool.apply_async(
+            execute_batch,
+            args=(task.name, [request.request_dict for request in requests]),
+            accept_callback=on_accepted,
+            callback=on_done,
+            error_callback=on_failure,
+            timeout_callback=on_timeout,
+            soft_timeout=soft_time_limit,
+            timeout=time_limit,
+            correlation_id=requests[0].id,
+        )
+
+
+class _BufferingConsumer:
+    """The worker consumer as the default strategy sees it, with requests going to a _Batcher."""
+
+    def __init__(self, consumer, on_task_request):
+        self._consumer = consumer
+        self.on_task_request = on_task_request
+
+    def __getattr__(self, name):
+        return getattr(self._consumer, name)
+
+
+class BatchingTask(ContextTask):
+    """A task a worker can run in batches of ``batch_size`` messages.
+
+    With ``batch_size`` over 1 the worker buffers the task's messages until it
+    has that many, or ``batch_interval`` seconds passed since the first, and
+    runs ``batch_handler(self, items)``, which settles a list of BatchItem,
+    once over all of them in a pool process. Each message is still acked, and its result stored, under
+    its own task id. Calls outside a worker (``apply``, eager mode), and
+    messages with an ETA or countdown, run one at a time as usual.
+
+    Time limits apply to the batch as a whole, scaled to its size: the batch
+    may run for the sum of its messages' limits (see batch_time_limits). The
+    soft limit raises SoftTimeLimitExceeded in the handler, failing the items
+    it has not settled; the hard limit kills the pool process and fails them all.
+    """
+
+    batch_size = Config.TASK_BATCH_SIZE
+    batch_interval = Config.TASK_BATCH_INTERVAL
+    # Set per task, e.g. @celery.task(base=BatchingTask, batch_handler=...)
+    batch_handler = None
+
+    def start_strategy(self, app, consumer, **kwargs):
+        if self.batch_size <= 1 or self.batch_handler is None:
+            return super().start_strategy(app, consumer, **kwargs)
+        batcher = _Batcher(self, consumer)
+        return super().start_strategy(app, _BufferingConsumer(consumer, batcher.add), **kwargs)
+
+    def run_batch(self, requests):
+        started = time.perf_counter()
+        items = [BatchItem(self, request) for request in requests]
+        for item in items:
+            _send(signals.task_prerun, self, item)
+        try:
+            self.batch_handler(items)
+        except Exception as e:
+            logger.exception("Batch of %d %s tasks failed", len(items), self.name)
+            for item in items:
+                if item.state is None:
+                    item.fail(e)
+        for item in items:
+            if item.state is None:
+                item.fail(RuntimeError(f"Batch handler did not settle task {item.id}"))
+            item.store()
+            _send(signals.task_postrun, self, item, retval=item.result, state=item.state)
+        logger.info("Batch of %d %s tasks ran in %.3fs", len(items), self.name, time.perf_counter() - started)
+        return [item.state for item in items]
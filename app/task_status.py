@@ -0,0 +1,90 @@
+# task_status.py
+
+import time
+import logging
+from celery import states
+from celery.backends.base import KeyValueStoreBackend
+from celery.exceptions import TimeoutError as CeleryTimeoutError
+from celery.result import AsyncResult
+from kombu.utils.functional import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Finished tasks never change state, so their status is safe to serve from memory
+_terminal_cache = LRUCache(limit=10000)
+
+
+def configure_status_cache(size):
+    _terminal_cache.limit = size
+    _terminal_cache.clear()
+
+
+def _describe(backend, task_id, meta):
+    status = meta.get('status', states.PENDING)
+    described = {"task_id": task_id, "status": status}
+    if status == states.SUCCESS:
+        described["result"] = meta.get('result')
+    elif status in states.PROPAGATE_STATES:
+        exc = backend.exception_to_python(meta.get('result'))
+        described["error"] = f"{type(exc).__name__}: {exc}" if exc is not None else status
+    if meta.get('date_done'):
+        described["date_done"] = str(meta['date_done'])
+    return described
+
+
+def _fetch(backend, task_ids):
+    """Return ``{task_id: meta}``; key-value backends like Redis answer in one MGET."""
+    if isinstance(backend, KeyValueStoreBackend):
+        keys = [backend.get_key_for_task(task_id) for task_id in task_ids]
+        values = backend.mget(keys)
+        if hasattr(values, 'get'):
+            # Memcached-style clients return a mapping rather than a list
+            values = [values.get(key) for key in keys]
+        return {
+            task_id: backend.decode_result(value) if value else {'status': states.PENDING}
+            for task_id, value in zip(task_ids, values)
+        }
+    return {task_id: backend.get_task_meta(task_id) for task_id in task_ids}
+
+
+def get_statuses(celery_app, task_ids, wait=0):
+    """Describe each task, blocking up to ``wait`` seconds for unfinished ones.
+
+    Waiting goes through AsyncResult.get, which the Redis result backend serves
+    from a pub/sub subscription instead of polling.
+    """
+    backend = celery_app.backend
+    found = {}
+    missing = []
+    for task_id in task_ids:
+        cached = _terminal_cache.get(task_id)
+        if cached is not None:
+            found[task_id] = cached
+        else:
+            missing.append(task_id)
+
+    unique_missing = list(dict.fromkeys(missing))
+    if unique_missing:
+        for task_id, meta in _fetch(backend, unique_missing).items():
+            found[task_id] = _describe(backend, task_id, meta)
+
+    deadline = time.monotonic() + wait
+    for task_id in unique_missing:
+        if found[task_id]["status"] in states.READY_STATES:
+            continue
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            AsyncResult(task_id, app=celery_app).get(
+                timeout=remaining, propagate=False, disable_sync_subtasks=False
+            )
+        except CeleryTimeoutError:
+            break
+        found[task_id] = _describe(backend, task_id, _fetch(backend, [task_id])[task_id])
+
+    for task_id in unique_missing:
+        if found[task_id]["status"] in states.READY_STATES:
+            _terminal_cache[task_id] = found[task_id]
+
+    return [found[task_id] for task_id in task_ids]
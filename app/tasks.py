@@ -1,12 +1,196 @@
 import logging
-from celery import Celery
+from collections import Counter
+from celery.exceptions import Ignore
+from flask import current_app
+from app.celery_app import celery
+from app.logging_config import log_payload
+from app.queues import slot_retry_delay
+from app.schema_registry import registry
+from app.task_batching import BatchingTask
+# Registers the Celery signal handlers for task runtime and queue wait metrics
+import app.metrics  # noqa: F401
+# Starts the expired result file sweeper when a worker comes up
+import app.result_store  # noqa: F401
 
-celery = Celery(__name__)
+logger = logging.getLogger(__name__)
 
-@celery.task(name='app.tasks.process_task')
-def process_task(data):
+def process_task_batch(self, items):
+    """process_task over a batch of messages (see BatchingTask), with the webhooks delivered together."""
+    tracker = current_app.extensions['queue_tracker']
+    slots = current_app.extensions['tenant_slots']
+    idempotency = current_app.extensions['idempotency']
+    result_store = current_app.extensions['result_store']
+
+    calls = [(item, *_arguments(*item.args, **item.kwargs)) for item in items]
+    for tenant, count in Counter(tenant for item, _, _, tenant in calls if not item.request.retries).items():
+        tracker.started(tenant, count)
+
+    running = []
+    for item, data, webhook_url, tenant in calls:
+        if not slots.acquire(tenant, item.id):
+            _retry_over_cap(item.retry, item.request.retries)
+        elif not idempotency.begin_task(item.id):
+            logger.info("Skipping duplicate delivery of task %s", item.id)
+            slots.release(tenant, item.id)
+            item.ignore()
+        else:
+            try:
+                _check_schema_version(data, _schema_version(item.request))
+            except ValueError as e:
+                idempotency.abandon_task(item.id)
+                slots.release(tenant, item.id)
+                item.fail(e)
+                continue
+            running.append((item, data, webhook_url, tenant))
+
+    try:
+        results = _process_many([(item.id, data, webhook_url) for item, data, webhook_url, _ in running])
+    except Exception as e:
+        results = [e] * len(running)
+    for (item, data, webhook_url, tenant), result in zip(running, results):
+        try:
+            if isinstance(result, Exception):
+                raise result
+            item.succeed(result_store.save(tenant, item.id, result))
+            idempotency.finish_task(item.id)
+        except Exception as e:
+            idempotency.abandon_task(item.id)
+            item.fail(e)
+        finally:
+            slots.release(tenant, item.id)
+
+
+@celery.task(bind=True, base=BatchingTask, batch_handler=process_task_batch, name='app.tasks.process_task')
+def process_task(self, data, webhook_url=None, tenant=None):
+    task_id = self.request.id
+    if not self.request.retries:
+        current_app.extensions['queue_tracker'].started(tenant)
+
+    # One tenant may only hold TENANT_MAX_CONCURRENCY worker slots; over that the
+    # task goes back behind everyone else's instead of blocking a slot. Eager
+    # tasks run inline in the caller, so there is no slot to share.
+    slots = current_app.extensions['tenant_slots']
+    if not self.request.is_eager and not slots.acquire(tenant, task_id):
+        raise _retry_over_cap(self.retry, self.request.retries)
+
+    try:
+        # A redelivered message (e.g. after a visibility timeout) carries the same id;
+        # only the first delivery does the work
+        idempotency = current_app.extensions['idempotency']
+        if not idempotency.begin_task(task_id):
+            logger.info("Skipping duplicate delivery of task %s", task_id)
+            raise Ignore()
+        try:
+            # Set by the web app: the request schema version the payload was accepted under
+            _check_schema_version(data, _schema_version(self.request))
+            result = _process(task_id, data, webhook_url)
+            # Large results go to disk; the backend only stores a pointer to the file
+            result = current_app.extensions['result_store'].save(tenant, task_id, result)
+        except Exception:
+            idempotency.abandon_task(task_id)
+            raise
+        idempotency.finish_task(task_id)
+        return result
+    finally:
+        if not self.request.is_eager:
+            slots.release(tenant, task_id)
+
+
+def _retry_over_cap(retry, retries):
+    """Retry a task whose tenant has no free slot, with backoff; fails after TENANT_MAX_RETRIES."""
+    config = current_app.config
+    return retry(
+        countdown=slot_retry_delay(retries, config['TENANT_RETRY_DELAY'], config['TENANT_RETRY_MAX_DELAY']),
+        max_retries=config['TENANT_MAX_RETRIES'],
+    )
+
+
+def _schema_version(request):
+    # A worker sets message headers as request attributes; apply() only passes them in request.headers
+    return getattr(request, 'schema_version', None) or (request.headers or {}).get('schema_version')
+
+
+def _check_schema_version(data, version):
+    """Check ``data`` against the request schema version it was accepted under.
+
+    Never against a newer one: a hot reload between publish and run does not
+    change what the task accepts. A version this worker does not keep (it
+    started after the change, or the version was evicted) skips the check.
+    """
+    if version is None:
+        return
+    compiled = registry.get('process_request', 'request', version=version)
+    if compiled is None:
+        logger.warning("Request schema version %s is not kept by this worker; payload not rechecked", version)
+        return
+    valid = compiled.check(data) if compiled.check is not None else compiled.validator.is_valid(data)
+    if not valid:
+        raise ValueError(f"Payload does not match request schema version {version}")
+
+
+def _arguments(data, webhook_url=None, tenant=None):
+    return data, webhook_url, tenant
+
+
+def _webhook_url(webhook_url):
+    return webhook_url or current_app.config.get('WEBHOOK_URL')
+
+
+def _get_deliverer():
+    # Deferred so the web process, which only publishes, never loads requests
+    from app.webhooks import get_deliverer
+    return get_deliverer(current_app.config)
+
+
+def _task_headers(task_id):
+    # Deferred for the same reason as _get_deliverer
+    from app.webhooks import task_headers
+    return task_headers(task_id)
+
+
+def _retry_later(task_id, url, data, result):
+    """Hand a failed webhook that still has retries left to deliver_webhook."""
+    if result.retry_in is not None:
+        deliver_webhook.apply_async((url, data, task_id), countdown=result.retry_in)
+    return result.as_dict()
+
+
+@celery.task(bind=True, ignore_result=True, name='app.tasks.deliver_webhook')
+def deliver_webhook(self, url, data, task_id):
+    """Retry the webhook of ``task_id``, which made the first attempt itself.
+
+    Waits between attempts are countdowns on this task, so no worker sleeps
+    through a backoff.
+    """
+    result = _get_deliverer().deliver(url, data, _task_headers(task_id), attempt=self.request.retries + 1)
+    if result.retry_in is not None:
+        raise self.retry(countdown=result.retry_in, max_retries=current_app.config['WEBHOOK_MAX_RETRIES'])
+
+
+def _process(task_id, data, webhook_url):
     # Placeholder for processing logic
     # A webhook call is common
-    logger = logging.getLogger(__name__)
-    logger.debug(f"Processing task with data: {data}")
-    pass
+    log_payload(logger, "Processing task with data: %s", data)
+    url = _webhook_url(webhook_url)
+    if not url:
+        return None
+    result = _get_deliverer().deliver(url, data, _task_headers(task_id))
+    return _retry_later(task_id, url, data, result)
+
+
+def _process_many(calls):
+    """``_process`` for a list of ``(task_id, data, webhook_url)``; webhooks go out concurrently over shared connections."""
+    results = [None] * len(calls)
+    deliveries = []
+    for index, (task_id, data, webhook_url) in enumerate(calls):
+        log_payload(logger, "Processing task with data: %s", data)
+        url = _webhook_url(webhook_url)
+        if url:
+            deliveries.append((index, task_id, url, data))
+    if deliveries:
+        delivered = _get_deliverer().deliver_many(
+            (url, data, _task_headers(task_id)) for _, task_id, url, data in deliveries
+        )
+        for (index, task_id, url, data), result in zip(deliveries, delivered):
+            results[index] = _retry_later(task_id, url, data, result)
+    return results
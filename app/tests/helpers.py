@@ -0,0 +1,39 @@
+# Payload and route helpers for the tests; kept out of the app's import path
+
+import ast
+import os
+
+TESTS_DIR = os.path.abspath(os.path.dirname(__file__))
+
+def create_valid_payload(schema):
+    payload = {}
+    for field, details in schema.get("properties", {}).items():
+        if "default" in details:
+            payload[field] = details["default"]
+        elif details["type"] == "string":
+            payload[field] = "test_string"
+        elif details["type"] == "number":
+            payload[field] = 24
+        elif details["type"] == "boolean":
+            payload[field] = True
+        elif details["type"] == "uri":
+            payload[field] = "http://example.com"
+    return payload
+
+def schema_exists(endpoint, config_type):
+    file_path = os.path.join(TESTS_DIR, '..', 'json_schemas', f'{endpoint.lstrip("/")}_{config_type}.json')
+    return os.path.isfile(file_path)
+
+def get_endpoints_from_main():
+    main_file_path = os.path.join(TESTS_DIR, '..', 'main.py')
+    with open(main_file_path, 'r') as file:
+        tree = ast.parse(file.read(), filename=main_file_path)
+
+    endpoints = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.FunctionDef):
+            for decorator in node.decorator_list:
+                if isinstance(decorator, ast.Call) and isinstance(decorator.func, ast.Attribute) and decorator.func.attr == 'route':
+                    route_path = decorator.args[0].s
+                    endpoints.append(route_path)
+    return endpoints
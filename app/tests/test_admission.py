@@ -0,0 +1,144 @@
+import pytest
+from kombu.exceptions import OperationalError
+from app.admission import AdmissionController, BrokerUnavailable, CircuitBreaker
+from app.config import TestingConfig
+from app.main import create_app
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+class CountingRedis:
+    """fakeredis with a configurable INFO memory section and a count of pipelines run."""
+
+    def __init__(self, redis, used_memory=0, maxmemory=0):
+        self.redis = redis
+        self.memory = {'used_memory': used_memory, 'maxmemory': maxmemory}
+        self.reads = 0
+
+    def pipeline(self, transaction=True):
+        self.reads += 1
+        pipe = self.redis.pipeline(transaction=transaction)
+        memory = self.memory
+        execute = pipe.execute
+
+        def info(section):
+            pipe.echo('info')
+        pipe.info = info
+        pipe.execute = lambda: [memory if value == b'info' else value for value in execute()]
+        return pipe
+
+class BrokenRedis:
+    def pipeline(self, transaction=True):
+        raise OperationalError("down")
+
+@pytest.fixture
+def fake_redis():
+    fakeredis = pytest.importorskip('fakeredis')
+    return fakeredis.FakeRedis()
+
+def controller(redis, clock, **options):
+    return AdmissionController(redis, ('high', 'normal', 'low'), clock=clock, **options)
+
+def test_breaker_opens_then_half_opens():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+
+    def fail():
+        raise OperationalError("down")
+
+    for _ in range(2):
+        with pytest.raises(BrokerUnavailable):
+            breaker.call(fail)
+    assert breaker.state == CircuitBreaker.OPEN
+    calls = []
+    with pytest.raises(BrokerUnavailable) as excinfo:
+        breaker.call(calls.append, 1)
+    assert calls == [] and excinfo.value.retry_after == 10
+    clock.now += 10
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(BrokerUnavailable):
+        breaker.call(fail)
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 10
+    assert breaker.call(lambda: 'ok') == 'ok'
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_breaker_ignores_other_errors():
+    breaker = CircuitBreaker(failure_threshold=1)
+    with pytest.raises(KeyError):
+        breaker.call({}.__getitem__, 'missing')
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_sample_is_cached(fake_redis):
+    clock = Clock()
+    redis = CountingRedis(fake_redis)
+    admission = controller(redis, clock, sample_interval=1.0)
+    assert all(admission.check('normal') is None for _ in range(5))
+    assert redis.reads == 1
+    clock.now += 1
+    admission.check('normal')
+    assert redis.reads == 2
+
+def test_queue_depth_sheds_low_priority_first(fake_redis):
+    fake_redis.lpush('normal', *range(70))
+    admission = controller(CountingRedis(fake_redis), Clock(), max_depth=100,
+                           priority_factors={'high': 1.0, 'normal': 0.8, 'low': 0.5})
+    rejection = admission.check('low')
+    assert (rejection.status, rejection.reason) == (429, 'queue_depth')
+    assert admission.check('normal') is None
+    assert admission.check('high') is None
+
+@pytest.mark.parametrize("used, maxmemory, max_memory, rejected", [
+    (95, 100, 0, True),
+    (85, 100, 0, False),
+    (85, 0, 80, True),
+    (85, 0, 0, False),
+])
+def test_broker_memory(fake_redis, used, maxmemory, max_memory, rejected):
+    admission = controller(CountingRedis(fake_redis, used, maxmemory), Clock(), max_memory=max_memory)
+    rejection = admission.check('high')
+    assert (rejection is not None) == rejected
+    if rejected:
+        assert (rejection.status, rejection.reason) == (503, 'broker_memory')
+
+def test_slow_broker_is_shed(fake_redis):
+    admission = controller(CountingRedis(fake_redis), Clock(), max_latency=-1)
+    assert admission.check('high').reason == 'broker_latency'
+
+def test_failed_samples_open_the_breaker():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=2, clock=clock)
+    admission = controller(BrokenRedis(), clock, sample_interval=0, breaker=breaker)
+    assert admission.check('high') is None
+    assert admission.check('high') is None
+    assert admission.check('high').reason == 'broker_unavailable'
+
+@pytest.fixture
+def client(tmp_path):
+    (tmp_path / 'test_key').mkdir()
+    config = type('AdmissionTestingConfig', (TestingConfig,), {
+        'API_KEYS_DIR': str(tmp_path),
+        'BROKER_BREAKER_THRESHOLD': 1,
+        'IDEMPOTENCY_PAYLOAD_TTL': 0,
+    })
+    return create_app(config).test_client()
+
+def test_broker_outage_returns_503_fast(client, monkeypatch):
+    from app import tasks
+    calls = []
+
+    def apply_async(*args, **kwargs):
+        calls.append(kwargs)
+        raise OperationalError("Connection refused")
+
+    monkeypatch.setattr(tasks.process_task, 'apply_async', apply_async)
+    headers = {"x-api-key": "test_key"}
+    responses = [client.post("/process/process_request", json={"username": "a", "age": 1}, headers=headers)
+                 for _ in range(2)]
+    assert [rv.status_code for rv in responses] == [503, 503]
+    assert int(responses[1].headers['Retry-After']) > 0
+    assert len(calls) == 1
@@ -0,0 +1,91 @@
+import io
+import json
+import pytest
+from app.config import TestingConfig
+from app.main import create_app
+from app.streaming import iter_json_array, iter_ndjson, StreamParseError
+
+ITEMS = [{"username": f"user_{i}", "age": i, "extra": "dropped"} for i in range(25)]
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 64, 1 << 16])
+def test_iter_json_array_across_chunk_boundaries(chunk_size):
+    items = ITEMS + [12345, "café", [1, 2], True, None, -1.5e-300]
+    body = json.dumps(items).encode('utf-8')
+    assert [item for _, item in iter_json_array(io.BytesIO(body), chunk_size)] == items
+
+@pytest.mark.parametrize("body", [b'{"a": 1}', b'[1, 2', b'[1 2]', b'[1] []', b'[{"a": }]'])
+def test_iter_json_array_rejects_malformed_input(body):
+    with pytest.raises(StreamParseError):
+        list(iter_json_array(io.BytesIO(body), 2))
+
+def test_iter_ndjson_reports_bad_lines_and_continues():
+    body = b'{"a": 1}\n\nnot json\n{"b": 2}'
+    parsed = list(iter_ndjson(io.BytesIO(body), 3))
+    assert parsed[0] == (0, {"a": 1})
+    assert isinstance(parsed[1][1], StreamParseError)
+    assert parsed[2] == (2, {"b": 2})
+
+@pytest.mark.parametrize("chunk_size", [7, 1 << 16])
+def test_iter_ndjson_skips_overlong_lines(chunk_size):
+    body = b'{"a": 1}\n{"b": "' + b'x' * 5000 + b'"}\n{"c": 3}'
+    parsed = list(iter_ndjson(io.BytesIO(body), chunk_size, max_line_size=100))
+    assert parsed[0] == (0, {"a": 1})
+    assert "longer than 100 characters" in str(parsed[1][1])
+    assert parsed[2] == (2, {"c": 3})
+
+@pytest.fixture
+def batch_client(tmp_path):
+    (tmp_path / 'test_key').mkdir()
+    config = type('BatchTestingConfig', (TestingConfig,), {
+        'API_KEYS_DIR': str(tmp_path),
+        'BATCH_MAX_ITEMS': 30,
+        'BATCH_ENQUEUE_CHUNK_SIZE': 10,
+    })
+    return create_app(config).test_client()
+
+def post_batch(client, body, content_type='application/json'):
+    return client.post("/process/process_request/batch", data=body, content_type=content_type,
+                       headers={"x-api-key": "test_key"})
+
+def test_batch_json_array_enqueues_valid_items(batch_client):
+    items = ITEMS[:5] + [{"username": "no_age"}] + ITEMS[5:8]
+    rv = post_batch(batch_client, json.dumps(items))
+    assert rv.status_code == 202
+    result = rv.get_json()
+    assert result["accepted"] == 8
+    assert [task["index"] for task in result["tasks"]] == [0, 1, 2, 3, 4, 6, 7, 8]
+    assert result["errors"] == [{"index": 5, "error": ["'age' is a required property"]}]
+
+def test_batch_ndjson(batch_client):
+    body = "\n".join(json.dumps(item) for item in ITEMS[:3]) + "\n{broken\n"
+    rv = post_batch(batch_client, body, content_type='application/x-ndjson')
+    assert rv.status_code == 202
+    result = rv.get_json()
+    assert result["accepted"] == 3
+    assert result["errors"][0]["index"] == 3
+
+def test_batch_all_invalid_is_rejected(batch_client):
+    rv = post_batch(batch_client, json.dumps([{"age": 1}, "not an object"]))
+    assert rv.status_code == 400
+    assert rv.get_json()["rejected"] == 2
+
+def test_batch_malformed_array(batch_client):
+    rv = post_batch(batch_client, b'[{"username": "a", "age": 1}, oops]')
+    assert rv.status_code == 400
+    assert "Invalid JSON in item 1" in rv.get_json()["error"]
+
+@pytest.mark.parametrize("content_type", ['application/json', 'application/x-ndjson'])
+def test_batch_invalid_utf8(batch_client, content_type):
+    rv = post_batch(batch_client, b'[{"a":"\xff"}]', content_type=content_type)
+    assert rv.status_code == 400
+    assert rv.get_json()["error"] == "Invalid UTF-8 at byte 7"
+
+def test_batch_too_large(batch_client):
+    rv = post_batch(batch_client, json.dumps([ITEMS[0]] * 31))
+    assert rv.status_code == 413
+    assert len(rv.get_json()["tasks"]) == 30
+
+def test_batch_requires_api_key(batch_client):
+    rv = batch_client.post("/process/process_request/batch", json=ITEMS)
+    assert rv.status_code == 400
+    assert rv.get_json() == {"error": "API key is missing"}
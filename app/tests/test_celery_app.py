@@ -0,0 +1,53 @@
+from flask import current_app, g, has_app_context
+from flask.globals import _cv_app
+from app import celery_app
+from app.celery_app import ContextTask, celery, on_worker_process_init
+
+
+@celery.task(name='tests.flask_state')
+def flask_state():
+    g.calls = g.get('calls', 0) + 1
+    return current_app.name, g.calls
+
+@celery.task(name='tests.no_flask', flask_context=False)
+def no_flask():
+    return has_app_context()
+
+def test_task_pushes_a_context_only_when_none_is_active(app):
+    # A fresh context per call
+    assert flask_state.apply().get() == (app.name, 1)
+    assert flask_state.apply().get() == (app.name, 1)
+    with app.app_context():
+        assert flask_state.apply().get() == (app.name, 1)
+        assert flask_state.apply().get() == (app.name, 2)
+
+def test_task_can_opt_out_of_the_context(app):
+    assert no_flask.apply().get() is False
+
+def test_worker_process_creates_the_app_once(app, monkeypatch):
+    monkeypatch.setattr(ContextTask, 'flask_app', None)
+    monkeypatch.setattr(celery_app, '_worker_context', None)
+    monkeypatch.setenv('FLASK_CONFIG', 'app.config.TestingConfig')
+    on_worker_process_init()
+    worker_app = ContextTask.flask_app
+    try:
+        assert worker_app is not None and worker_app is not app
+        # WORKER_APP_CONTEXT = 'process': the context stays pushed, but each task gets its own flask.g
+        assert current_app._get_current_object() is worker_app
+        assert flask_state.apply().get() == (worker_app.name, 1)
+        assert flask_state.apply().get() == (worker_app.name, 1)
+        on_worker_process_init()
+        assert ContextTask.flask_app is worker_app
+    finally:
+        _cv_app.get().pop()
+    assert not has_app_context()
+
+def test_worker_process_context_per_task(app, monkeypatch):
+    monkeypatch.setattr(ContextTask, 'flask_app', None)
+    monkeypatch.setattr(celery_app, '_worker_context', None)
+    monkeypatch.setenv('FLASK_CONFIG', 'app.config.TestingConfig')
+    monkeypatch.setattr('app.config.TestingConfig.WORKER_APP_CONTEXT', 'task')
+    on_worker_process_init()
+    assert not has_app_context()
+    assert flask_state.apply().get() == (ContextTask.flask_app.name, 1)
+    assert flask_state.apply().get() == (ContextTask.flask_app.name, 1)
@@ -0,0 +1,124 @@
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+from app.config import TestingConfig
+from app.idempotency import IdempotencyConflict, IdempotencyStore, payload_fingerprint, request_key
+from app.main import create_app
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+class BrokenRedis:
+    def set(self, *args, **kwargs):
+        raise RedisConnectionError("down")
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_fingerprint_ignores_key_order():
+    assert payload_fingerprint({"a": 1, "b": [1, 2]}) == payload_fingerprint({"b": [1, 2], "a": 1})
+    assert payload_fingerprint({"a": 1}) != payload_fingerprint({"a": 2})
+
+def test_request_key_is_scoped_per_api_key():
+    assert request_key("one", "k", "f") != request_key("two", "k", "f")
+    assert request_key("one", None, "f") != request_key("one", "f", "f")
+
+@pytest.mark.parametrize("redis", [None, FakeRedis()])
+def test_first_claim_wins(redis):
+    store = IdempotencyStore(redis=redis)
+    assert store.claim_request("k", "task-1", "f") is None
+    assert store.claim_request("k", "task-2", "f") == "task-1"
+    with pytest.raises(IdempotencyConflict):
+        store.claim_request("k", "task-3", "other")
+    store.release_request("k")
+    assert store.claim_request("k", "task-4", "f") is None
+
+def test_claims_are_shared_through_redis():
+    redis = FakeRedis()
+    IdempotencyStore(redis=redis).claim_request("k", "task-1", "f")
+    assert IdempotencyStore(redis=redis).claim_request("k", "task-2", "f") == "task-1"
+
+def test_local_entries_expire():
+    clock = Clock()
+    store = IdempotencyStore(ttl=10, clock=clock)
+    store.claim_request("k", "task-1", "f")
+    clock.now = 11
+    assert store.claim_request("k", "task-2", "f") is None
+
+def test_local_cache_answers_without_redis():
+    redis = FakeRedis()
+    store = IdempotencyStore(redis=redis)
+    store.claim_request("k", "task-1", "f")
+    redis.values.clear()
+    assert store.claim_request("k", "task-2", "f") == "task-1"
+
+def test_redis_errors_fail_open():
+    store = IdempotencyStore(redis=BrokenRedis())
+    assert store.claim_request("k", "task-1", "f") is None
+
+@pytest.mark.parametrize("redis", [None, FakeRedis()])
+def test_task_runs_once_unless_abandoned(redis):
+    store = IdempotencyStore(redis=redis)
+    assert store.begin_task("t1")
+    assert not store.begin_task("t1")
+    store.finish_task("t1")
+    assert not store.begin_task("t1")
+    assert store.begin_task("t2")
+    store.abandon_task("t2")
+    assert store.begin_task("t2")
+
+@pytest.fixture
+def idempotent_app(tmp_path):
+    (tmp_path / 'test_key').mkdir()
+    config = type('IdempotencyTestingConfig', (TestingConfig,), {'API_KEYS_DIR': str(tmp_path)})
+    return create_app(config)
+
+def post(client, payload, **headers):
+    return client.post("/process/process_request", json=payload, headers={"x-api-key": "test_key", **headers})
+
+def test_idempotency_key_returns_original_task(idempotent_app):
+    client = idempotent_app.test_client()
+    first = post(client, {"username": "a", "age": 1}, **{"Idempotency-Key": "retry-1"})
+    second = post(client, {"username": "a", "age": 1, "extra": "stripped"}, **{"Idempotency-Key": "retry-1"})
+    assert first.status_code == second.status_code == 202
+    assert second.get_json()["task_id"] == first.get_json()["task_id"]
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in first.headers
+
+    conflict = post(client, {"username": "b", "age": 1}, **{"Idempotency-Key": "retry-1"})
+    assert conflict.status_code == 422
+
+def test_identical_payloads_are_deduped_without_a_key(idempotent_app):
+    client = idempotent_app.test_client()
+    first = post(client, {"username": "a", "age": 1})
+    assert post(client, {"age": 1, "username": "a"}).get_json()["task_id"] == first.get_json()["task_id"]
+    assert post(client, {"username": "a", "age": 2}).get_json()["task_id"] != first.get_json()["task_id"]
+
+def test_payload_dedupe_can_be_disabled(idempotent_app):
+    idempotent_app.config['IDEMPOTENCY_PAYLOAD_TTL'] = 0
+    client = idempotent_app.test_client()
+    assert post(client, {"username": "a", "age": 1}).get_json()["task_id"] != \
+        post(client, {"username": "a", "age": 1}).get_json()["task_id"]
+
+def test_redelivered_task_is_ignored(idempotent_app):
+    from app import tasks
+    first = tasks.process_task.apply(args=[{"username": "a"}], task_id="redelivered")
+    second = tasks.process_task.apply(args=[{"username": "a"}], task_id="redelivered")
+    assert first.state == "SUCCESS"
+    assert second.state == "IGNORED"
@@ -0,0 +1,65 @@
+import datetime
+import decimal
+import json
+import uuid
+import pytest
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from kombu.serialization import dumps as kombu_dumps, loads as kombu_loads
+from app import json_codec
+from app.celery_app import celery
+from app.json_codec import CELERY_SERIALIZER, FastJSONProvider, get_backend
+
+BACKENDS = ['stdlib'] + (['orjson'] if json_codec.orjson is not None else [])
+
+@pytest.fixture
+def flask_app():
+    return Flask(__name__)
+
+@pytest.mark.parametrize("name", BACKENDS)
+def test_backends_round_trip(name):
+    backend = get_backend(name)
+    data = {"b": [1, 2.5, None, True], "a": {"nested": "café"}, "big": 2 ** 70}
+    encoded = backend.dumps(data, sort_keys=True)
+    assert isinstance(encoded, bytes)
+    assert backend.loads(encoded) == data
+    assert json.loads(encoded) == data
+
+@pytest.mark.parametrize("data", [
+    {"rows": [1, "é", None], 1: True, "empty": {}}, [[1, 2], {"a": 2 ** 70}], (), {}, "text", None,
+])
+def test_iterdumps_matches_dumps(data):
+    assert b''.join(json_codec.iterdumps(data)) == json_codec.dumps(data)
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        get_backend('simplejson')
+
+def test_provider_matches_default_provider(flask_app):
+    data = {
+        "z": 1, "a": [{"y": 2, "x": 1}],
+        "when": datetime.datetime(2024, 7, 10, 12, 30, tzinfo=datetime.timezone.utc),
+        "amount": decimal.Decimal("1.50"), "id": uuid.UUID(int=1),
+    }
+    fast = FastJSONProvider(flask_app)
+    default = DefaultJSONProvider(flask_app)
+    assert json.loads(fast.dumps(data)) == json.loads(default.dumps(data))
+    assert list(json.loads(fast.dumps(data))) == ["a", "amount", "id", "when", "z"]
+    assert fast.loads('{"a": [1]}') == {"a": [1]}
+
+def test_provider_response_is_compact_with_trailing_newline(flask_app):
+    flask_app.json = FastJSONProvider(flask_app)
+    with flask_app.app_context():
+        response = flask_app.json.response({"b": 1, "a": "é"})
+    assert response.mimetype == 'application/json'
+    assert response.get_data() == '{"a":"é","b":1}\n'.encode('utf-8')
+
+def test_celery_serializer_round_trip():
+    assert celery.conf.task_serializer == CELERY_SERIALIZER
+    assert CELERY_SERIALIZER in celery.conf.accept_content
+    body = ([{"username": "a", "age": 1}], {}, {"callbacks": None, "chord": None})
+    content_type, encoding, payload = kombu_dumps(body, serializer=CELERY_SERIALIZER)
+    assert kombu_loads(payload, content_type, encoding, accept={content_type}) == json.loads(json.dumps(body))
+
+def test_app_uses_fast_provider(client):
+    assert isinstance(client.application.json, FastJSONProvider)
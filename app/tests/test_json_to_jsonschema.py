@@ -0,0 +1,66 @@
+import importlib.util
+import json
+import os
+import sys
+import pytest
+
+SCRIPT = os.path.join(os.path.dirname(__file__), '..', '..', 'scripts', 'json_to_jsonschema.py')
+if not os.path.exists(SCRIPT):
+    # The web container only mounts app/
+    pytest.skip("scripts/ is not available", allow_module_level=True)
+spec = importlib.util.spec_from_file_location('json_to_jsonschema', SCRIPT)
+json_to_jsonschema = importlib.util.module_from_spec(spec)
+# Registered so the process pool can pickle its functions by name
+sys.modules['json_to_jsonschema'] = json_to_jsonschema
+spec.loader.exec_module(json_to_jsonschema)
+
+SPEC = [
+    {"name": "username", "type": "text", "required": True},
+    {"name": "site", "type": "url"},
+    {"name": "mode", "type": "select", "options": [{"value": "a"}, {"label": "b"}]},
+    {"name": "tags", "type": "array", "items": {"type": "collection", "spec": [{"name": "label", "type": "text"}]}},
+    {"name": "rows", "type": "array", "items": [{"name": "n", "type": "number", "required": True}]},
+    {"name": "group", "grouped": True, "properties": [{"name": "flag", "type": "boolean"}]},
+]
+
+def nested(depth):
+    spec = [{"name": "leaf", "type": "text", "required": True}]
+    for _ in range(depth):
+        spec = [{"name": "child", "type": "collection", "spec": spec}]
+    return spec
+
+def test_generate_schema():
+    schema = json_to_jsonschema.generate_schema(SPEC)
+    assert schema["required"] == ["username"]
+    assert schema["properties"]["site"] == {"type": "string", "format": "uri"}
+    assert schema["properties"]["mode"]["anyOf"][0] == {"type": "string", "enum": ["a", "b"]}
+    assert schema["properties"]["tags"]["items"]["properties"] == {"label": {"type": "string"}}
+    assert schema["properties"]["rows"]["items"] == {
+        "type": "object", "properties": {"n": {"type": "number"}}, "required": ["n"],
+    }
+    assert schema["properties"]["group"] == {"type": "object", "properties": {"flag": {"type": "boolean"}}}
+
+def test_deep_specs_do_not_recurse():
+    schema = json_to_jsonschema.convert_to_jsonschema(nested(400))
+    output = json_to_jsonschema.dumps_schema(schema)
+    json_to_jsonschema.check_schema(json.loads(output))
+    shallow = json_to_jsonschema.convert_to_jsonschema(nested(3))
+    assert json_to_jsonschema.dumps_schema(shallow) == json.dumps(shallow, indent=2)
+
+def test_batch_skips_unchanged_inputs(tmp_path):
+    source = tmp_path / 'specs'
+    source.mkdir()
+    for name in ('one', 'two'):
+        (source / f'{name}.json').write_text(json.dumps(SPEC))
+    (source / 'broken.json').write_text('[')
+    output = tmp_path / 'schemas'
+
+    report = json_to_jsonschema.run_batch(str(source), 'request', str(output), jobs=2)
+    assert (report["converted"], report["failed"]) == (2, 1)
+    assert json.loads((output / 'one_request.json').read_text())["required"] == ["username"]
+
+    (source / 'two.json').write_text(json.dumps(SPEC[:1]))
+    report = json_to_jsonschema.run_batch(str(source / '*.json'), 'request', str(output), jobs=1)
+    assert (report["converted"], report["skipped"], report["failed"]) == (1, 1, 1)
+    (output / 'one_request.json').unlink()
+    assert json_to_jsonschema.run_batch(str(source), 'request', str(output))["converted"] == 1
@@ -0,0 +1,86 @@
+import pytest
+from app.config import TestingConfig
+from app.key_store import ApiKeyStore
+from app.main import create_app
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def key_dir(tmp_path):
+    (tmp_path / 'key_one').mkdir()
+    (tmp_path / 'key_two').mkdir()
+    (tmp_path / 'not_a_key.txt').write_text('')
+    return tmp_path
+
+def test_scan_indexes_key_directories_only(key_dir):
+    store = ApiKeyStore(str(key_dir))
+    assert len(store) == 2
+    assert store.is_valid('key_one')
+    assert not store.is_valid('not_a_key.txt')
+
+def test_raw_keys_are_not_kept_in_memory(key_dir):
+    store = ApiKeyStore(str(key_dir))
+    assert all(isinstance(digest, bytes) and len(digest) == 32 for digest in store._digests)
+
+def test_rejects_path_traversal(key_dir):
+    store = ApiKeyStore(str(key_dir / 'key_one'))
+    assert not store.is_valid('..')
+    assert not store.is_valid('../key_two')
+
+def test_new_key_is_picked_up_without_refresh(key_dir):
+    store = ApiKeyStore(str(key_dir), refresh_interval=3600)
+    (key_dir / 'key_three').mkdir()
+    assert store.is_valid('key_three')
+
+def test_negative_cache_skips_disk_until_ttl(key_dir, monkeypatch):
+    clock = FakeClock()
+    store = ApiKeyStore(str(key_dir), refresh_interval=3600, negative_ttl=10, clock=clock)
+    assert not store.is_valid('key_late')
+
+    probes = []
+    monkeypatch.setattr(store, '_probe', lambda key, digest: probes.append(key) or False)
+    for _ in range(100):
+        assert not store.is_valid('key_late')
+    assert probes == []
+
+    clock.now = 11
+    store.is_valid('key_late')
+    assert probes == ['key_late']
+
+def test_negative_cache_is_bounded(key_dir):
+    store = ApiKeyStore(str(key_dir), negative_cache_size=5)
+    for i in range(20):
+        store.is_valid(f'bad_{i}')
+    assert len(store._negative) == 5
+
+def test_refresh_picks_up_added_and_removed_keys(key_dir):
+    clock = FakeClock()
+    store = ApiKeyStore(str(key_dir), refresh_interval=5, clock=clock)
+    assert not store.is_valid('key_late')
+    (key_dir / 'key_late').mkdir()
+    (key_dir / 'key_two').rmdir()
+
+    clock.now = 6
+    assert store.is_valid('key_late')
+    assert not store.is_valid('key_two')
+
+@pytest.fixture
+def key_client(key_dir):
+    config = type('KeyStoreTestingConfig', (TestingConfig,), {'API_KEYS_DIR': str(key_dir)})
+    return create_app(config).test_client()
+
+def test_authenticate_uses_key_store(key_client):
+    response = key_client.get("/auth/authenticate", headers={"x-api-key": "key_one"})
+    assert response.status_code == 200
+    assert response.get_json() == {"message": "API key is valid"}
+
+def test_process_request_rejects_unknown_key(key_client):
+    response = key_client.post("/process/process_request", json={"username": "a", "age": 1},
+                               headers={"x-api-key": "invalid_key"})
+    assert response.status_code == 403
+    assert response.get_json() == {"error": "Invalid API key"}
@@ -0,0 +1,56 @@
+import logging
+import time
+from logging.handlers import QueueHandler
+import pytest
+from app.config import TestingConfig
+from app.logging_config import redact, log_payload, REDACTED
+from app import logging_config
+from app.main import create_app
+
+def make_app(**overrides):
+    return create_app(type('LoggingTestingConfig', (TestingConfig,), overrides))
+
+def test_redact_masks_nested_fields():
+    data = {"username": "a", "password": "p", "items": [{"token": "t", "n": 1}]}
+    assert redact(data, {"password", "token"}) == {
+        "username": "a", "password": REDACTED, "items": [{"token": REDACTED, "n": 1}]
+    }
+
+def test_configure_logging_installs_single_queue_handler():
+    make_app(LOG_LEVEL='WARNING')
+    make_app(LOG_LEVEL='WARNING')
+    root = logging.getLogger()
+    assert sum(isinstance(handler, QueueHandler) for handler in root.handlers) == 1
+    assert root.level == logging.WARNING
+
+def test_listener_delivers_records():
+    make_app(LOG_LEVEL='INFO')
+    received = []
+    handler = logging.Handler()
+    handler.emit = received.append
+    logging_config._listener.handlers = logging_config._listener.handlers + (handler,)
+    logging.getLogger('app.tests').info("hello %s", "world")
+    deadline = time.monotonic() + 2
+    while not received and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert received[0].getMessage() == "hello world"
+
+class Unformattable:
+    def __repr__(self):
+        raise AssertionError("payload was formatted")
+
+    __str__ = __repr__
+
+def test_log_payload_skips_work_when_level_disabled():
+    make_app(LOG_LEVEL='INFO', LOG_PAYLOAD_SAMPLE_RATE=1.0)
+    log_payload(logging.getLogger('app.tests'), "payload %s", Unformattable())
+
+@pytest.mark.parametrize("sample_rate, expected", [(0.0, 0), (1.0, 1)])
+def test_log_payload_sampling_and_redaction(caplog, sample_rate, expected):
+    make_app(LOG_LEVEL='DEBUG', LOG_PAYLOAD_SAMPLE_RATE=sample_rate)
+    with caplog.at_level(logging.DEBUG, logger='app.tests'):
+        log_payload(logging.getLogger('app.tests'), "payload %s", {"username": "a", "password": "p"})
+    records = [record for record in caplog.records if record.name == 'app.tests']
+    assert len(records) == expected
+    if records:
+        assert "'password': '[REDACTED]'" in records[0].getMessage()
@@ -1,10 +1,10 @@
 import os
-import ast
 import pytest
 import shutil
 from app.main import create_app
 from app.celery_app import celery, init_celery
-from app.utils import load_schema, create_valid_payload, validate_response
+from app.utils import load_schema, validate_response
+from app.tests.helpers import create_valid_payload, get_endpoints_from_main, schema_exists
 
 @pytest.fixture
 def app():
@@ -22,26 +22,6 @@ def celery_app(app):
     yield celery
     celery.conf.update(task_always_eager=False)
 
-def schema_exists(endpoint, config_type):
-    base_dir = os.path.abspath(os.path.dirname(__file__))
-    file_path = os.path.join(base_dir, '..', 'json_schemas', f'{endpoint.lstrip("/")}_{config_type}.json')
-    return os.path.isfile(file_path)
-
-def get_endpoints_from_main():
-    base_dir = os.path.abspath(os.path.dirname(__file__))
-    main_file_path = os.path.join(base_dir, '..', 'main.py')
-    with open(main_file_path, 'r') as file:
-        tree = ast.parse(file.read(), filename=main_file_path)
-
-    endpoints = []
-    for node in ast.walk(tree):
-        if isinstance(node, ast.FunctionDef):
-            for decorator in node.decorator_list:
-                if isinstance(decorator, ast.Call) and isinstance(decorator.func, ast.Attribute) and decorator.func.attr == 'route':
-                    route_path = decorator.args[0].s
-                    endpoints.append(route_path)
-    return endpoints
-
 endpoints = get_endpoints_from_main()
 
 @pytest.mark.parametrize("endpoint", endpoints)
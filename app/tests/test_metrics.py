@@ -0,0 +1,69 @@
+from types import SimpleNamespace
+import pytest
+from prometheus_client import REGISTRY
+from app.config import TestingConfig
+from app.main import create_app
+from app import metrics
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+@pytest.fixture
+def metrics_client(tmp_path):
+    (tmp_path / 'test_key').mkdir()
+    config = type('MetricsTestingConfig', (TestingConfig,), {'API_KEYS_DIR': str(tmp_path)})
+    return create_app(config).test_client()
+
+HEADERS = {"x-api-key": "test_key"}
+ENDPOINT = 'process_process_request'
+
+def test_metrics_endpoint_serves_prometheus_text(metrics_client):
+    rv = metrics_client.get('/metrics')
+    assert rv.status_code == 200
+    assert rv.content_type.startswith('text/plain')
+    assert b'request_stage_duration_seconds' in rv.data
+
+def test_request_stages_are_timed(metrics_client):
+    before = {stage: sample('request_stage_duration_seconds_count', endpoint=ENDPOINT, stage=stage)
+              for stage in ('parse', 'restx_validate', 'auth', 'validate', 'publish')}
+    rv = metrics_client.post('/process/process_request', json={"username": "a", "age": 1}, headers=HEADERS)
+    assert rv.status_code == 202
+    for stage, count in before.items():
+        assert sample('request_stage_duration_seconds_count', endpoint=ENDPOINT, stage=stage) == count + 1, stage
+    assert sample('http_request_duration_seconds_count', endpoint=ENDPOINT, method='POST', status='202') >= 1
+
+def test_auth_failures_are_counted(metrics_client):
+    missing = sample('auth_failures_total', reason='missing')
+    invalid = sample('auth_failures_total', reason='invalid')
+    metrics_client.post('/process/process_request', json={"username": "a", "age": 1})
+    metrics_client.post('/process/process_request', json={"username": "a", "age": 1}, headers={"x-api-key": "nope"})
+    assert sample('auth_failures_total', reason='missing') == missing + 1
+    assert sample('auth_failures_total', reason='invalid') == invalid + 1
+
+def test_validation_failures_are_counted(metrics_client):
+    before = sample('validation_failures_total', endpoint=ENDPOINT, reason='required')
+    rv = metrics_client.post('/process/process_request', json={"username": "a"}, headers=HEADERS)
+    assert rv.status_code == 400
+    assert sample('validation_failures_total', endpoint=ENDPOINT, reason='required') == before + 1
+
+def test_task_runtime_and_queue_wait():
+    headers = {}
+    metrics.stamp_publish_time(headers=headers)
+    task = SimpleNamespace(name='app.tasks.process_task',
+                           request=SimpleNamespace(published_at=headers['published_at'] - 2))
+    waits = sample('celery_task_queue_wait_seconds_count', task=task.name)
+    runs = sample('celery_task_runtime_seconds_count', task=task.name, state='SUCCESS')
+
+    metrics.start_task_timer(task=task)
+    metrics.observe_task_runtime(task=task, state='SUCCESS')
+
+    assert sample('celery_task_queue_wait_seconds_count', task=task.name) == waits + 1
+    assert sample('celery_task_queue_wait_seconds_sum', task=task.name) >= 2
+    assert sample('celery_task_runtime_seconds_count', task=task.name, state='SUCCESS') == runs + 1
+
+def test_multiprocess_registry(tmp_path, monkeypatch):
+    monkeypatch.setenv('PROMETHEUS_MULTIPROC_DIR', str(tmp_path))
+    (tmp_path / 'counter_123.db').write_bytes(b'')
+    metrics.clear_multiprocess_dir()
+    assert list(tmp_path.iterdir()) == []
+    assert metrics._metrics_registry() is not REGISTRY
@@ -0,0 +1,105 @@
+import random
+import pytest
+from app.config import TestingConfig
+from app.key_store import tenant_id
+from app.main import create_app
+from app.queues import (
+    QueueDepthCollector, QueueTracker, TenantSlots, resolve_priority, slot_retry_delay, weighted_cycle,
+)
+
+CONFIG = {
+    'TASK_PRIORITIES': ('high', 'normal', 'low'),
+    'TASK_DEFAULT_PRIORITY': 'normal',
+    'API_KEY_TIERS': {tenant_id('gold'): 'premium', tenant_id('backfill'): 'bulk'},
+    'DEFAULT_TIER': 'standard',
+    'TIER_PRIORITIES': {'premium': 'high', 'standard': 'normal', 'bulk': 'low'},
+}
+
+@pytest.fixture
+def fake_redis():
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('lupa')
+    return fakeredis.FakeRedis()
+
+@pytest.mark.parametrize("api_key, requested, expected", [
+    ('gold', None, 'high'),
+    ('gold', 'low', 'low'),
+    ('someone', 'high', 'normal'),
+    ('someone', 'bogus', 'normal'),
+    ('backfill', 'high', 'low'),
+])
+def test_tier_caps_requested_priority(api_key, requested, expected):
+    assert resolve_priority(CONFIG, api_key, requested) == expected
+
+def test_weighted_cycle_favours_heavier_queues_without_starving():
+    random.seed(1)
+    cycle = weighted_cycle({'high': 6, 'normal': 3, 'low': 1})()
+    cycle.update({'low', 'high', 'normal'})
+    orders = [cycle.consume(3) for _ in range(2000)]
+    firsts = [order[0] for order in orders]
+    assert all(sorted(order) == ['high', 'low', 'normal'] for order in orders)
+    assert firsts.count('high') > firsts.count('normal') > firsts.count('low') > 0
+    assert [q for q in orders[0] if q != orders[0][0]] == [q for q in ('high', 'normal', 'low') if q != orders[0][0]]
+
+@pytest.mark.parametrize("use_redis", [False, True])
+def test_tenant_slots_cap_concurrency(use_redis, request):
+    redis = request.getfixturevalue('fake_redis') if use_redis else None
+    slots = TenantSlots(2, redis=redis)
+    assert slots.acquire('t1', 'a') and slots.acquire('t1', 'b')
+    assert slots.acquire('t1', 'a')
+    assert not slots.acquire('t1', 'c')
+    assert slots.acquire('t2', 'c')
+    slots.release('t1', 'a')
+    assert slots.acquire('t1', 'c')
+
+def test_tenant_slots_can_be_disabled():
+    slots = TenantSlots(0)
+    assert all(slots.acquire('t1', str(i)) for i in range(10))
+
+def test_slot_retries_back_off_exponentially_up_to_a_maximum():
+    assert 1 <= slot_retry_delay(0, 1, 60) <= 2
+    assert 8 <= slot_retry_delay(3, 1, 60) <= 16
+    assert 60 <= slot_retry_delay(30, 1, 60) <= 120
+
+def test_queue_depth_collector(fake_redis):
+    collector = QueueDepthCollector()
+    assert list(collector.collect()) == []
+    broker = type(fake_redis)(db=1)
+    collector.configure(fake_redis, ('high', 'low'), broker=broker)
+    broker.lpush('low', 'm1', 'm2')
+    tracker = QueueTracker(fake_redis)
+    tracker.published('t1', 3)
+    tracker.started('t1')
+    tracker.started('t2')
+    depth, tenants = collector.collect()
+    assert {s.labels['queue']: s.value for s in depth.samples} == {'high': 0, 'low': 2}
+    assert {s.labels['tenant']: s.value for s in tenants.samples} == {'t1': 2, 't2': 0}
+
+@pytest.fixture
+def tiered_app(tmp_path):
+    for key in ('gold', 'plain'):
+        (tmp_path / key).mkdir()
+    config = type('QueueTestingConfig', (TestingConfig,), {
+        'API_KEYS_DIR': str(tmp_path),
+        'API_KEY_TIERS': {tenant_id('gold'): 'premium'},
+    })
+    return create_app(config)
+
+def test_requests_are_routed_by_tier_and_priority(tiered_app, monkeypatch):
+    from app import tasks
+    published = []
+
+    def apply_async(args=None, kwargs=None, **options):
+        published.append((args, kwargs, options['queue']))
+        return tasks.process_task.AsyncResult(options['task_id'])
+
+    monkeypatch.setattr(tasks.process_task, 'apply_async', apply_async)
+    client = tiered_app.test_client()
+    client.post("/process/process_request", json={"username": "a", "age": 1}, headers={"x-api-key": "gold"})
+    client.post("/process/process_request", json={"username": "b", "age": 1, "priority": "low"},
+                headers={"x-api-key": "gold"})
+    client.post("/process/process_request", json={"username": "c", "age": 1, "priority": "high"},
+                headers={"x-api-key": "plain"})
+    assert [queue for _, _, queue in published] == ['high', 'low', 'normal']
+    assert published[1][0] == [{"username": "b", "age": 1}]
+    assert published[2][1] == {'tenant': tenant_id('plain')}
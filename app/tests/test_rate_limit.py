@@ -0,0 +1,113 @@
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+from app.config import TestingConfig
+from app.key_store import tenant_id
+from app.main import create_app
+from app.rate_limit import RateLimiter, parse_limit
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+class BrokenRedis:
+    def register_script(self, script):
+        def run(keys, args):
+            raise RedisConnectionError("down")
+        return run
+
+@pytest.fixture
+def fake_redis():
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('lupa')
+    return fakeredis.FakeRedis()
+
+def bucket_tokens(redis, limit='1000/3600'):
+    key, = [key for key in redis.keys('ratelimit:*') if key.endswith(limit.encode())]
+    return float(redis.hget(key, 'tokens'))
+
+def test_parse_limit():
+    assert parse_limit('100/minute') == (100, 60)
+    with pytest.raises(ValueError):
+        parse_limit('100/fortnight')
+
+def test_local_limit_denies_then_refills():
+    clock = Clock()
+    limiter = RateLimiter({'default': ['5/second']}, clock=clock)
+    decisions = [limiter.check('key', 'ep') for _ in range(6)]
+    assert [d.allowed for d in decisions] == [True] * 5 + [False]
+    assert decisions[0].headers() == {'RateLimit-Limit': '5', 'RateLimit-Remaining': '4', 'RateLimit-Reset': '1'}
+    assert decisions[-1].headers()['Retry-After'] == '1'
+    clock.now += 0.2
+    assert limiter.check('key', 'ep').allowed
+
+def test_limits_are_per_key_and_endpoint():
+    limiter = RateLimiter({'default': ['1/minute'], 'open': []}, clock=Clock())
+    assert limiter.check('a', 'ep').allowed
+    assert not limiter.check('a', 'ep').allowed
+    assert limiter.check('b', 'ep').allowed
+    assert limiter.check('a', 'other').allowed
+    assert limiter.check('a', 'open') is None
+
+def test_leases_absorb_checks_locally(fake_redis):
+    clock = Clock()
+    limiter = RateLimiter({'default': ['1000/hour']}, redis=fake_redis, lease_size=10, clock=clock)
+    assert limiter.check('key', 'ep').allowed
+    assert bucket_tokens(fake_redis) == pytest.approx(990, abs=1)
+    for _ in range(9):
+        assert limiter.check('key', 'ep').allowed
+    assert bucket_tokens(fake_redis) == pytest.approx(990, abs=1)
+    limiter.check('key', 'ep')
+    assert bucket_tokens(fake_redis) == pytest.approx(980, abs=1)
+    # The lease cache holds the hashed key, never the raw one
+    assert list(limiter._leases) == [(tenant_id('key'), 'ep')]
+
+def test_expired_leases_refund_unspent_tokens(fake_redis):
+    clocks = [Clock() for _ in range(4)]
+    limiters = [RateLimiter({'default': ['1000/day']}, redis=fake_redis, clock=clock) for clock in clocks]
+    # One request per lease: each process would otherwise burn a whole lease per request
+    for i in range(40):
+        clocks[i % 4].now += 2
+        assert limiters[i % 4].check('key', 'ep').allowed
+    assert bucket_tokens(fake_redis, '1000/86400') == pytest.approx(1000 - 40 - 4 * 9, abs=1)
+
+def test_local_leases_refund_unspent_tokens():
+    clock = Clock()
+    limiter = RateLimiter({'default': ['1000/day']}, lease_size=10, clock=clock)
+    for _ in range(5):
+        assert limiter.check('key', 'ep').allowed
+        clock.now += 2
+    (left, _), = limiter._local._buckets.values()
+    assert left == pytest.approx(1000 - 5 - 9, abs=1)
+
+def test_processes_share_the_redis_bucket(fake_redis):
+    limiters = [RateLimiter({'default': ['10/minute', '1000/day']}, redis=fake_redis, clock=Clock()) for _ in range(2)]
+    allowed = [limiters[i % 2].check('key', 'ep').allowed for i in range(12)]
+    assert allowed.count(True) == 10
+    assert bucket_tokens(fake_redis, '1000/86400') == pytest.approx(990, abs=1)
+
+def test_redis_errors_fail_open():
+    limiter = RateLimiter({'default': ['1/second']}, redis=BrokenRedis())
+    assert limiter.check('key', 'ep') is None
+
+@pytest.fixture
+def limited_client(tmp_path):
+    (tmp_path / 'test_key').mkdir()
+    config = type('RateLimitTestingConfig', (TestingConfig,), {
+        'API_KEYS_DIR': str(tmp_path),
+        'RATE_LIMITS': {'default': ['100/second'], 'process_process_request': ['2/minute']},
+    })
+    return create_app(config).test_client()
+
+def test_endpoint_returns_429_with_headers(limited_client):
+    headers = {"x-api-key": "test_key"}
+    responses = [limited_client.post("/process/process_request", json={"username": "a", "age": i}, headers=headers)
+                 for i in range(3)]
+    assert [rv.status_code for rv in responses] == [202, 202, 429]
+    assert responses[0].headers['RateLimit-Limit'] == '2'
+    assert responses[1].headers['RateLimit-Remaining'] == '0'
+    assert int(responses[2].headers['Retry-After']) > 0
+    # Other endpoints have their own buckets
+    assert limited_client.get("/process/status/abc", headers=headers).headers['RateLimit-Limit'] == '100'
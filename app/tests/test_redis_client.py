@@ -0,0 +1,26 @@
+import redis
+from app.config import TestingConfig
+from app.redis_client import get_redis, init_redis
+
+def test_clients_are_shared_and_pooled():
+    client = get_redis('redis://localhost:6379/5')
+    assert get_redis('redis://localhost:6379/5') is client
+    assert get_redis('redis://localhost:6379/6') is not client
+    pool = client.connection_pool
+    assert isinstance(pool, redis.BlockingConnectionPool)
+    assert pool.max_connections == TestingConfig.REDIS_MAX_CONNECTIONS
+    assert pool.connection_kwargs['health_check_interval'] == TestingConfig.REDIS_HEALTH_CHECK_INTERVAL
+    assert pool.connection_kwargs['socket_keepalive'] is True
+
+def config(**overrides):
+    values = {key: getattr(TestingConfig, key) for key in dir(TestingConfig) if key.isupper()}
+    return dict(values, **overrides)
+
+def test_init_redis_applies_config():
+    app = type('App', (), {'config': config(REDIS_MAX_CONNECTIONS=3)})
+    init_redis(app)
+    try:
+        assert get_redis('redis://localhost:6379/5').connection_pool.max_connections == 3
+    finally:
+        app.config = config()
+        init_redis(app)
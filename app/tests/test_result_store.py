@@ -0,0 +1,130 @@
+import json
+import os
+import pytest
+from app.config import TestingConfig
+from app.key_store import tenant_id
+from app.main import create_app
+from app.result_store import ResultStore, is_pointer
+
+class Clock:
+    def __init__(self):
+        self.now = 1000000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def store(tmp_path):
+    return ResultStore(str(tmp_path), '/files/results', inline_limit=100, ttl=60, clock=Clock())
+
+def test_small_results_stay_inline(store, tmp_path):
+    assert store.save('t1', 'abcd', {"ok": True}) == {"ok": True}
+    assert store.save('t1', 'abcd', None) is None
+    assert os.listdir(tmp_path) == []
+
+def test_large_results_are_written_to_sharded_files(store, tmp_path):
+    result = {"rows": list(range(100))}
+    pointer = store.save('t1', 'abcd-1234', result)
+    assert is_pointer(pointer)
+    path = tmp_path / 't1' / '34' / 'abcd-1234.json'
+    assert json.loads(path.read_bytes()) == result
+    assert pointer['size'] == path.stat().st_size
+    assert os.listdir(path.parent) == ['abcd-1234.json']
+    assert store.present({"task_id": "abcd-1234", "status": "SUCCESS", "result": pointer}) == {
+        "task_id": "abcd-1234", "status": "SUCCESS",
+        "result_url": "/files/results/abcd-1234", "result_size": pointer['size'],
+    }
+    assert store.locate(pointer) == ('t1/34/abcd-1234.json', str(path))
+
+def test_large_results_are_streamed_to_the_file(store, tmp_path, monkeypatch):
+    from app import json_codec
+    monkeypatch.setattr(json_codec, 'dumps', None)
+    result = {"rows": [{"id": i, "name": "é" * i} for i in range(50)], "count": 50}
+    pointer = store.save('t1', 'abcd', result)
+    assert (tmp_path / pointer['__result_file__']).read_bytes() == json.dumps(
+        result, ensure_ascii=False, separators=(',', ':')
+    ).encode('utf-8')
+
+def test_writer_recreates_a_directory_the_sweeper_removed(store, tmp_path, monkeypatch):
+    real_open = open
+    calls = []
+
+    def racing_open(path, mode):
+        calls.append(path)
+        if len(calls) == 1:
+            os.rmdir(os.path.dirname(path))
+        return real_open(path, mode)
+
+    monkeypatch.setattr('builtins.open', racing_open)
+    with store.writer('t1', 'abcd') as (file, _):
+        file.write(b'{}')
+    assert len(calls) == 2
+    assert (tmp_path / 't1' / 'cd' / 'abcd.json').read_bytes() == b'{}'
+
+def test_failed_write_leaves_nothing_behind(store, tmp_path):
+    with pytest.raises(RuntimeError):
+        with store.writer('t1', 'abcd') as (file, _):
+            file.write(b'partial')
+            raise RuntimeError("task failed")
+    assert os.listdir(tmp_path / 't1' / 'cd') == []
+
+def test_sweep_removes_expired_files(store, tmp_path):
+    old = store.save('t1', 'aaaa', {"rows": list(range(100))})
+    store.save('t2', 'bbbb', {"rows": list(range(100))})
+    stray = tmp_path / 't2' / 'bb' / '.tmp-1-bbcc.json'
+    stray.write_bytes(b'')
+    keep = tmp_path / 'README'
+    keep.write_text('not a result')
+    past = store._clock() - 120
+    for path in (tmp_path / old['__result_file__'], stray, keep):
+        os.utime(path, (past, past))
+    assert store.sweep() == 2
+    assert not (tmp_path / 't1').exists()
+    assert os.listdir(tmp_path / 't2' / 'bb') == ['bbbb.json']
+    assert keep.exists()
+
+def offloading_client(tmp_path, monkeypatch, **settings):
+    from app import tasks
+    for key in ('test_key', 'other_key'):
+        (tmp_path / 'keys' / key).mkdir(parents=True, exist_ok=True)
+    config = type('ResultTestingConfig', (TestingConfig,), {
+        'API_KEYS_DIR': str(tmp_path / 'keys'),
+        'RESULT_DIR': str(tmp_path / 'results'),
+        'RESULT_INLINE_MAX_BYTES': 10,
+        **settings,
+    })
+    monkeypatch.setattr(tasks, '_process', lambda task_id, data, webhook_url: {"echo": data})
+    return create_app(config).test_client()
+
+def test_status_links_offloaded_results(tmp_path, monkeypatch):
+    client = offloading_client(tmp_path, monkeypatch)
+    headers = {"x-api-key": "test_key"}
+    task_id = client.post("/process/process_request", json={"username": "a", "age": 1}, headers=headers).get_json()["task_id"]
+    status = client.get(f"/process/status/{task_id}", headers=headers).get_json()
+    assert "result" not in status
+    assert task_id.startswith(tenant_id('test_key'))
+    assert status["result_url"] == f"/process/results/{task_id}"
+    relative = f"{tenant_id('test_key')}/{task_id[-2:]}/{task_id}.json"
+    assert json.loads((tmp_path / 'results' / relative).read_bytes()) == {"echo": {"username": "a", "age": 1}}
+    rv = client.get(status["result_url"], headers=headers)
+    assert rv.status_code == 200
+    assert rv.headers['X-Accel-Redirect'] == f"/files/results/{relative}"
+    assert rv.data == b''
+
+def test_result_download_checks_the_api_key(tmp_path, monkeypatch):
+    client = offloading_client(tmp_path, monkeypatch, RESULT_ACCEL_REDIRECT='')
+    headers = {"x-api-key": "test_key"}
+    task_id = client.post("/process/process_request", json={"username": "a", "age": 1}, headers=headers).get_json()["task_id"]
+    rv = client.get(f"/process/results/{task_id}", headers=headers)
+    assert rv.status_code == 200
+    assert rv.mimetype == 'application/json'
+    assert rv.get_json() == {"echo": {"username": "a", "age": 1}}
+    assert client.get(f"/process/results/{task_id}").status_code == 400
+    assert client.get(f"/process/results/{task_id}", headers={"x-api-key": "other_key"}).status_code == 404
+    # Swept, and never offloaded
+    for path in (tmp_path / 'results').rglob('*.json'):
+        path.unlink()
+    assert client.get(f"/process/results/{task_id}", headers=headers).status_code == 404
+    small = offloading_client(tmp_path, monkeypatch, RESULT_INLINE_MAX_BYTES=1000)
+    task_id = small.post("/process/process_request", json={"username": "a", "age": 1}, headers=headers).get_json()["task_id"]
+    assert small.get(f"/process/results/{task_id}", headers=headers).status_code == 404
@@ -0,0 +1,164 @@
+import copy
+import glob
+import json
+import os
+import random
+from jsonschema import Draft7Validator
+from app.schema_compiler import PLAIN, SchemaCompiler, compiler
+from app.schema_registry import CompiledSchema
+from app.utils import validate_data
+from app.validation import LENIENT, MODES, STRICT, normalize
+
+TEST_FILES = os.path.join(os.path.dirname(__file__), 'test_files')
+KEYS = ['a', 'b', 'c', 'd']
+STRINGS = ['', 'x', 'abc', 'high', 'a1']
+NUMBERS = [0, 1, -3, 1.0, 1.5, 2 ** 40, True, False]
+TYPES = ['object', 'array', 'string', 'number', 'integer', 'boolean', 'null']
+
+
+def load(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def random_value(rng, depth=3):
+    kind = rng.randrange(6 if depth else 4)
+    if kind == 0:
+        return None
+    if kind == 1:
+        return rng.choice(NUMBERS)
+    if kind == 2:
+        return rng.choice(STRINGS)
+    if kind == 3:
+        return rng.choice([True, False])
+    if kind == 4:
+        return [random_value(rng, depth - 1) for _ in range(rng.randrange(4))]
+    return {key: random_value(rng, depth - 1) for key in rng.sample(KEYS, rng.randrange(len(KEYS) + 1))}
+
+
+def random_schema(rng, depth=3, boolean=False):
+    if not depth or rng.random() < 0.1:
+        # app.validation's normalizers expect property schemas to be objects
+        return rng.choice([True, False, {}]) if boolean else {}
+    schema = {}
+    if rng.random() < 0.8:
+        schema['type'] = rng.choice(TYPES) if rng.random() < 0.8 else rng.sample(TYPES, 2)
+    if rng.random() < 0.15:
+        schema['enum'] = [random_value(rng, 1) for _ in range(rng.randrange(1, 4))]
+    if rng.random() < 0.05:
+        schema['const'] = random_value(rng, 1)
+    for keyword, value in (('minLength', 1), ('maxLength', 2), ('pattern', '^a'), ('minimum', 0),
+                           ('maximum', 1), ('exclusiveMinimum', -3), ('exclusiveMaximum', 2),
+                           ('minItems', 1), ('maxItems', 2)):
+        if rng.random() < 0.1:
+            schema[keyword] = value
+    if rng.random() < 0.3:
+        schema['items'] = random_schema(rng, depth - 1, boolean=True)
+    if rng.random() < 0.6:
+        schema['properties'] = {
+            key: random_schema(rng, depth - 1) for key in rng.sample(KEYS, rng.randrange(1, len(KEYS)))
+        }
+        for key, subschema in schema['properties'].items():
+            if isinstance(subschema, dict) and rng.random() < 0.3:
+                subschema['default'] = random_value(rng, 1)
+    if rng.random() < 0.4:
+        names = list(schema.get('properties', KEYS))
+        schema['required'] = rng.sample(names, rng.randrange(1, len(names) + 1))
+    if rng.random() < 0.15:
+        schema['additionalProperties'] = rng.choice([True, False])
+    return schema
+
+
+def cases():
+    """Every test_files schema against every test_files payload, plus a fixed seed of random pairs."""
+    schemas = [load(path) for path in sorted(glob.glob(os.path.join(TEST_FILES, 'test_schema_*.json')))]
+    payloads = [load(path) for path in sorted(glob.glob(os.path.join(TEST_FILES, 'test_payload_*.json')))]
+    pairs = [(schema, payload) for schema in schemas for payload in payloads]
+    rng = random.Random(2024)
+    for _ in range(300):
+        schema = random_schema(rng)
+        pairs.extend((schema, random_value(rng)) for _ in range(10))
+    return pairs
+
+
+def without_compiler(compiled):
+    plain = copy.copy(compiled)
+    plain.fast_normalizers = {}
+    return plain
+
+
+def test_fixtures_match_jsonschema():
+    compiler = SchemaCompiler()
+    for path in glob.glob(os.path.join(TEST_FILES, 'test_schema_*_request.json')):
+        number = os.path.basename(path).split('_')[2]
+        schema, payload = load(path), load(os.path.join(TEST_FILES, f'test_payload_{number}_request.json'))
+        check = compiler.compile(schema)
+        assert check is not None, path
+        assert check(payload) is True
+        assert check({}) == Draft7Validator(schema).is_valid({})
+
+def test_verdicts_match_jsonschema(monkeypatch):
+    outcomes = set()
+    pairs = cases()
+    for schema, data in pairs:
+        check = SchemaCompiler().compile(schema)
+        expected = Draft7Validator(schema).is_valid(data)
+        assert check(data) == expected, (schema, data)
+        outcomes.add(expected)
+    assert outcomes == {True, False}
+
+    # validate_data reports the same errors with or without the generated code
+    sample = pairs[::5]
+    results = [validate_data(schema, data) for schema, data in sample]
+    monkeypatch.setattr(compiler, 'enabled', False)
+    assert results == [validate_data(schema, data) for schema, data in sample]
+
+def test_normalizing_matches_jsonschema():
+    compiled_schemas = {}
+    fast = 0
+    for schema, data in cases():
+        if not isinstance(schema, dict):
+            continue
+        key = json.dumps(schema, sort_keys=True)
+        if key not in compiled_schemas:
+            compiled_schemas[key] = CompiledSchema('fuzz', 'request', schema)
+        compiled = compiled_schemas[key]
+        for mode in MODES:
+            expected_data = copy.deepcopy(data)
+            expected = normalize(without_compiler(compiled), expected_data, mode)
+            actual_data = copy.deepcopy(data)
+            assert normalize(compiled, actual_data, mode) == expected, (schema, data, mode)
+            assert actual_data == expected_data
+            fast += compiled.fast_normalizers.get(mode) is not None
+    assert fast
+
+def test_unsupported_keywords_fall_back():
+    schema = {
+        "type": "object",
+        "properties": {"a": {"anyOf": [{"type": "string"}, {"type": "integer"}]}},
+        "required": ["a"],
+    }
+    compiled = CompiledSchema('fuzz', 'request', schema)
+    assert compiled.check is None and compiled.fast_normalizers == {}
+    assert validate_data(schema, {"a": 1.5})[0]
+    assert validate_data(schema, {"a": 1}) == ([], {"a": 1})
+    lenient = {"type": "object", "properties": {"a": {"type": "string"}}, "required": ["b"]}
+    assert SchemaCompiler().compile(lenient, LENIENT) is None
+    assert SchemaCompiler().compile(lenient, STRICT) is not None
+    assert SchemaCompiler().compile({"type": "object", "patternProperties": {"^a": {}}}) is None
+    assert SchemaCompiler(enabled=False).compile({"type": "object"}) is None
+
+def test_generated_code_is_cached_in_memory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    schema = load(os.path.join(TEST_FILES, 'test_schema_4_request.json'))
+    schema_compiler = SchemaCompiler()
+    check = schema_compiler.compile(schema, LENIENT)
+    assert schema_compiler.compile(copy.deepcopy(schema), LENIENT) is check
+    assert schema_compiler.compile(schema, PLAIN) is not check
+    assert list(tmp_path.iterdir()) == []
+
+def test_enum_equality_matches_jsonschema():
+    schema = {"enum": [1, [1, {"a": True}], "x", None]}
+    check = SchemaCompiler().compile(schema)
+    for value in [1, 1.0, True, 0, False, [1.0, {"a": True}], [True, {"a": 1}], [1], "x", "1", None]:
+        assert check(value) == Draft7Validator(schema).is_valid(value), value
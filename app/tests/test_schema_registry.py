@@ -0,0 +1,161 @@
+import json
+import os
+import shutil
+import pytest
+from jsonschema import SchemaError
+from app.schema_registry import SCHEMA_DIR, SchemaRegistry
+from app.utils import validate_data
+
+@pytest.fixture
+def schema_dir(tmp_path):
+    (tmp_path / 'widget_request.json').write_text(json.dumps({
+        "type": "object",
+        "properties": {"name": {"type": "string"}, "size": {"type": "number"}},
+        "required": ["name"]
+    }))
+    (tmp_path / 'widget_response.json').write_text(json.dumps({
+        "type": "object",
+        "properties": {"task_id": {"type": "string"}, "message": {"type": "string", "default": "queued"}}
+    }))
+    return tmp_path
+
+def test_load_compiles_request_and_response(schema_dir):
+    registry = SchemaRegistry(str(schema_dir)).load()
+    request_schema = registry.get('widget', 'request')
+    response_schema = registry.get('/widget', 'response')
+    assert request_schema.allowed_properties == {"name", "size"}
+    assert response_schema.defaults == {"message": "queued"}
+
+def test_get_returns_same_compiled_schema(schema_dir):
+    registry = SchemaRegistry(str(schema_dir))
+    assert registry.get('widget', 'request') is registry.get('widget', 'request')
+
+def test_missing_schema_returns_none(schema_dir):
+    assert SchemaRegistry(str(schema_dir)).get('widget_missing', 'response') is None
+
+def test_invalid_schema_is_rejected_at_load(schema_dir):
+    (schema_dir / 'broken_request.json').write_text(json.dumps({"type": "not-a-type"}))
+    with pytest.raises(SchemaError):
+        SchemaRegistry(str(schema_dir)).load()
+
+def test_compiled_validator_matches_validate(schema_dir):
+    compiled = SchemaRegistry(str(schema_dir)).get('widget', 'request')
+    payload = {"size": 3}
+    assert validate_data(compiled.schema, payload, validator=compiled.validator) == validate_data(compiled.schema, payload)
+    assert validate_data(compiled.schema, payload, validator=compiled.validator)[0] == ["'name' is a required property"]
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+def rewrite(path, schema):
+    # Bump the mtime explicitly; some filesystems only keep whole seconds
+    stat = path.stat()
+    path.write_text(json.dumps(schema))
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+
+def test_changed_file_is_swapped_in_and_old_version_kept(schema_dir):
+    clock = Clock()
+    registry = SchemaRegistry(str(schema_dir), reload_interval=2, keep_versions=2, clock=clock).load()
+    first = registry.get('widget', 'request')
+    original = json.loads((schema_dir / 'widget_request.json').read_text())
+    changed = []
+    registry.subscribe(changed.append)
+    path = schema_dir / 'widget_request.json'
+    rewrite(path, {"type": "object", "properties": {"name": {"type": "string"}}, "required": []})
+    assert registry.get('widget', 'request') is first
+    clock.now += 2
+    second = registry.get('widget', 'request')
+    assert second is not first and second.allowed_properties == {"name"}
+    assert changed == [second]
+    assert registry.get('widget', 'request', version=first.version) is first
+    # Reverting to a kept version swaps it back in without recompiling
+    rewrite(path, original)
+    assert registry.refresh() == [first]
+    assert registry.get('widget', 'request') is first
+    rewrite(path, {"type": "object"})
+    clock.now += 2
+    third = registry.get('widget', 'request')
+    assert registry.versions('widget', 'request') == [first.version, third.version]
+    assert registry.get('widget', 'request', version=second.version) is None
+
+def test_unchanged_files_are_not_reparsed(schema_dir, monkeypatch):
+    registry = SchemaRegistry(str(schema_dir)).load()
+    current = registry.get('widget', 'request')
+    path = schema_dir / 'widget_request.json'
+    rewrite(path, json.loads(path.read_text()))
+    monkeypatch.setattr(json, 'loads', lambda *args: pytest.fail("file was reparsed"))
+    assert registry.refresh() == []
+    assert registry.get('widget', 'request') is current
+
+def test_broken_reload_keeps_current_version(schema_dir):
+    registry = SchemaRegistry(str(schema_dir)).load()
+    current = registry.get('widget', 'request')
+    rewrite(schema_dir / 'widget_request.json', {"type": "not-a-type"})
+    assert registry.refresh() == []
+    assert registry.get('widget', 'request') is current
+
+def test_requests_report_schema_version(tmp_path):
+    from app.config import TestingConfig
+    from app.main import create_app
+    from app.schema_registry import SCHEMA_VERSION_HEADER, registry
+    (tmp_path / 'test_key').mkdir()
+    config = type('SchemaTestingConfig', (TestingConfig,), {'API_KEYS_DIR': str(tmp_path)})
+    client = create_app(config).test_client()
+    rv = client.post("/process/process_request", json={"username": "a", "age": 1}, headers={"x-api-key": "test_key"})
+    assert rv.headers[SCHEMA_VERSION_HEADER] == registry.get('process_request', 'request').version
+
+def test_named_listener_replaces_the_previous_one(schema_dir):
+    registry = SchemaRegistry(str(schema_dir)).load()
+    first, second, other = [], [], []
+    registry.subscribe(first.append, name='docs')
+    registry.subscribe(second.append, name='docs')
+    registry.subscribe(other.append)
+    rewrite(schema_dir / 'widget_request.json', {"type": "object"})
+    changed = registry.refresh()
+    assert first == [] and second == other == changed
+
+def test_create_app_subscribes_once(tmp_path):
+    from app.config import TestingConfig
+    from app.main import create_app
+    from app.schema_registry import registry
+    config = type('SchemaTestingConfig', (TestingConfig,), {'API_KEYS_DIR': str(tmp_path)})
+    create_app(config)
+    count = len(registry._listeners)
+    for _ in range(3):
+        create_app(config)
+    assert len(registry._listeners) == count
+
+@pytest.fixture
+def pinned_registry(tmp_path, monkeypatch):
+    from app import tasks
+    from app.config import TestingConfig
+    from app.main import create_app
+    from app.schema_registry import registry
+    schema_dir = tmp_path / 'schemas'
+    shutil.copytree(SCHEMA_DIR, schema_dir)
+    monkeypatch.setattr(registry, 'schema_dir', str(schema_dir))
+    registry.clear()
+    create_app(TestingConfig)
+    monkeypatch.setattr(tasks, '_process', lambda task_id, data, webhook_url: data)
+    yield registry, schema_dir / 'process_request_request.json'
+    registry.clear()
+
+def test_tasks_are_checked_against_the_version_they_were_accepted_under(pinned_registry):
+    from app import tasks
+    registry, path = pinned_registry
+    accepted = registry.get('process_request', 'request').version
+    rewrite(path, {"type": "object", "properties": {"email": {"type": "string"}}, "required": ["email"]})
+    registry.refresh()
+    assert registry.get('process_request', 'request').version != accepted
+    payload = {"username": "a", "age": 1}
+    result = tasks.process_task.apply(args=[payload], headers={'schema_version': accepted})
+    assert result.status == "SUCCESS"
+    result = tasks.process_task.apply(args=[{"username": "a"}], headers={'schema_version': accepted})
+    assert result.status == "FAILURE"
+    assert str(result.result) == f"Payload does not match request schema version {accepted}"
+    # A version this process never loaded is not replaced by the current one
+    assert tasks.process_task.apply(args=[payload], headers={'schema_version': 'unknown'}).status == "SUCCESS"
@@ -0,0 +1,37 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def run(cwd, script, **env):
+    result = subprocess.run([sys.executable, '-c', script], cwd=cwd, env=dict(os.environ, PYTHONPATH=ROOT, **env),
+                            check=True, capture_output=True, text=True)
+    return result.stdout
+
+def loaded_modules(cwd, statement):
+    return set(run(cwd, f"import sys\n{statement}\nprint('\\n'.join(sys.modules))").split())
+
+def test_web_does_not_load_worker_or_test_only_modules():
+    modules = loaded_modules(ROOT, "import app.main")
+    assert not {'requests', 'app.webhooks', 'app.utils'} & modules
+
+def test_worker_does_not_load_restx():
+    modules = loaded_modules(os.path.join(ROOT, 'celery'), "import tasks")
+    assert 'flask_restx' not in modules
+    assert 'app.webhooks' in modules
+
+def test_worker_runs_tasks_outside_an_app_context():
+    # As a worker process does, without the Flask app the web side binds; the
+    # first task builds the worker's own
+    script = (
+        "from flask import has_app_context\n"
+        "import tasks\n"
+        "assert not has_app_context()\n"
+        "result = tasks.process_task.apply(args=[{'username': 'worker'}], kwargs={'tenant': 't'})\n"
+        "import sys\n"
+        "print(result.state, 'flask_restx' in sys.modules, len(logging.getLogger().handlers))"
+    )
+    output = run(os.path.join(ROOT, 'celery'), "import logging\n" + script, FLASK_CONFIG='app.config.TestingConfig')
+    # The worker's app leaves out the API and logging setup of the web app
+    assert output.split() == ['SUCCESS', 'False', '0']
@@ -0,0 +1,169 @@
+import io
+import json
+import shutil
+import tracemalloc
+import pytest
+from app.config import TestingConfig
+from app.main import create_app
+from app.schema_registry import SCHEMA_DIR, CompiledSchema, registry
+from app.streaming import check_depth, iter_json_array, read_object, StreamParseError
+from app.validation import STRICT, normalize, normalize_stream
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "username": {"type": "string"},
+        "records": {
+            "type": "array",
+            "maxItems": 100000,
+            "items": {
+                "type": "object",
+                "properties": {"id": {"type": "integer"}, "tag": {"type": "string", "default": "none"}},
+                "required": ["id"],
+            },
+        },
+    },
+    "required": ["username"],
+}
+
+class Stream(io.BytesIO):
+    """BytesIO that records how far it has been read."""
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.consumed = self.tell()
+        return chunk
+
+def body(records):
+    return json.dumps({"username": "a", "records": records}).encode('utf-8')
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 1 << 16])
+def test_read_object_streams_named_arrays(chunk_size):
+    seen = []
+    data = {"a": [1, {"b": None}], "records": [{"id": 1}, {"id": 2}], "n": 1.5e3}
+    result = read_object(io.BytesIO(json.dumps(data).encode()), {
+        "records": lambda index, item: seen.append(index) or dict(item, seen=True),
+    }, max_depth=4, chunk_size=chunk_size)
+    assert seen == [0, 1]
+    assert result == dict(data, records=[{"id": 1, "seen": True}, {"id": 2, "seen": True}])
+
+@pytest.mark.parametrize("raw", [b'[]', b'{"a" 1}', b'{"a": 1,}', b'{"a": 1} x', b'{"records": [1,]}', b'{1: 2}'])
+def test_read_object_rejects_malformed_input(raw):
+    with pytest.raises(StreamParseError):
+        read_object(io.BytesIO(raw), {"records": lambda index, item: item}, max_depth=4, chunk_size=2)
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 1 << 16])
+@pytest.mark.parametrize("raw, offset", [
+    (b'[{"a": "\xc3\xa9\xff"}]', 10), (b'[{"a": "\xc3("}]', 8), (b'[{"a": 1}, "\xe2\x82', 12),
+])
+def test_invalid_utf8_is_a_parse_error(raw, offset, chunk_size):
+    with pytest.raises(StreamParseError) as e:
+        list(iter_json_array(io.BytesIO(raw), chunk_size=chunk_size))
+    assert str(e.value) == f"Invalid UTF-8 at byte {offset}"
+
+def test_syntax_errors_are_raised_without_reading_on():
+    stream = Stream(b'[{"a": 1x}, ' + b', '.join([b'{"a": 1}'] * 500000) + b']')
+    with pytest.raises(StreamParseError) as e:
+        list(iter_json_array(stream))
+    assert e.value.index == 0
+    assert stream.consumed <= 2 * 65536
+
+def test_oversized_items_are_rejected_before_they_are_buffered():
+    stream = Stream(b'[1, "' + b'x' * 1000000 + b'"]')
+    with pytest.raises(StreamParseError, match="longer than 1000 characters") as e:
+        list(iter_json_array(stream, chunk_size=256, max_item_size=1000))
+    assert e.value.index == 1
+    assert stream.consumed <= 4096
+    with pytest.raises(StreamParseError):
+        read_object(Stream(body([{"id": 1, "tag": "x" * 5000}])), {"records": lambda index, item: item},
+                    max_depth=4, chunk_size=256, max_item_size=1000)
+
+def test_depth_limit():
+    check_depth({"a": [{"b": 1}]}, 3)
+    with pytest.raises(StreamParseError):
+        check_depth({"a": [{"b": []}]}, 3)
+    with pytest.raises(StreamParseError):
+        read_object(io.BytesIO(b'{"records": [{"a": [[]]}]}'), {"records": lambda i, item: item}, max_depth=4)
+    with pytest.raises(StreamParseError) as e:
+        list(iter_json_array(io.BytesIO(b'[1, [[2]]]'), max_depth=1))
+    assert e.value.index == 1
+
+def test_normalize_stream_matches_normalize():
+    compiled = CompiledSchema('widget', 'request', SCHEMA)
+    records = [{"id": i, "extra": True} for i in range(5)]
+    expected = normalize(compiled, json.loads(body(records)))
+    assert normalize_stream(compiled, io.BytesIO(body(records)), chunk_size=7) == expected
+    assert expected[1]["records"][0] == {"id": 0, "tag": "none"}
+    errors, payload, reason = normalize_stream(compiled, io.BytesIO(body(records)), STRICT)
+    assert errors and payload == {} and reason == 'additionalProperties'
+
+def test_normalize_stream_stops_at_first_invalid_item():
+    compiled = CompiledSchema('widget', 'request', SCHEMA)
+    stream = Stream(body([{"id": 1}, {"id": "two"}] + [{"id": i} for i in range(10000)]))
+    errors, payload, reason = normalize_stream(compiled, stream, chunk_size=64)
+    assert errors == ["records[1]: 'two' is not of type 'integer'"]
+    assert reason == 'type'
+    assert stream.consumed < 1024
+
+def peak_memory(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def test_streaming_peak_memory_is_below_reading_whole_body():
+    compiled = CompiledSchema('widget', 'request', SCHEMA)
+    raw = body([{"id": i, "tag": "x" * 40} for i in range(20000)])
+    # As get_json does: the body is copied into memory whole, then decoded
+    whole = peak_memory(lambda: normalize(compiled, json.loads(bytearray(raw))))
+    streamed = peak_memory(lambda: normalize_stream(compiled, io.BytesIO(raw)))
+    # The decoded payload is held either way; reading whole also holds the body text
+    assert whole - streamed > len(raw) / 2
+
+@pytest.fixture
+def streaming_client(tmp_path):
+    schema_dir = tmp_path / 'schemas'
+    shutil.copytree(SCHEMA_DIR, schema_dir)
+    (schema_dir / 'process_request_request.json').write_text(json.dumps(SCHEMA))
+    (tmp_path / 'keys' / 'test_key').mkdir(parents=True)
+    config = type('StreamingTestingConfig', (TestingConfig,), {
+        'API_KEYS_DIR': str(tmp_path / 'keys'),
+        'STREAMING_MIN_BYTES': 0,
+        'MAX_CONTENT_LENGTH': 4096,
+        'JSON_MAX_DEPTH': 4,
+    })
+    original = registry.schema_dir
+    registry.schema_dir = str(schema_dir)
+    registry.clear()
+    try:
+        yield create_app(config).test_client()
+    finally:
+        registry.schema_dir = original
+        registry.clear()
+        registry.load()
+
+def post(client, data):
+    return client.post("/process/process_request", data=data, content_type='application/json',
+                       headers={"x-api-key": "test_key"})
+
+def test_streamed_request_reaches_task(streaming_client, monkeypatch):
+    from app import tasks
+    received = []
+    monkeypatch.setattr(tasks, '_process', lambda task_id, data, webhook_url: received.append(data))
+    rv = post(streaming_client, body([{"id": 1, "extra": 1}, {"id": 2, "tag": "b"}]))
+    assert rv.status_code == 202
+    assert received == [{"username": "a", "records": [{"id": 1, "tag": "none"}, {"id": 2, "tag": "b"}]}]
+
+def test_streamed_request_limits(streaming_client):
+    rv = post(streaming_client, body([{"id": 1}, {"id": None}]))
+    assert rv.status_code == 400
+    assert rv.get_json()["error"] == ["records[1]: None is not of type 'integer'"]
+    rv = post(streaming_client, body([{"id": 1, "deep": [[1]]}]))
+    assert rv.status_code == 400
+    assert "nested deeper" in rv.get_json()["error"]
+    assert post(streaming_client, body([{"id": i} for i in range(1000)])).status_code == 413
+    rv = post(streaming_client, b'{"username": "\xff", "records": []}')
+    assert rv.status_code == 400
+    assert rv.get_json()["error"] == "Invalid UTF-8 at byte 14"
@@ -0,0 +1,121 @@
+import threading
+import pytest
+from celery.contrib.testing.worker import start_worker
+from app.config import TestingConfig
+from app.main import create_app
+from app.celery_app import celery, init_celery
+from app import tasks
+from app.task_batching import batch_time_limits
+
+
+class Delivered:
+    retry_in = None
+
+    def __init__(self, url, payload):
+        self.url, self.payload = url, payload
+
+    def as_dict(self):
+        return {"url": self.url, "delivered": self.payload.get("n") != "down"}
+
+
+class FakeDeliverer:
+    def __init__(self):
+        self.batches = []
+
+    def deliver_many(self, deliveries):
+        deliveries = list(deliveries)
+        self.batches.append(len(deliveries))
+        if any(payload.get("n") == "boom" for _, payload, _ in deliveries):
+            raise ConnectionError("webhook pool closed")
+        return [Delivered(url, payload) for url, payload, _ in deliveries]
+
+
+def drop_connections():
+    # The app caches its result backend and broker pool from the settings they were first made with
+    celery._backend_cache = None
+    celery._local = threading.local()
+    celery._pool = None
+    celery.amqp._producer_pool = None
+
+@pytest.fixture
+def worker_app(tmp_path, monkeypatch):
+    config = type('BatchingTestingConfig', (TestingConfig,), {
+        'CELERY_BROKER_URL': 'memory://',
+        # Results written by the worker thread must be readable from the test thread
+        'CELERY_RESULT_BACKEND': f'file://{tmp_path}',
+        'CELERY_ALWAYS_EAGER': False,
+        'CELERY_STORE_EAGER_RESULT': False,
+        'WEBHOOK_URL': 'http://hooks.example/in',
+        'TENANT_MAX_CONCURRENCY': 1,
+    })
+    app = create_app(config)
+    init_celery(app)
+    drop_connections()
+    deliverer = FakeDeliverer()
+    monkeypatch.setattr(tasks, '_get_deliverer', lambda: deliverer)
+    monkeypatch.setattr(tasks.process_task, 'batch_size', 5)
+    app.deliverer = deliverer
+    yield app
+    init_celery(create_app(TestingConfig))
+    drop_connections()
+
+def request(task_id, data, tenant=None, retries=0):
+    return {
+        "id": task_id, "task": tasks.process_task.name, "retries": retries,
+        "args": [data], "kwargs": {"tenant": tenant}, "delivery_info": {"routing_key": "normal", "exchange": ""},
+    }
+
+def test_worker_runs_messages_in_batches(worker_app, monkeypatch):
+    monkeypatch.setitem(celery.conf, 'worker_prefetch_multiplier', 20)
+    with start_worker(celery, pool='solo', perform_ping_check=False, shutdown_timeout=10):
+        results = [tasks.process_task.delay({"n": n}) for n in range(12)]
+        outcomes = [result.get(timeout=10) for result in results]
+
+    # Two full batches, and the rest once TASK_BATCH_INTERVAL passed
+    assert worker_app.deliverer.batches == [5, 5, 2]
+    assert outcomes == [{"url": "http://hooks.example/in", "delivered": True}] * 12
+    assert all(result.state == "SUCCESS" for result in results)
+
+def test_batch_settles_each_message(worker_app):
+    slots = worker_app.extensions['tenant_slots']
+    assert slots.acquire('busy', 'other-task')
+    with worker_app.app_context():
+        worker_app.extensions['idempotency'].begin_task('dup')
+        result_states = tasks.process_task.run_batch([
+            request('ok', {"n": 1}),
+            request('busy-1', {"n": 2}, tenant='busy'),
+            request('dup', {"n": 3}),
+            request('down', {"n": "down"}, tenant='t'),
+            request('busy-2', {"n": 4}, tenant='busy', retries=TestingConfig.TENANT_MAX_RETRIES),
+        ])
+    assert result_states == ["SUCCESS", "RETRY", "IGNORED", "SUCCESS", "FAILURE"]
+    assert tasks.process_task.AsyncResult('ok').result == {"url": "http://hooks.example/in", "delivered": True}
+    assert tasks.process_task.AsyncResult('busy-1').state == "RETRY"
+    assert tasks.process_task.AsyncResult('down').result["delivered"] is False
+    # Out of retries waiting for a slot
+    assert isinstance(tasks.process_task.AsyncResult('busy-2').result, tasks.process_task.MaxRetriesExceededError)
+    # Slots taken by the batch are given back
+    assert slots.acquire('t', 'next')
+
+    with worker_app.app_context():
+        assert tasks.process_task.run_batch([request('boom', {"n": "boom"})]) == ["FAILURE"]
+        # A failed task may run again when redelivered
+        assert worker_app.extensions['idempotency'].begin_task('boom')
+    assert isinstance(tasks.process_task.AsyncResult('boom').result, ConnectionError)
+
+class LimitedRequest:
+    def __init__(self, time_limit=None, soft_time_limit=None):
+        self.time_limits = (time_limit, soft_time_limit)
+
+@pytest.mark.parametrize("task_limits, requests, expected", [
+    ((None, None), [LimitedRequest()] * 3, (None, None)),
+    ((10, 20), [LimitedRequest()] * 3, (30, 60)),
+    ((10, 20), [LimitedRequest(), LimitedRequest(5, 2)], (12, 25)),
+    ((None, 20), [LimitedRequest(), LimitedRequest(5, 2)], (None, 25)),
+    ((None, None), [LimitedRequest(5, 2), LimitedRequest()], (None, None)),
+])
+def test_batch_time_limits_scale_with_the_batch(task_limits, requests, expected, monkeypatch):
+    soft_time_limit, time_limit = task_limits
+    monkeypatch.setattr(tasks.process_task, 'soft_time_limit', soft_time_limit)
+    monkeypatch.setattr(tasks.process_task, 'time_limit', time_limit)
+    assert batch_time_limits(tasks.process_task, requests) == expected
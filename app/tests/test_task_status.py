@@ -0,0 +1,91 @@
+import time
+import uuid
+import pytest
+from app.celery_app import celery
+from app.config import TestingConfig
+from app.key_store import new_task_id, tenant_id
+from app.main import create_app
+
+@pytest.fixture
+def status_client(tmp_path):
+    (tmp_path / 'test_key').mkdir()
+    config = type('StatusTestingConfig', (TestingConfig,), {'API_KEYS_DIR': str(tmp_path), 'STATUS_MAX_WAIT': 1})
+    return create_app(config).test_client()
+
+HEADERS = {"x-api-key": "test_key"}
+
+def own_task_id():
+    return new_task_id(tenant_id("test_key"))
+
+def submit(client):
+    rv = client.post("/process/process_request", json={"username": "a", "age": 1}, headers=HEADERS)
+    assert rv.status_code == 202
+    return rv.get_json()["task_id"]
+
+def test_status_of_finished_task(status_client):
+    task_id = submit(status_client)
+    rv = status_client.get(f"/process/status/{task_id}", headers=HEADERS)
+    assert rv.status_code == 200
+    status = rv.get_json()
+    assert status["task_id"] == task_id
+    assert status["status"] == "SUCCESS"
+    assert status["result"] is None
+
+def test_status_of_unknown_task_is_pending(status_client):
+    rv = status_client.get(f"/process/status/{own_task_id()}", headers=HEADERS)
+    assert rv.get_json()["status"] == "PENDING"
+
+def test_status_of_another_keys_task_is_not_found(status_client):
+    task_id = new_task_id(tenant_id("other_key"))
+    celery.backend.mark_as_done(task_id, {"secret": True})
+    for task_id in (task_id, str(uuid.uuid4())):
+        rv = status_client.get(f"/process/status/{task_id}", headers=HEADERS)
+        assert rv.status_code == 404
+        assert "result" not in rv.get_json()
+    rv = status_client.get(f"/process/status?ids={submit(status_client)},{task_id}", headers=HEADERS)
+    assert rv.status_code == 404
+    assert rv.get_json()["task_ids"] == [task_id]
+
+def test_status_of_failed_task(status_client):
+    task_id = own_task_id()
+    celery.backend.mark_as_failure(task_id, ValueError("boom"))
+    status = status_client.get(f"/process/status/{task_id}", headers=HEADERS).get_json()
+    assert status["status"] == "FAILURE"
+    assert status["error"] == "ValueError: boom"
+
+def test_bulk_status_uses_one_mget(status_client, monkeypatch):
+    finished = [submit(status_client) for _ in range(3)]
+    unknown = own_task_id()
+    calls = []
+    mget = celery.backend.mget
+    monkeypatch.setattr(celery.backend, 'mget', lambda keys: calls.append(keys) or mget(keys))
+
+    rv = status_client.get(f"/process/status?ids={','.join(finished)}&ids={unknown}", headers=HEADERS)
+    assert rv.status_code == 200
+    statuses = rv.get_json()["tasks"]
+    assert [s["task_id"] for s in statuses] == finished + [unknown]
+    assert [s["status"] for s in statuses] == ["SUCCESS"] * 3 + ["PENDING"]
+    assert len(calls) == 1
+
+def test_finished_statuses_are_served_from_cache(status_client, monkeypatch):
+    task_id = submit(status_client)
+    status_client.get(f"/process/status/{task_id}", headers=HEADERS)
+    monkeypatch.setattr(celery.backend, 'mget', lambda keys: pytest.fail("backend was queried"))
+    assert status_client.get(f"/process/status/{task_id}", headers=HEADERS).get_json()["status"] == "SUCCESS"
+
+def test_long_poll_times_out_at_max_wait(status_client):
+    start = time.monotonic()
+    rv = status_client.get(f"/process/status/{own_task_id()}?wait=30", headers=HEADERS)
+    assert rv.get_json()["status"] == "PENDING"
+    assert time.monotonic() - start < 5
+
+@pytest.mark.parametrize("wait", ["nan", "inf", "-inf", "-1"])
+def test_status_rejects_unbounded_wait(status_client, wait):
+    rv = status_client.get(f"/process/status/{own_task_id()}?wait={wait}", headers=HEADERS)
+    assert rv.status_code == 400
+
+@pytest.mark.parametrize("query", [
+    "", "?ids=", "?ids=a&wait=-1", "?ids=a&wait=soon", "?ids=a&wait=nan", "?ids=a&wait=inf",
+])
+def test_bulk_status_rejects_bad_queries(status_client, query):
+    assert status_client.get(f"/process/status{query}", headers=HEADERS).status_code == 400
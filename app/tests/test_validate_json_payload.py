@@ -0,0 +1,46 @@
+import importlib.util
+import json
+import os
+import sys
+import pytest
+
+SCRIPT = os.path.join(os.path.dirname(__file__), '..', '..', 'scripts', 'validate_json_payload.py')
+if not os.path.exists(SCRIPT):
+    # The web container only mounts app/
+    pytest.skip("scripts/ is not available", allow_module_level=True)
+spec = importlib.util.spec_from_file_location('validate_json_payload', SCRIPT)
+validate_json_payload = importlib.util.module_from_spec(spec)
+# Registered so the process pool can pickle its functions by name
+sys.modules['validate_json_payload'] = validate_json_payload
+spec.loader.exec_module(validate_json_payload)
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "username": {"type": "string"},
+        "items": {"type": "array", "items": {"type": "object", "properties": {"id": {"type": "integer"}}}},
+    },
+    "required": ["username"],
+}
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_bulk_reports_every_error_per_path(tmp_path, jobs):
+    records = [
+        {"username": "a"},
+        {"items": [{"id": 1}, {"id": "x"}, {"id": "y"}]},
+        {"username": 5, "items": [{"id": "z"}]},
+    ]
+    (tmp_path / 'day1.ndjson').write_text('\n'.join(json.dumps(r) for r in records) + '\n\n{oops\n')
+    (tmp_path / 'one.json').write_text(json.dumps({"username": "b"}))
+    failures = []
+    report = validate_json_payload.run_bulk(SCHEMA, [str(tmp_path)], jobs=jobs, chunk_size=2,
+                                            on_failure=failures.append)
+
+    assert (report["records"], report["valid"], report["invalid"], report["parse_errors"]) == (5, 2, 2, 1)
+    counts = {(row["path"], row["keyword"]): row["count"] for row in report["errors"]}
+    assert counts == {("$.items[*].id", "type"): 3, ("$", "required"): 1, ("$.username", "type"): 1, ("$", "json"): 1}
+    assert [(f["line"], len(f["errors"])) for f in failures] == [(2, 3), (3, 2), (5, 1)]
+    assert failures[0]["errors"][0]["path"] == "$.items[1].id"
+    assert validate_json_payload.format_report(report, 'csv').splitlines()[:2] == [
+        "path,keyword,count", "$.items[*].id,type,3",
+    ]
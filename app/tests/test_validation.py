@@ -0,0 +1,87 @@
+import pytest
+from jsonschema import Draft7Validator
+from jsonschema.exceptions import best_match
+from app.config import TestingConfig
+from app.main import create_app
+from app.schema_registry import CompiledSchema
+from app.validation import LENIENT, STRICT, normalize
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "name": {"type": "string"},
+        "tags": {"type": "array", "default": []},
+        "owner": {
+            "type": "object",
+            "properties": {"id": {"type": "number"}, "role": {"type": "string", "default": "member"}},
+            "required": ["id"],
+        },
+        "meta": {"type": "object", "additionalProperties": True},
+    },
+    "required": ["name"],
+}
+
+@pytest.fixture
+def compiled():
+    return CompiledSchema('widget', 'request', SCHEMA)
+
+def test_lenient_strips_unknown_properties_at_every_level(compiled):
+    data = {"name": "a", "extra": 1, "owner": {"id": 1, "nested_extra": 2}, "meta": {"free": "form"}}
+    errors, payload, reason = normalize(compiled, data, LENIENT)
+    assert errors == [] and reason is None
+    assert payload == {"name": "a", "tags": [], "owner": {"id": 1, "role": "member"}, "meta": {"free": "form"}}
+
+def test_strict_rejects_unknown_properties(compiled):
+    errors, payload, reason = normalize(compiled, {"name": "a", "owner": {"id": 1, "x": 2}}, STRICT)
+    assert errors == ["Additional properties are not allowed ('x' was unexpected)"]
+    assert payload == {} and reason == 'additionalProperties'
+
+def test_defaults_are_not_shared_between_payloads(compiled):
+    _, first, _ = normalize(compiled, {"name": "a"})
+    first["tags"].append("mutated")
+    _, second, _ = normalize(compiled, {"name": "b"})
+    assert second["tags"] == []
+
+@pytest.mark.parametrize("data", [{}, {"name": 1}, {"name": "a", "owner": {}}, {"name": "a", "owner": {"id": "x"}}, []])
+def test_errors_match_plain_jsonschema(compiled, data):
+    expected = best_match(Draft7Validator(SCHEMA).iter_errors(data))
+    errors, _, reason = normalize(compiled, data, STRICT)
+    assert errors == [expected.message]
+    assert reason == expected.validator
+
+def test_branching_schema_falls_back_to_top_level_filter():
+    schema = {
+        "type": "object",
+        "properties": {"value": {"anyOf": [{"type": "string"}, {"type": "number"}]}, "unit": {"default": "m"}},
+    }
+    compiled = CompiledSchema('measure', 'request', schema)
+    assert compiled.normalizers is None
+    assert normalize(compiled, {"value": 3, "extra": True})[:2] == ([], {"value": 3, "unit": "m"})
+    assert normalize(compiled, {"value": 3, "extra": True}, STRICT)[2] == 'additionalProperties'
+
+def test_unknown_mode_is_rejected(compiled):
+    with pytest.raises(ValueError):
+        normalize(compiled, {"name": "a"}, 'loose')
+
+@pytest.fixture
+def strict_client(tmp_path):
+    (tmp_path / 'test_key').mkdir()
+    config = type('StrictTestingConfig', (TestingConfig,), {
+        'API_KEYS_DIR': str(tmp_path),
+        'VALIDATION_MODES': {'process_request': STRICT},
+    })
+    return create_app(config).test_client()
+
+def test_route_mode_is_configurable(strict_client):
+    rv = strict_client.post("/process/process_request", json={"username": "a", "age": 1, "extra": 1},
+                            headers={"x-api-key": "test_key"})
+    assert rv.status_code == 400
+    assert rv.get_json() == {"error": ["Additional properties are not allowed ('extra' was unexpected)"]}
+    # The batch route keeps the lenient default
+    rv = strict_client.post("/process/process_request/batch", json=[{"username": "a", "age": 1, "extra": 1}],
+                            headers={"x-api-key": "test_key"})
+    assert rv.status_code == 202
+
+def test_invalid_key_is_checked_before_the_body(strict_client):
+    rv = strict_client.post("/process/process_request", json={"some": "data"}, headers={"x-api-key": "bad"})
+    assert rv.status_code == 403
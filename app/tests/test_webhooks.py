@@ -0,0 +1,148 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from prometheus_client import REGISTRY
+from app.config import TestingConfig
+from app.main import create_app
+from app import tasks
+from app.webhooks import WebhookDeliverer, backoff_delay, task_headers
+
+class StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with server.lock:
+            server.received.append((self.path, body))
+            server.headers.append(self.headers)
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            server.hits[self.path] = server.hits.get(self.path, 0) + 1
+            hits = server.hits[self.path]
+        if self.path == '/slow':
+            time.sleep(0.05)
+        if self.path == '/flaky' and hits <= 2:
+            status = 503
+        elif self.path == '/down':
+            status = 500
+        elif self.path == '/rejected':
+            status = 400
+        else:
+            status = 200
+        with server.lock:
+            server.in_flight -= 1
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.lock = threading.Lock()
+    server.received = []
+    server.headers = []
+    server.hits = {}
+    server.in_flight = 0
+    server.max_in_flight = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+class FakeRedis:
+    def __init__(self):
+        self.lists = {}
+
+    def lpush(self, key, value):
+        self.lists.setdefault(key, []).insert(0, value)
+
+def make_deliverer(**kwargs):
+    return WebhookDeliverer(timeout=2, **kwargs)
+
+def deliver_until_done(deliverer, url, payload):
+    attempt = 0
+    while True:
+        result = deliverer.deliver(url, payload, attempt=attempt)
+        if result.retry_in is None:
+            return result
+        attempt += 1
+
+def test_backoff_delay_is_capped():
+    assert all(0 <= backoff_delay(attempt, 0.5, 4) <= 4 for attempt in range(20))
+
+def test_deliver_posts_json(stub_server):
+    result = make_deliverer().deliver(f"{stub_server.url}/ok", {"username": "é"}, task_headers('t-1'))
+    assert result.delivered and result.attempts == 1 and result.status_code == 200
+    assert stub_server.received == [('/ok', {"username": "é"})]
+    headers = stub_server.headers[0]
+    assert headers['X-Task-Id'] == headers['Idempotency-Key'] == 't-1'
+    assert headers['Content-Type'] == 'application/json'
+
+def test_deliver_leaves_retries_to_the_caller(stub_server):
+    deliverer = make_deliverer(max_retries=3, backoff_max=4)
+    first = deliverer.deliver(f"{stub_server.url}/flaky", {})
+    assert not first.delivered and 0 <= first.retry_in <= 4
+    assert first.as_dict()["retry_in"] == first.retry_in
+    result = deliver_until_done(deliverer, f"{stub_server.url}/flaky", {})
+    assert result.delivered and result.attempts == 2
+    stats = deliverer.stats.snapshot()[stub_server.url.split('//')[1]]
+    assert (stats["delivered"], stats["failed"], stats["retries"]) == (1, 0, 1)
+
+def test_permanent_failure_goes_to_dead_letter_queue(stub_server):
+    dlq = FakeRedis()
+    deliverer = make_deliverer(max_retries=2, dlq=dlq, dlq_key='dlq')
+    result = deliver_until_done(deliverer, f"{stub_server.url}/down", {"id": 1})
+    assert not result.delivered and result.attempts == 3
+    assert len(dlq.lists['dlq']) == 1
+    entry = json.loads(dlq.lists['dlq'][0])
+    assert entry["payload"] == {"id": 1} and entry["error"] == "HTTP 500"
+
+def test_client_errors_are_not_retried(stub_server):
+    dlq = FakeRedis()
+    result = make_deliverer(max_retries=5, dlq=dlq).deliver(f"{stub_server.url}/rejected", {})
+    assert result.attempts == 1
+    assert len(dlq.lists['webhooks:dead_letter']) == 1
+
+def test_connection_errors_are_retried():
+    result = deliver_until_done(make_deliverer(max_retries=1), "http://127.0.0.1:1/nothing", {})
+    assert not result.delivered and result.attempts == 2
+    assert result.error.startswith("ConnectionError")
+
+def test_deliver_many_respects_per_host_cap(stub_server):
+    deliverer = make_deliverer(max_per_host=3)
+    results = deliverer.deliver_many([(f"{stub_server.url}/slow", {"n": n}) for n in range(12)], max_workers=12)
+    assert all(result.delivered for result in results)
+    assert stub_server.max_in_flight <= 3
+
+def test_stats_record_latency_per_host(stub_server):
+    deliverer = make_deliverer()
+    deliverer.deliver(f"{stub_server.url}/ok", {})
+    host = stub_server.url.split('//')[1]
+    stats = deliverer.stats.snapshot()[host]
+    assert stats["delivered"] == 1 and stats["latency_max"] > 0
+    assert REGISTRY.get_sample_value('webhook_attempts_total', {'host': host, 'outcome': 'delivered'}) == 1
+    assert REGISTRY.get_sample_value('webhook_attempt_duration_seconds_count', {'host': host}) == 1
+
+def test_process_task_delivers_to_configured_webhook(stub_server):
+    config = type('WebhookTestingConfig', (TestingConfig,), {'WEBHOOK_URL': f"{stub_server.url}/ok"})
+    create_app(config)
+    result = tasks.process_task.apply(args=[{"username": "a", "age": 1}]).get()
+    assert result["delivered"]
+    assert stub_server.received == [('/ok', {"username": "a", "age": 1})]
+
+def test_process_task_schedules_webhook_retries(stub_server):
+    config = type('WebhookTestingConfig', (TestingConfig,), {
+        'WEBHOOK_URL': f"{stub_server.url}/flaky", 'WEBHOOK_BACKOFF_BASE': 0.001,
+    })
+    create_app(config)
+    # Eager, so the retry runs inline instead of after its countdown
+    result = tasks.process_task.apply(args=[{"n": 1}], task_id='tenant-1').get()
+    assert not result["delivered"] and result["retry_in"] is not None
+    assert stub_server.hits['/flaky'] == 3
+    assert {headers['Idempotency-Key'] for headers in stub_server.headers} == {'tenant-1'}
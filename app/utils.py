@@ -2,80 +2,55 @@ import json
 import os
 import logging
 from jsonschema import validate, ValidationError, SchemaError
-import ast
+from jsonschema.exceptions import best_match
+from app.schema_compiler import compiler
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 def load_schema(endpoint, config_type):
     base_dir = os.path.dirname(os.path.abspath(__file__))
     endpoint = endpoint.lstrip('/')
     file_path = os.path.join(base_dir, 'json_schemas', f'{endpoint}_{config_type}.json')
-    logger.debug(f"Loading schema from: {file_path}")
+    logger.debug("Loading schema from: %s", file_path)
     with open(file_path, 'r') as file:
         schema = json.load(file)
-    logger.debug(f"Loaded schema: {schema}")
     return schema
 
-def validate_data(schema, data):
+def _validate(schema, data, validator=None):
+    # Valid data only needs the generated check; jsonschema still produces the errors
+    check = compiler.for_schema(schema)
+    if check is not None and check(data):
+        return
+    # A precompiled validator skips the per-call check_schema and validator construction
+    if validator is None:
+        validate(instance=data, schema=schema)
+        return
+    error = best_match(validator.iter_errors(data))
+    if error is not None:
+        raise error
+
+def validate_data(schema, data, validator=None):
     errors = []
     try:
-        validate(instance=data, schema=schema)
+        _validate(schema, data, validator)
     except ValidationError as e:
         errors.append(e.message)
-        logger.debug(f"'{e.message}' is a required property")
+        logger.debug("Validation error: %s", e.message)
     except SchemaError as e:
         errors.append(f"Schema error: {e.message}")
-        logger.debug(f"Schema error: {e.message}")
+        logger.debug("Schema error: %s", e.message)
     
     return errors, data if not errors else {}
 
-def create_valid_payload(schema):
-    payload = {}
-    for field, details in schema.get("properties", {}).items():
-        if "default" in details:
-            payload[field] = details["default"]
-        elif details["type"] == "string":
-            payload[field] = "test_string"
-        elif details["type"] == "number":
-            payload[field] = 24
-        elif details["type"] == "boolean":
-            payload[field] = True
-        elif details["type"] == "uri":
-            payload[field] = "http://example.com"
-    logger.debug(f"Created valid payload: {payload}")
-    return payload
-
-def validate_response(schema, response_data):
+def validate_response(schema, response_data, validator=None):
     errors = []
     try:
-        validate(instance=response_data, schema=schema)
+        _validate(schema, response_data, validator)
     except ValidationError as e:
         errors.append(e.message)
-        logger.debug(f"Validation error: {e.message}")
+        logger.debug("Validation error: %s", e.message)
     except SchemaError as e:
         errors.append(f"Schema error: {e.message}")
-        logger.debug(f"Schema error: {e.message}")
+        logger.debug("Schema error: %s", e.message)
     
     return errors
-
-def schema_exists(endpoint, config_type):
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    file_path = os.path.join(base_dir, '..', 'json_schemas', f'{endpoint}_{config_type}.json')
-    logger.debug(f"Checking if schema exists at {file_path}: {os.path.isfile(file_path)}")
-    return os.path.isfile(file_path)
-
-def get_endpoints_from_main(main_file_path='app/main.py'):
-    with open(main_file_path, 'r') as file:
-        tree = ast.parse(file.read(), filename=main_file_path)
-
-    endpoints = []
-    for node in ast.walk(tree):
-        if isinstance(node, ast.FunctionDef):
-            for decorator in node.decorator_list:
-                if isinstance(decorator, ast.Call) and isinstance(decorator.func, ast.Attribute) and decorator.func.attr == 'route':
-                    route_path = decorator.args[0].s
-                    endpoints.append(route_path)
-    logger.debug(f"Found endpoints: {endpoints}")
-    return endpoints
@@ -0,0 +1,154 @@
+# validation.py
+
+import copy
+import logging
+from jsonschema import Draft7Validator, ValidationError
+from jsonschema.exceptions import best_match
+from jsonschema.validators import extend
+from app.streaming import DEFAULT_CHUNK_SIZE, read_object
+
+logger = logging.getLogger(__name__)
+
+LENIENT = 'lenient'
+STRICT = 'strict'
+MODES = (LENIENT, STRICT)
+
+# Keywords that validate one instance against several subschemas; stripping or
+# defaulting while one branch is tried would corrupt the instance for the others
+_BRANCHING_KEYWORDS = frozenset({'anyOf', 'oneOf', 'allOf', 'not', 'if', 'then', 'else', 'dependencies', '$ref'})
+
+
+def _uses_branching(schema):
+    if isinstance(schema, dict):
+        return any(key in _BRANCHING_KEYWORDS for key in schema) or any(
+            _uses_branching(value) for value in schema.values()
+        )
+    if isinstance(schema, list):
+        return any(_uses_branching(value) for value in schema)
+    return False
+
+
+def _unexpected_message(unknown):
+    verb = 'was' if len(unknown) == 1 else 'were'
+    return f"Additional properties are not allowed ({', '.join(repr(key) for key in unknown)} {verb} unexpected)"
+
+
+def _normalizing_properties(strict):
+    def properties(validator, properties, instance, schema):
+        if not validator.is_type(instance, 'object'):
+            return
+
+        # Schemas that say how to treat extra keys keep that behaviour
+        if 'additionalProperties' not in schema and 'patternProperties' not in schema:
+            unknown = [key for key in instance if key not in properties]
+            if unknown:
+                if strict:
+                    yield ValidationError(_unexpected_message(unknown), validator='additionalProperties')
+                else:
+                    for key in unknown:
+                        del instance[key]
+
+        required = schema.get('required', ())
+        for name, subschema in properties.items():
+            if name in instance:
+                yield from validator.descend(instance[name], subschema, path=name, schema_path=name)
+            elif 'default' in subschema and name not in required:
+                default = subschema['default']
+                instance[name] = copy.deepcopy(default) if isinstance(default, (dict, list)) else default
+
+    return properties
+
+
+LenientValidator = extend(Draft7Validator, {'properties': _normalizing_properties(strict=False)})
+StrictValidator = extend(Draft7Validator, {'properties': _normalizing_properties(strict=True)})
+
+
+def build_normalizers(schema):
+    """Return ``{mode: validator}`` that validate and normalize in one pass, or None.
+
+    None means the schema branches (anyOf, $ref, ...) and ``normalize`` falls back
+    to plain validation followed by a top-level filter.
+    """
+    if _uses_branching(schema):
+        return None
+    return {LENIENT: LenientValidator(schema), STRICT: StrictValidator(schema)}
+
+
+def _fallback(compiled, data, mode):
+    errors = list(compiled.validator.iter_errors(data))
+    if errors or not isinstance(data, dict):
+        return errors, data
+    unknown = [key for key in data if key not in compiled.allowed_properties]
+    if unknown and mode == STRICT:
+        return [ValidationError(_unexpected_message(unknown), validator='additionalProperties')], data
+    required = compiled.schema.get('required', ())
+    normalized = {k: v for k, v in data.items() if k in compiled.allowed_properties}
+    for name, default in compiled.defaults.items():
+        if name not in normalized and name not in required:
+            normalized[name] = copy.deepcopy(default)
+    return [], normalized
+
+
+def normalize(compiled, data, mode=LENIENT):
+    """Validate ``data`` against ``compiled`` once and return ``(errors, payload, reason)``.
+
+    In lenient mode unknown properties are removed; in strict mode they are an
+    error. Missing optional properties get their schema defaults. ``payload`` is
+    the normalized data (the input object, modified in place) or ``{}`` if
+    invalid; ``reason`` is the failing schema keyword for metrics, else None.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown validation mode: {mode}")
+
+    fast = compiled.fast_normalizers.get(mode)
+    if fast is not None and fast(data):
+        return [], data, None
+
+    if compiled.normalizers is None:
+        errors, data = _fallback(compiled, data, mode)
+    else:
+        errors = list(compiled.normalizers[mode].iter_errors(data))
+
+    if not errors:
+        return [], data, None
+    error = best_match(errors)
+    logger.debug("Validation error: %s", error.message)
+    return [error.message], {}, error.validator
+
+
+class _ItemRejected(Exception):
+    def __init__(self, message, reason):
+        super().__init__(message)
+        self.reason = reason
+
+
+def normalize_stream(compiled, stream, mode=LENIENT, max_depth=32, chunk_size=DEFAULT_CHUNK_SIZE, max_item_size=None):
+    """``normalize`` for a JSON object read incrementally from ``stream``.
+
+    Items of the arrays in ``compiled.streamed`` are normalized as soon as each is
+    decoded and kept in place of the raw item, so the body is never held as both
+    text and objects; the first invalid item stops reading. The rest of the object
+    is then checked against ``compiled.outer``. Malformed, too deeply nested or
+    oversized (``max_item_size``) input raises StreamParseError.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown validation mode: {mode}")
+
+    def validate_items(name):
+        item_schema = compiled.streamed[name]
+
+        def validate(index, item):
+            errors, payload, reason = normalize(item_schema, item, mode)
+            if errors:
+                raise _ItemRejected(f"{name}[{index}]: {errors[0]}", reason)
+            return payload
+
+        return validate
+
+    try:
+        data = read_object(
+            stream, {name: validate_items(name) for name in compiled.streamed}, max_depth, chunk_size, max_item_size,
+        )
+    except _ItemRejected as e:
+        return [str(e)], {}, e.reason
+    return normalize(compiled.outer, data, mode)
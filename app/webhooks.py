@@ -0,0 +1,210 @@
+# webhooks.py
+
+import os
+import random
+import threading
+import time
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from app import json_codec
+from app.idempotency import IDEMPOTENCY_HEADER
+from app.metrics import record_webhook_delivery
+from app.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = frozenset({408, 425, 429, 500, 502, 503, 504})
+TASK_ID_HEADER = 'X-Task-Id'
+
+
+def task_headers(task_id):
+    """Headers naming the task a webhook reports on.
+
+    Every attempt for a task carries the same Idempotency-Key, so a receiver can
+    drop a payload it has already processed.
+    """
+    return {TASK_ID_HEADER: task_id, IDEMPOTENCY_HEADER: task_id}
+
+
+def backoff_delay(attempt, base, cap):
+    """Exponential backoff with full jitter for retry number ``attempt`` (0-based)."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class DeliveryResult:
+    def __init__(self, url, delivered, attempts, status_code=None, error=None, latency=0.0, retry_in=None):
+        self.url = url
+        self.delivered = delivered
+        self.attempts = attempts
+        self.status_code = status_code
+        self.error = error
+        self.latency = latency
+        # Seconds until the next attempt, when the delivery failed but will be retried
+        self.retry_in = retry_in
+
+    def as_dict(self):
+        return {
+            "url": self.url,
+            "delivered": self.delivered,
+            "attempts": self.attempts,
+            "status_code": self.status_code,
+            "error": self.error,
+            "latency": self.latency,
+            "retry_in": self.retry_in,
+        }
+
+
+class DeliveryStats:
+    """Delivery counters and latency totals, per destination host.
+
+    Each attempt is also recorded in the Prometheus webhook metrics.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.delivered = defaultdict(int)
+        self.failed = defaultdict(int)
+        self.retries = defaultdict(int)
+        self.attempts = defaultdict(int)
+        self.latency_sum = defaultdict(float)
+        self.latency_max = defaultdict(float)
+
+    def record(self, host, result):
+        """Count one attempt; only a delivery or a final failure ends a webhook."""
+        with self._lock:
+            if result.delivered:
+                self.delivered[host] += 1
+            elif result.retry_in is None:
+                self.failed[host] += 1
+            if result.attempts > 1:
+                self.retries[host] += 1
+            self.attempts[host] += 1
+            self.latency_sum[host] += result.latency
+            self.latency_max[host] = max(self.latency_max[host], result.latency)
+        record_webhook_delivery(host, result)
+
+    def snapshot(self):
+        with self._lock:
+            hosts = set(self.attempts)
+            return {
+                host: {
+                    "delivered": self.delivered[host],
+                    "failed": self.failed[host],
+                    "retries": self.retries[host],
+                    "latency_avg": self.latency_sum[host] / max(self.attempts[host], 1),
+                    "latency_max": self.latency_max[host],
+                }
+                for host in hosts
+            }
+
+
+class WebhookDeliverer:
+    """Delivers JSON payloads over a pooled keep-alive session.
+
+    At most ``max_per_host`` requests are in flight to any one destination host.
+    Each call makes a single attempt and never waits: a retryable failure comes
+    back with ``retry_in`` set to a jittered exponential backoff, for the caller
+    to schedule (see tasks.deliver_webhook). After ``max_retries`` retries the
+    payload is pushed onto the dead-letter list ``dlq_key`` of ``dlq`` (a Redis
+    client), if given.
+    """
+
+    def __init__(self, timeout=10.0, max_retries=5, backoff_base=0.5, backoff_max=30.0,
+                 max_per_host=10, pool_maxsize=20, dlq=None, dlq_key='webhooks:dead_letter'):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_per_host = max_per_host
+        self.dlq = dlq
+        self.dlq_key = dlq_key
+        self.stats = DeliveryStats()
+        self._host_limits = defaultdict(lambda: threading.BoundedSemaphore(max_per_host))
+        self._host_limits_lock = threading.Lock()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _host_limit(self, host):
+        with self._host_limits_lock:
+            return self._host_limits[host]
+
+    def _attempt(self, url, body, headers):
+        try:
+            response = self.session.post(url, data=body, headers=headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            return None, f"{type(e).__name__}: {e}", True
+        if response.ok:
+            return response.status_code, None, False
+        return response.status_code, f"HTTP {response.status_code}", response.status_code in RETRY_STATUS_CODES
+
+    def deliver(self, url, payload, headers=None, attempt=0):
+        """Make attempt number ``attempt`` (0 for the first) at delivering ``payload``."""
+        host = urlsplit(url).netloc
+        body = json_codec.dumps(payload)
+        request_headers = {'Content-Type': 'application/json'}
+        request_headers.update(headers or {})
+
+        start = time.perf_counter()
+        with self._host_limit(host):
+            status_code, error, retryable = self._attempt(url, body, request_headers)
+        result = DeliveryResult(url, error is None, attempt + 1, status_code, error, time.perf_counter() - start)
+        if error is not None and retryable and attempt < self.max_retries:
+            result.retry_in = backoff_delay(attempt, self.backoff_base, self.backoff_max)
+            logger.debug("Webhook to %s failed (%s), retrying in %.2fs", host, error, result.retry_in)
+        self.stats.record(host, result)
+        if not result.delivered and result.retry_in is None:
+            logger.warning("Webhook to %s failed after %d attempts: %s", host, result.attempts, error)
+            self._dead_letter(url, payload, result)
+        return result
+
+    def deliver_many(self, deliveries, max_workers=None):
+        """Deliver ``(url, payload[, headers])`` tuples concurrently; results keep the input order."""
+        deliveries = list(deliveries)
+        if not deliveries:
+            return []
+        workers = max_workers or min(len(deliveries), self.max_per_host * 4)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(lambda delivery: self.deliver(*delivery), deliveries))
+
+    def _dead_letter(self, url, payload, result):
+        if self.dlq is None:
+            return
+        entry = {"url": url, "payload": payload, "failed_at": time.time()}
+        entry.update(result.as_dict())
+        try:
+            self.dlq.lpush(self.dlq_key, json_codec.dumps(entry))
+        except Exception:
+            logger.exception("Could not push failed webhook to the dead-letter queue")
+
+    def close(self):
+        self.session.close()
+
+
+_deliverers = {}
+
+
+def get_deliverer(config):
+    """Return this worker process's deliverer, built from a Flask-style config mapping."""
+    pid = os.getpid()
+    deliverer = _deliverers.get(pid)
+    if deliverer is None:
+        dlq = None
+        if config.get('WEBHOOK_DLQ_URL'):
+            dlq = get_redis(config['WEBHOOK_DLQ_URL'])
+        deliverer = _deliverers[pid] = WebhookDeliverer(
+            timeout=config['WEBHOOK_TIMEOUT'],
+            max_retries=config['WEBHOOK_MAX_RETRIES'],
+            backoff_base=config['WEBHOOK_BACKOFF_BASE'],
+            backoff_max=config['WEBHOOK_BACKOFF_MAX'],
+            max_per_host=config['WEBHOOK_MAX_PER_HOST'],
+            pool_maxsize=config['WEBHOOK_POOL_MAXSIZE'],
+            dlq=dlq,
+            dlq_key=config['WEBHOOK_DLQ_KEY'],
+        )
+    return deliverer
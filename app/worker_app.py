@@ -0,0 +1,31 @@
+# worker_app.py
+
+from flask import Flask
+from app.celery_app import init_celery
+from app.idempotency import init_idempotency
+from app.logging_config import configure_payload_logging
+from app.queues import init_queues
+from app.redis_client import init_redis
+from app.result_store import init_result_store
+from app.schema_registry import registry
+
+
+def create_worker_app(config_class):
+    """The Flask app a Celery worker runs tasks in: the config and the extensions tasks read.
+
+    Unlike create_app it has no routes or API docs, and leaves logging to Celery,
+    which has already set up its handlers by the time this runs. Schemas are
+    loaded at startup so tasks published under the current versions can be
+    checked against them after a reload.
+    """
+    app = Flask(__name__)
+    app.config.from_object(config_class)
+    configure_payload_logging(app.config)
+    init_redis(app)
+    init_celery(app)
+    init_idempotency(app)
+    init_queues(app)
+    init_result_store(app)
+    registry.configure(app.config['SCHEMA_RELOAD_INTERVAL'], app.config['SCHEMA_KEEP_VERSIONS'])
+    registry.load()
+    return app
@@ -0,0 +1,6 @@
+import os
+from app.main import create_app
+
+# WSGI entry point for gunicorn; with preload_app the app (schemas, restx
+# models, key index) is built once in the master before workers fork
+app = create_app(os.environ.get('FLASK_CONFIG', 'app.config.ProductionConfig'))
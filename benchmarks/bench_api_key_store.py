@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""Auth checks/sec with 100k keys: per-request os.path.isdir vs. the in-memory ApiKeyStore.
+
+Run from the repository root:
+    python -m benchmarks.bench_api_key_store [num_keys] [iterations]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+from app.key_store import ApiKeyStore
+
+
+def measure(label, fn, keys):
+    start = time.perf_counter()
+    for key in keys:
+        fn(key)
+    elapsed = time.perf_counter() - start
+    rate = len(keys) / elapsed
+    print(f"{label:<40} {rate:>12,.0f} checks/sec")
+    return rate
+
+
+def main(num_keys=100000, iterations=200000):
+    with tempfile.TemporaryDirectory() as key_dir:
+        keys = [f"key_{i:06d}" for i in range(num_keys)]
+        for key in keys:
+            os.mkdir(os.path.join(key_dir, key))
+
+        start = time.perf_counter()
+        store = ApiKeyStore(key_dir)
+        print(f"initial scan of {num_keys:,} keys: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        valid = random.choices(keys, k=iterations)
+        invalid = random.choices([f"bad_{i}" for i in range(1000)], k=iterations)
+
+        for label, sample in (("valid", valid), ("invalid", invalid)):
+            slow = measure(f"os.path.isdir ({label})", lambda key: os.path.isdir(os.path.join(key_dir, key)), sample)
+            fast = measure(f"ApiKeyStore.is_valid ({label})", store.is_valid, sample)
+            print(f"speedup ({label}): {fast / slow:.1f}x")
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:3]]
+    main(*args)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""JSON encode/decode throughput by payload size: stdlib json vs. the codec backends and Celery serializers.
+
+Payloads are built from the request fixtures in app/tests/test_files: the
+smallest size is one fixture, larger sizes wrap N copies of all of them in a
+``{"items": [...]}`` object. The Celery rows time a full kombu dumps + loads of
+a task body, which is what the producer and worker pay per message.
+
+Run from the repository root:
+    python -m benchmarks.bench_json_codec [seconds_per_case]
+"""
+
+import glob
+import importlib.util
+import json
+import os
+import sys
+import time
+from kombu.compression import compress, decompress
+from kombu.serialization import dumps as kombu_dumps, loads as kombu_loads
+from app import json_codec
+from app.json_codec import CELERY_SERIALIZER, get_backend
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, 'app', 'tests', 'test_files', '*_request.json')
+COPIES = (10, 1000)
+
+
+def load_fixtures():
+    fixtures = []
+    for path in sorted(glob.glob(FIXTURES)):
+        with open(path) as file:
+            fixtures.append(json.load(file))
+    return fixtures
+
+
+def payloads(fixtures):
+    yield 'one fixture', max(fixtures, key=lambda f: len(json.dumps(f)))
+    for copies in COPIES:
+        yield f'{copies}x fixtures', {"items": fixtures * copies}
+
+
+def rate(fn, seconds):
+    count = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while time.perf_counter() < deadline:
+        fn()
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+def codec_cases():
+    yield 'json (stdlib)', lambda obj: json.dumps(obj).encode('utf-8'), json.loads
+    names = ['stdlib'] + (['orjson'] if json_codec.orjson is not None else [])
+    for name in names:
+        backend = get_backend(name)
+        yield f'codec {name}', backend.dumps, backend.loads
+
+
+def celery_cases():
+    serializers = ['json', CELERY_SERIALIZER]
+    if importlib.util.find_spec('msgpack') is not None:
+        serializers.append('msgpack')
+    for serializer in serializers:
+        for compression in (None, 'zlib'):
+            label = f'celery {serializer}' + (f'+{compression}' if compression else '')
+            yield label, serializer, compression
+
+
+def celery_round_trip(body, serializer, compression):
+    content_type, encoding, payload = kombu_dumps(body, serializer=serializer)
+    if compression:
+        if isinstance(payload, str):
+            payload = payload.encode(encoding)
+        payload, compression_type = compress(payload, compression)
+        payload = decompress(payload, compression_type)
+    return kombu_loads(payload, content_type, encoding, accept={content_type})
+
+
+def main(seconds=0.5):
+    fixtures = load_fixtures()
+    print(f"{'payload':<16} {'bytes':>9} {'case':<22} {'encode/s':>11} {'decode/s':>11} {'round trip/s':>13}")
+    for label, payload in payloads(fixtures):
+        size = len(json.dumps(payload))
+        for name, encode, decode in codec_cases():
+            encoded = encode(payload)
+            encode_rate = rate(lambda: encode(payload), seconds)
+            decode_rate = rate(lambda: decode(encoded), seconds)
+            print(f"{label:<16} {size:>9} {name:<22} {encode_rate:>11,.0f} {decode_rate:>11,.0f} {'':>13}")
+        body = ([payload], {}, {"callbacks": None, "errbacks": None, "chain": None, "chord": None})
+        for name, serializer, compression in celery_cases():
+            round_trip = rate(lambda: celery_round_trip(body, serializer, compression), seconds)
+            print(f"{label:<16} {size:>9} {name:<22} {'':>11} {'':>11} {round_trip:>13,.0f}")
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 0.5)
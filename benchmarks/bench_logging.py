@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Per-request logging overhead: import-time DEBUG basicConfig + f-strings vs. the queued, lazy setup.
+
+Replays the log statements one POST /process/process_request used to make
+(two schema loads, validation errors, the full validated payload) against the
+statements it makes now, with output going to /dev/null in both cases.
+
+Run from the repository root:
+    python -m benchmarks.bench_logging [iterations] [payload_items]
+"""
+
+import logging
+import os
+import sys
+import time
+from app.logging_config import configure_logging, log_payload
+from app.schema_registry import registry
+
+logger = logging.getLogger('benchmarks.request')
+
+
+def reset_root():
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+
+def before_request(schema, payload):
+    for _ in range(2):
+        logger.debug("Loading schema from: /app/json_schemas/process_request.json")
+        logger.debug(f"Loaded schema: {schema}")
+    logger.debug(f"Validation errors: {[]}")
+    logger.debug(f"Validated data: {payload}")
+
+
+def after_request(schema, payload):
+    log_payload(logger, "Validated data: %s", payload)
+
+
+def measure(label, fn, iterations, *args):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(*args)
+    per_request = (time.perf_counter() - start) / iterations * 1e6
+    print(f"{label:<44} {per_request:>10.2f} us/request")
+    return per_request
+
+
+def main(iterations=20000, payload_items=50):
+    schema = registry.get('process_request', 'request').schema
+    payload = {"username": "benchuser", "age": 42, "items": [{"id": i, "name": f"item {i}"} for i in range(payload_items)]}
+    devnull = open(os.devnull, 'w')
+
+    reset_root()
+    logging.basicConfig(level=logging.DEBUG, stream=devnull)
+    slow = measure("before: DEBUG basicConfig, f-strings", before_request, iterations, schema, payload)
+
+    reset_root()
+    config = {'LOG_LEVEL': 'INFO', 'LOG_FORMAT': 'text', 'LOG_PAYLOAD_SAMPLE_RATE': 0.01, 'LOG_REDACT_FIELDS': ()}
+    configure_logging(type('App', (), {'config': config}), stream=devnull)
+    fast = measure("after: INFO, QueueHandler, lazy/sampled", after_request, iterations, schema, payload)
+
+    config.update(LOG_LEVEL='DEBUG')
+    configure_logging(type('App', (), {'config': config}), stream=devnull)
+    sampled = measure("after: DEBUG, 1% payload sampling", after_request, iterations, schema, payload)
+
+    print(f"overhead removed at INFO: {slow / fast:.0f}x; at DEBUG with sampling: {slow / sampled:.0f}x")
+    reset_root()
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:3]]
+    main(*args)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Per-request apply_async latency under concurrency, with and without the producer pool.
+
+Each thread stands in for a gunicorn thread publishing one task per request.
+"pooled" reuses broker connections from Celery's producer pool
+(broker_pool_limit); "no pool" sets broker_pool_limit=0, so every publish
+connects and disconnects. Messages go to a throwaway queue that is purged
+afterwards; no worker is needed.
+
+Needs a running Redis broker. Run from the repository root:
+    python -m benchmarks.bench_publish [broker_url] [requests_per_thread]
+"""
+
+import statistics
+import sys
+import threading
+import time
+from celery import Celery
+
+QUEUE = 'bench_publish'
+THREADS = (1, 4, 16)
+PAYLOAD = {"username": "bench", "age": 30}
+
+
+def make_app(broker_url, pool_limit):
+    app = Celery('bench_publish', broker=broker_url, set_as_current=False)
+    app.conf.update(broker_pool_limit=pool_limit, task_ignore_result=True)
+    return app
+
+
+def run(app, threads, requests):
+    latencies = []
+    lock = threading.Lock()
+
+    def publish():
+        mine = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            app.send_task('bench.noop', args=[PAYLOAD], queue=QUEUE)
+            mine.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(mine)
+
+    workers = [threading.Thread(target=publish) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    return latencies, elapsed
+
+
+def main(broker_url='redis://localhost:6379/0', requests=200):
+    print(f"{'case':<10} {'threads':>7} {'publish/s':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for label, pool_limit in (('pooled', 10), ('no pool', 0)):
+        app = make_app(broker_url, pool_limit)
+        try:
+            for threads in THREADS:
+                latencies, elapsed = run(app, threads, requests)
+                p50 = statistics.median(latencies) * 1000
+                p99 = statistics.quantiles(latencies, n=100)[98] * 1000
+                print(f"{label:<10} {threads:>7} {len(latencies) / elapsed:>10,.0f} {p50:>8.2f} {p99:>8.2f}")
+        finally:
+            with app.connection_for_write() as connection:
+                connection.default_channel.queue_purge(QUEUE)
+            app.close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else 'redis://localhost:6379/0',
+         int(sys.argv[2]) if len(sys.argv) > 2 else 200)
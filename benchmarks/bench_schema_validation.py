@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""Validations/sec for the process_request hot path: per-request load + validate vs. the schema registry,
+and the registry's normalize with jsonschema vs. with the compiled validators.
+
+Run from the repository root:
+    python -m benchmarks.bench_schema_validation [iterations]
+"""
+
+import copy
+import sys
+import time
+from app.utils import load_schema, validate_data
+from app.schema_registry import SchemaRegistry
+from app.validation import LENIENT, normalize
+
+PAYLOAD = {"username": "benchuser", "age": 42, "extra": "dropped"}
+
+
+def before(payload):
+    schema = load_schema("process_request", "request")
+    errors, validated_data = validate_data(schema, payload)
+    return {k: v for k, v in validated_data.items() if k in schema["properties"]}
+
+
+def after(compiled, payload):
+    errors, validated_data = validate_data(compiled.schema, payload, validator=compiled.validator)
+    return {k: v for k, v in validated_data.items() if k in compiled.allowed_properties}
+
+
+def measure(label, fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - start
+    rate = iterations / elapsed
+    print(f"{label:<28} {rate:>12,.0f} validations/sec")
+    return rate
+
+
+def main(iterations=20000):
+    compiled = SchemaRegistry().load().get("process_request", "request")
+    slow = measure("load_schema + validate", lambda: before(PAYLOAD), iterations)
+    fast = measure("schema registry", lambda: after(compiled, PAYLOAD), iterations)
+    print(f"speedup: {fast / slow:.1f}x")
+
+    interpreted = copy.copy(compiled)
+    interpreted.fast_normalizers = {}
+    slow = measure("normalize (jsonschema)", lambda: normalize(interpreted, dict(PAYLOAD), LENIENT), iterations)
+    fast = measure("normalize (compiled)", lambda: normalize(compiled, dict(PAYLOAD), LENIENT), iterations)
+    print(f"speedup: {fast / slow:.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
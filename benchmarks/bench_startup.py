@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Cold start time of the web and worker entry points, with a regression budget.
+
+Each run is a fresh interpreter, timed from spawn until the entry point is
+ready:
+
+- web: import app.wsgi (which builds the app) and answer one request through
+  the test client
+- worker: import the celery/tasks.py entry module the worker loads and
+  finalize the Celery app, i.e. everything before it connects to the broker
+
+The slowest imports come from ``python -X importtime``. The script exits 1
+when the median of either entry point is over its budget in seconds.
+
+Run from the repository root:
+    python -m benchmarks.bench_startup [runs] [web_budget] [worker_budget]
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGETS = {'web': 1.0, 'worker': 1.0}
+TOP_IMPORTS = 10
+
+ENTRY_POINTS = {
+    'web': (ROOT, 'import app.wsgi', (
+        "import app.wsgi\n"
+        "app.wsgi.app.test_client().get('/auth/authenticate')\n"
+    )),
+    'worker': (os.path.join(ROOT, 'celery'), 'import tasks', (
+        "import tasks\n"
+        "tasks.celery.loader.import_default_modules()\n"
+        "tasks.celery.finalize(auto=True)\n"
+    )),
+}
+
+
+def environment():
+    env = dict(os.environ, PYTHONPATH=ROOT, PYTHONDONTWRITEBYTECODE='1')
+    env.pop('PROMETHEUS_MULTIPROC_DIR', None)
+    return env
+
+
+def time_to_ready(cwd, script):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', script], cwd=cwd, env=environment(), check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def slowest_imports(cwd, statement):
+    """``(cumulative_us, module)`` for the slowest imports at the top three nesting levels."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement], cwd=cwd, env=environment(),
+                            check=True, capture_output=True, text=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth <= 3:
+            imports.append((int(cumulative), name.strip()))
+    return sorted(imports, reverse=True)[:TOP_IMPORTS]
+
+
+def main(runs=5, budgets=BUDGETS):
+    over_budget = []
+    for name, (cwd, statement, script) in ENTRY_POINTS.items():
+        time_to_ready(cwd, script)  # warm the OS page cache
+        timings = [time_to_ready(cwd, script) for _ in range(runs)]
+        median = statistics.median(timings)
+        verdict = 'ok' if median <= budgets[name] else 'OVER BUDGET'
+        print(f"{name}: median {median:.3f}s  min {min(timings):.3f}s  budget {budgets[name]:.2f}s  {verdict}")
+        for cumulative, module in slowest_imports(cwd, statement):
+            print(f"    {cumulative / 1000:>8.1f} ms  {module}")
+        if median > budgets[name]:
+            over_budget.append(name)
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    budgets = dict(BUDGETS)
+    if len(args) > 1:
+        budgets['web'] = float(args[1])
+    if len(args) > 2:
+        budgets['worker'] = float(args[2])
+    sys.exit(main(int(args[0]) if args else 5, budgets))
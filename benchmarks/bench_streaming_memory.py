@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Peak RSS of validating large request bodies read whole versus streamed.
+
+A body ``{"username": ..., "records": [...]}`` of each size is written to a
+temporary file, then each case runs in a fresh interpreter that reads it the
+way the process_request route would:
+
+- whole: read the body into memory, decode it, then normalize it, as
+  ``request.get_json()`` does for small bodies
+- streaming: ``normalize_stream`` over the file, validating each record as
+  it is decoded, as the route does for bodies over STREAMING_MIN_BYTES
+
+Reported is the peak RSS growth over the interpreter after imports, next to
+the body size. The decoded payload itself is needed either way; what
+streaming saves is the body bytes and text held alongside it.
+
+Run from the repository root:
+    python -m benchmarks.bench_streaming_memory [size_mb ...]
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SIZES_MB = (10, 100, 500)
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "username": {"type": "string"},
+        "records": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "id": {"type": "integer"},
+                    "name": {"type": "string"},
+                    "score": {"type": "number"},
+                },
+                "required": ["id"],
+            },
+        },
+    },
+    "required": ["username"],
+}
+
+CASE = """
+import json, resource, sys
+from app import json_codec
+from app.schema_registry import CompiledSchema
+from app.validation import normalize, normalize_stream
+
+mode, path = sys.argv[1], sys.argv[2]
+compiled = CompiledSchema('bench', 'request', json.loads(sys.argv[3]))
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+with open(path, 'rb') as body:
+    if mode == 'whole':
+        errors, payload, _ = normalize(compiled, json_codec.loads(body.read()))
+    else:
+        errors, payload, _ = normalize_stream(compiled, body, max_depth=32)
+assert not errors, errors
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before)
+"""
+
+
+def write_body(path, size):
+    record = '{"id": %d, "name": "user-%d", "score": 12.5}'
+    with open(path, 'w') as file:
+        file.write('{"username": "bench", "records": [')
+        written = index = 0
+        while written < size:
+            text = (', ' if index else '') + record % (index, index)
+            file.write(text)
+            written += len(text)
+            index += 1
+        file.write(']}')
+    return index
+
+
+def peak_rss_mb(mode, path):
+    result = subprocess.run(
+        [sys.executable, '-c', CASE, mode, path, json.dumps(SCHEMA)],
+        cwd=ROOT, env=dict(os.environ, PYTHONPATH=ROOT), check=True, capture_output=True, text=True,
+    )
+    # ru_maxrss is in KiB on Linux
+    return int(result.stdout) / 1024
+
+
+def main(sizes_mb=SIZES_MB):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'body.json')
+        for size_mb in sizes_mb:
+            records = write_body(path, size_mb * 1024 * 1024)
+            whole = peak_rss_mb('whole', path)
+            streaming = peak_rss_mb('streaming', path)
+            print(f"{size_mb:>4} MB body, {records} records: whole +{whole:,.0f} MB  "
+                  f"streaming +{streaming:,.0f} MB  saved {whole - streaming:,.0f} MB")
+
+
+if __name__ == "__main__":
+    main([int(size) for size in sys.argv[1:]] or SIZES_MB)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Worker throughput for process_task run one message at a time versus in batches.
+
+Each batch size runs in a fresh interpreter. It starts an embedded worker
+(prefork pool) with TASK_BATCH_SIZE set, then times publishing the messages
+until every result is stored. The tasks have no webhook to call, so the time
+is the per-message overhead batching saves: pool round trips, acks and task
+tracing. Publishing and result writes are paid per message either way.
+
+The broker is Celery's in-memory transport unless a Redis URL is given;
+results go to a filesystem backend either way.
+
+Run from the repository root:
+    python -m benchmarks.bench_task_batching [messages] [broker_url]
+"""
+
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BATCH_SIZES = (1, 10, 100)
+CONCURRENCY = 2
+
+CASE = """
+import sys, tempfile, time
+from celery.contrib.testing.worker import start_worker
+from app.config import TestingConfig
+from app.main import create_app
+from app.celery_app import celery, init_celery
+from app import tasks
+
+batch_size, messages, broker_url, concurrency = int(sys.argv[1]), int(sys.argv[2]), sys.argv[3], int(sys.argv[4])
+config = type('BenchConfig', (TestingConfig,), {
+    'CELERY_BROKER_URL': broker_url, 'CELERY_RESULT_BACKEND': 'file://' + tempfile.mkdtemp(),
+    'CELERY_ALWAYS_EAGER': False, 'CELERY_STORE_EAGER_RESULT': False, 'LOG_LEVEL': 'WARNING',
+    'TENANT_MAX_CONCURRENCY': 0,
+})
+init_celery(create_app(config))
+tasks.process_task.batch_size = batch_size
+# Unlimited prefetch: the in-memory transport only polls for more messages every
+# couple of seconds once the prefetch limit is reached
+celery.conf.worker_prefetch_multiplier = 0
+with start_worker(celery, pool='prefork', concurrency=concurrency, perform_ping_check=False, loglevel='WARNING'):
+    started = time.perf_counter()
+    results = [tasks.process_task.delay({"username": "bench", "age": n}) for n in range(messages)]
+    for result in results:
+        result.get(timeout=300, interval=0.005)
+    elapsed = time.perf_counter() - started
+assert all(result.state == 'SUCCESS' for result in results)
+print(elapsed)
+"""
+
+
+def run(batch_size, messages, broker_url):
+    result = subprocess.run(
+        [sys.executable, '-c', CASE, str(batch_size), str(messages), broker_url, str(CONCURRENCY)],
+        cwd=ROOT, env=dict(os.environ, PYTHONPATH=ROOT), check=True, capture_output=True, text=True,
+    )
+    return float(result.stdout.split()[-1])
+
+
+def main(messages=5000, broker_url='memory://'):
+    print(f"{messages} messages, {CONCURRENCY} pool processes, broker {broker_url}")
+    baseline = None
+    for batch_size in BATCH_SIZES:
+        elapsed = run(batch_size, messages, broker_url)
+        rate = messages / elapsed
+        baseline = baseline or rate
+        print(f"batch size {batch_size:>4}: {rate:>10,.0f} tasks/sec  ({rate / baseline:.1f}x)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000, *sys.argv[2:3])
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""Per-task overhead of the Flask app context in the worker, for a task that does nothing.
+
+Each task runs through the tracer a pool process uses, so the time includes
+Celery's own per-task work (signals, request stack, state). The rows differ
+only in how ContextTask handles the app context: a fresh context per task
+(WORKER_APP_CONTEXT = 'task'), the long-lived one of 'process' with a fresh
+flask.g per task, a task with
+``flask_context=False``, and a plain celery Task with no ``__call__`` at all.
+Each row is the best of five runs.
+
+Run from the repository root:
+    python -m benchmarks.bench_task_context [iterations]
+"""
+
+import sys
+import time
+import uuid
+from celery import Task
+from celery.app.trace import build_tracer
+from app import celery_app
+from app.celery_app import celery
+from app.config import TestingConfig
+from app.worker_app import create_worker_app
+
+
+@celery.task(name='bench.noop', ignore_result=True)
+def noop():
+    return None
+
+@celery.task(name='bench.noop_no_flask', ignore_result=True, flask_context=False)
+def noop_no_flask():
+    return None
+
+@celery.task(name='bench.noop_plain', ignore_result=True, base=Task)
+def noop_plain():
+    return None
+
+
+def measure(label, task, iterations, repeat=5):
+    tracer = build_tracer(task.name, task, app=celery, store_errors=False)
+    elapsed = float('inf')
+    for _ in range(repeat):
+        ids = [str(uuid.uuid4()) for _ in range(iterations)]
+        start = time.perf_counter()
+        for task_id in ids:
+            tracer(task_id, (), {}, {'id': task_id, 'delivery_info': {}})
+        elapsed = min(elapsed, time.perf_counter() - start)
+    print(f"{label:<28} {elapsed / iterations * 1e6:>8.1f} us/task  {iterations / elapsed:>10,.0f} tasks/sec")
+
+
+def main(iterations=20000):
+    app = create_worker_app(TestingConfig)
+    measure("context per task", noop, iterations)
+    with app.app_context() as context:
+        celery_app._worker_context = context
+        measure("process context", noop, iterations)
+        celery_app._worker_context = None
+    measure("flask_context=False", noop_no_flask, iterations)
+    measure("plain Task", noop_plain, iterations)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
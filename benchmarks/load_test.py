@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""Load test for POST /process/process_request: `flask run` vs. gunicorn.
+
+Starts each server on a free local port with the testing config (eager Celery,
+so no broker is needed), drives it with concurrent keep-alive clients and prints
+requests/sec and latency percentiles.
+
+Run from the repository root:
+    python -m benchmarks.load_test [--modes flask,gunicorn] [--concurrency 16] [--duration 10]
+"""
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAYLOAD = {"username": "loadtest", "age": 30}
+API_KEY = "load_test_key"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def server_command(mode, port, workers, threads):
+    if mode == 'flask':
+        return [sys.executable, '-m', 'flask', '--app', 'wsgi:app', 'run', '--port', str(port)]
+    return [
+        sys.executable, '-m', 'gunicorn', '--config', os.path.join(ROOT, 'app', 'gunicorn.conf.py'),
+        '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '--threads', str(threads),
+        'app.wsgi:app',
+    ]
+
+
+def wait_until_ready(url, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with status {process.returncode}")
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start in time")
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(int(len(sorted_values) * fraction), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def drive(url, concurrency, duration):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client():
+        session = requests.Session()
+        local = []
+        failed = 0
+        while time.monotonic() < stop_at:
+            start = time.perf_counter()
+            response = session.post(url, json=PAYLOAD, headers={"x-api-key": API_KEY})
+            local.append(time.perf_counter() - start)
+            if response.status_code != 202:
+                failed += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def run_mode(mode, args, key_dir):
+    port = free_port()
+    env = dict(os.environ)
+    env.update({
+        'PYTHONPATH': ROOT,
+        'FLASK_CONFIG': args.config,
+        'API_KEYS_DIR': key_dir,
+    })
+    process = subprocess.Popen(
+        server_command(mode, port, args.workers, args.threads), cwd=os.path.join(ROOT, 'app'), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        base = f"http://127.0.0.1:{port}"
+        wait_until_ready(f"{base}/docs", process)
+        return drive(f"{base}/process/process_request", args.concurrency, args.duration)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modes', default='flask,gunicorn')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--config', default='app.config.TestingConfig')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as key_dir:
+        os.mkdir(os.path.join(key_dir, API_KEY))
+        print(f"{'mode':<10} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+        for mode in args.modes.split(','):
+            result = run_mode(mode, args, key_dir)
+            print(f"{mode:<10} {result['requests']:>9} {result['errors']:>7} {result['rps']:>9.0f} "
+                  f"{result['p50_ms']:>8.1f} {result['p99_ms']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
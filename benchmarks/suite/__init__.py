@@ -0,0 +1,26 @@
+"""End-to-end benchmark suite for the web app, the broker and the workers.
+
+Each scenario drives POST /process/process_request with the payload fixtures
+in app/tests/test_files, from ``--concurrency`` closed-loop clients for
+``--duration`` seconds. A scenario is a target and a Celery mode:
+
+- inprocess: ``create_app`` called in this process, driven through Flask test
+  clients (one per client thread)
+- http: app.wsgi served by gunicorn on a local port, driven over keep-alive
+  HTTP connections
+- eager: tasks run inside the request (the testing config); no Redis needed
+- worker: tasks go through a local Redis to a real Celery worker started by
+  the suite; Redis comes from ``--redis-url`` or a ``redis-server`` on PATH
+
+Reported per scenario: req/s, p50/p95/p99 request latency, enqueue-to-complete
+time (request sent until the worker stored the result; worker mode only) and
+the peak RSS of every web and worker process. Results are written as JSON and
+can be compared against an earlier run with ``--baseline``; the run exits 1
+when a metric regressed by more than ``--tolerance``.
+
+Everything runs on 127.0.0.1, so no network access is needed.
+
+Run from the repository root:
+    python -m benchmarks.suite [--scenarios inprocess-eager,http-worker] [--concurrency 16]
+        [--duration 10] [--output results.json] [--baseline baseline.json]
+"""
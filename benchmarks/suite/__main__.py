@@ -0,0 +1,137 @@
+import argparse
+import os
+import sys
+import tempfile
+from contextlib import ExitStack
+from benchmarks.suite import __doc__ as SUITE_DOC
+from benchmarks.suite import results
+from benchmarks.suite.drive import API_KEY, completion_times, drive
+from benchmarks.suite.payloads import Payloads
+from benchmarks.suite.targets import (
+    ROOT, HttpTarget, InProcessTarget, Unavailable, base_environment, celery_worker, process_memory,
+    redis_server, redis_settings,
+)
+
+SCENARIOS = ('inprocess-eager', 'http-eager', 'inprocess-worker', 'http-worker')
+
+
+def inprocess_config(env, redis=None):
+    """The testing config (eager Celery) with the suite's settings; with ``redis``, tasks go to the worker."""
+    from app.config import TestingConfig
+    overrides = {
+        'API_KEYS_DIR': env['API_KEYS_DIR'],
+        'OUTPUT_DIR': env['OUTPUT_DIR'],
+        'RESULT_DIR': env['RESULT_DIR'],
+        'RATE_LIMIT_ENABLED': False,
+        'LOG_LEVEL': env['LOG_LEVEL'],
+    }
+    if redis is not None:
+        overrides.update(redis, CELERY_ALWAYS_EAGER=False, CELERY_STORE_EAGER_RESULT=False)
+    return type('BenchSuiteConfig', (TestingConfig,), overrides)
+
+
+def run_scenario(scenario, args, workdir, payloads):
+    target_name, celery_mode = scenario.split('-')
+    env = base_environment(workdir, args.log_level)
+    with ExitStack() as stack:
+        backend = worker = redis = None
+        if celery_mode == 'worker':
+            redis = redis_settings(stack.enter_context(redis_server(args.redis_url)))
+            env.update(redis)
+            env['FLASK_CONFIG'] = 'app.config.ProductionConfig'
+            worker = stack.enter_context(celery_worker(env, args.worker_concurrency, env['CELERY_BROKER_URL']))
+            from celery import Celery
+            backend = stack.enter_context(Celery(
+                'bench_suite_results', broker=env['CELERY_BROKER_URL'], backend=env['CELERY_RESULT_BACKEND'],
+                set_as_current=False,
+            )).backend
+        else:
+            env['FLASK_CONFIG'] = 'app.config.TestingConfig'
+
+        if target_name == 'inprocess':
+            target = InProcessTarget(inprocess_config(env, redis))
+        else:
+            target = HttpTarget(env, args.web_workers, args.web_threads)
+        stack.callback(target.close)
+
+        result, tasks = drive(target.make_client, payloads, args.concurrency, args.duration, args.warmup)
+        if backend is not None:
+            result.update(completion_times(backend, tasks, timeout=args.drain_timeout))
+        result["memory_mb"] = target.memory()
+        if worker is not None:
+            # The main worker process only consumes; tasks run in its pool children
+            result["memory_mb"]["worker"] = process_memory(worker.pid)["children"]
+        return result
+
+
+def fmt(value, width):
+    return f"{value:>{width}.1f}" if value is not None else f"{'-':>{width}}"
+
+
+def print_result(scenario, result):
+    if 'skipped' in result:
+        print(f"{scenario:<18} skipped: {result['skipped']}")
+        return
+    print(f"{scenario:<18} {result['requests']:>8} {result['errors']:>6} {result['rps']:>8.0f} "
+          f"{fmt(result['p50_ms'], 7)} {fmt(result['p95_ms'], 7)} {fmt(result['p99_ms'], 7)} "
+          f"{fmt(result.get('enqueue_to_complete_p50_ms'), 9)} {fmt(result.get('enqueue_to_complete_p95_ms'), 9)}")
+    for role, sizes in result["memory_mb"].items():
+        if sizes:
+            print(f"{'':<18} {role} RSS MiB: " + ', '.join(f"{size:.0f}" for size in sizes))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=SUITE_DOC.splitlines()[0], formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='comma-separated, from: ' + ', '.join(SCENARIOS))
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--warmup', type=float, default=1)
+    parser.add_argument('--web-workers', type=int, default=4)
+    parser.add_argument('--web-threads', type=int, default=4)
+    parser.add_argument('--worker-concurrency', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--redis-url', help='an existing local Redis; by default redis-server is started')
+    parser.add_argument('--drain-timeout', type=float, default=60,
+                        help='seconds to wait for queued tasks after the load stops')
+    parser.add_argument('--log-level', default='WARNING')
+    parser.add_argument('--output', default='benchmark-results.json')
+    parser.add_argument('--baseline', help='results file of an earlier run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='relative change counted as a regression (default 0.10)')
+    args = parser.parse_args(argv)
+
+    scenarios = [name for name in args.scenarios.split(',') if name]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    report = {"environment": results.environment(ROOT, vars(args)), "scenarios": {}}
+    payloads = Payloads()
+    print(f"{'scenario':<18} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7} "
+          f"{'e2c p50':>9} {'e2c p95':>9}")
+    with tempfile.TemporaryDirectory() as workdir:
+        os.makedirs(os.path.join(workdir, 'api_keys', API_KEY))
+        for scenario in scenarios:
+            try:
+                result = run_scenario(scenario, args, workdir, payloads)
+            except Unavailable as e:
+                result = {"skipped": str(e)}
+            report["scenarios"][scenario] = result
+            print_result(scenario, result)
+
+    results.save(args.output, report)
+    print(f"Results written to {args.output}")
+
+    if not args.baseline:
+        return 0
+    rows, regressed = results.compare(report, results.load(args.baseline), args.tolerance)
+    print(f"\nCompared with {args.baseline} (tolerance {args.tolerance:.0%}):")
+    for scenario, metric, old, new, change in rows:
+        flag = '  REGRESSED' if change < -args.tolerance else ''
+        print(f"{scenario:<18} {metric:<28} {old:>10.1f} -> {new:>10.1f}  {change:+.1%}{flag}")
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
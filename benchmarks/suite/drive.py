@@ -0,0 +1,119 @@
+"""Closed-loop load generation and latency statistics."""
+
+import collections
+import threading
+import time
+from datetime import datetime
+from benchmarks.load_test import percentile
+
+API_KEY = 'bench_suite_key'
+ENDPOINT = '/process/process_request'
+
+
+def latency_summary(latencies):
+    latencies = sorted(latencies)
+    if not latencies:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "mean_ms": None}
+    return {
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "mean_ms": sum(latencies) / len(latencies) * 1000,
+    }
+
+
+def drive(make_client, payloads, concurrency, duration, warmup=1.0):
+    """Run ``concurrency`` clients back to back for ``warmup`` + ``duration`` seconds.
+
+    ``make_client()`` is called once per thread and returns ``send(body)``,
+    which posts one request and returns ``(status_code, task_id or None)``.
+    Only requests started after the warmup are counted. Returns the summary and
+    ``(task_id, sent_at)`` for every accepted request, ``sent_at`` being wall
+    clock time so it can be compared with the result backend's ``date_done``.
+    """
+    latencies = []
+    statuses = collections.Counter()
+    tasks = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(concurrency + 1)
+    start_at = stop_at = None
+
+    def client():
+        send = make_client()
+        mine, codes, accepted = [], collections.Counter(), []
+        barrier.wait()
+        while True:
+            now = time.monotonic()
+            if now >= stop_at:
+                break
+            sent_at = time.time()
+            start = time.perf_counter()
+            status, task_id = send(payloads.next())
+            elapsed = time.perf_counter() - start
+            if now < start_at:
+                continue
+            mine.append(elapsed)
+            codes[status] += 1
+            if status == 202 and task_id:
+                accepted.append((task_id, sent_at))
+        with lock:
+            latencies.extend(mine)
+            statuses.update(codes)
+            tasks.extend(accepted)
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    start_at = time.monotonic() + warmup
+    stop_at = start_at + duration
+    barrier.wait()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start_at
+
+    return {
+        "requests": len(latencies),
+        "errors": len(latencies) - statuses[202],
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+        "rps": len(latencies) / elapsed,
+        **latency_summary(latencies),
+    }, tasks
+
+
+def _timestamp(value):
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return datetime.fromisoformat(value).timestamp()
+
+
+def completion_times(backend, tasks, timeout=60.0, poll_interval=0.2, max_samples=2000):
+    """Seconds from sending each request until the worker stored its result.
+
+    At most ``max_samples`` tasks, evenly spread over the run, are looked up.
+    Waits up to ``timeout`` seconds for the ones still queued when the load
+    stopped; those that do not finish in time are counted as ``incomplete``.
+    """
+    step = max(len(tasks) // max_samples, 1)
+    pending = dict(tasks[::step])
+    times = []
+    failed = 0
+    deadline = time.monotonic() + timeout
+    while pending and time.monotonic() < deadline:
+        for task_id, sent_at in list(pending.items()):
+            meta = backend.get_task_meta(task_id)
+            if meta.get('status') not in ('SUCCESS', 'FAILURE', 'REVOKED'):
+                continue
+            del pending[task_id]
+            if meta['status'] != 'SUCCESS':
+                failed += 1
+            elif meta.get('date_done'):
+                times.append(_timestamp(meta['date_done']) - sent_at)
+        if pending:
+            time.sleep(poll_interval)
+    summary = latency_summary(times)
+    return {
+        "completed": len(times),
+        "failed": failed,
+        "incomplete": len(pending),
+        **{f"enqueue_to_complete_{key}": value for key, value in summary.items()},
+    }
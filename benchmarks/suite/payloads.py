@@ -0,0 +1,41 @@
+"""Request bodies built from the fixtures in app/tests/test_files."""
+
+import glob
+import itertools
+import json
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+FIXTURES = os.path.join(ROOT, 'app', 'tests', 'test_files', 'test_payload_*_request.json')
+# The fixtures are written for the test_schema_* files; this makes every body a
+# valid process_request while the fixture keys still have to be parsed and stripped
+BASE = {"username": "bench", "age": 30}
+
+
+def load_fixtures(pattern=FIXTURES):
+    fixtures = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path) as file:
+            fixtures.append(json.load(file))
+    if not fixtures:
+        raise RuntimeError(f"No payload fixtures match {pattern}")
+    return fixtures
+
+
+class Payloads:
+    """Thread-safe source of encoded request bodies, cycling through the fixtures.
+
+    Each body gets a unique username, so idempotency's payload dedupe never
+    turns a request into a replay of an earlier task.
+    """
+
+    def __init__(self, fixtures=None):
+        self.fixtures = fixtures if fixtures is not None else load_fixtures()
+        self._cycle = itertools.cycle(self.fixtures)
+        self._counter = itertools.count()
+
+    def next(self):
+        # itertools objects advance atomically under the GIL
+        fixture = next(self._cycle)
+        number = next(self._counter)
+        return json.dumps({**fixture, **BASE, "username": f"bench-{number}"}).encode()
@@ -0,0 +1,73 @@
+"""Saving results as JSON and comparing them with a baseline run."""
+
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+# Metric -> True when higher is better
+COMPARED = {
+    'rps': True,
+    'p50_ms': False,
+    'p95_ms': False,
+    'p99_ms': False,
+    'enqueue_to_complete_p50_ms': False,
+    'enqueue_to_complete_p95_ms': False,
+}
+
+
+def git_revision(root):
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=root, capture_output=True, text=True)
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+def environment(root, args):
+    return {
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        "revision": git_revision(root),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "settings": args,
+    }
+
+
+def save(path, results):
+    with open(path, 'w') as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+        file.write('\n')
+
+
+def load(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def compare(current, baseline, tolerance):
+    """``(rows, regressed)``: one row per metric both runs have, and whether any got worse by more than ``tolerance``.
+
+    A row is ``(scenario, metric, baseline, current, change)``, ``change`` being
+    the relative difference with the sign flipped for lower-is-better metrics,
+    so a negative change is always a regression.
+    """
+    rows = []
+    regressed = False
+    for scenario, result in current['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(scenario)
+        if not before or 'skipped' in result or 'skipped' in before:
+            continue
+        for metric, higher_is_better in COMPARED.items():
+            old, new = before.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if not higher_is_better:
+                change = -change
+            rows.append((scenario, metric, old, new, change))
+            regressed = regressed or change < -tolerance
+    return rows, regressed
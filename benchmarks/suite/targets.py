@@ -0,0 +1,203 @@
+"""The processes under test: the web app, Redis and the Celery worker."""
+
+import os
+import shutil
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+import requests
+from benchmarks.load_test import free_port, server_command, wait_until_ready
+from benchmarks.suite.drive import API_KEY, ENDPOINT
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+WORKER_QUEUES = 'high,normal,low'
+
+
+class Unavailable(Exception):
+    """A scenario needs something this machine does not have, e.g. Redis."""
+
+
+def peak_rss_mb(pid):
+    """Peak resident set size of a process in MiB, from /proc (Linux only), or None."""
+    try:
+        with open(f'/proc/{pid}/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def child_pids(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as children:
+            return [int(child) for child in children.read().split()]
+    except OSError:
+        return []
+
+
+def process_memory(pid):
+    """``{"main": MiB, "children": [MiB, ...]}`` for a process and its direct children."""
+    children = [peak_rss_mb(child) for child in child_pids(pid)]
+    return {"main": peak_rss_mb(pid), "children": [rss for rss in children if rss is not None]}
+
+
+def redis_settings(redis_url):
+    """Environment for the app and worker so every Redis user points at ``redis_url``."""
+    base = redis_url.rstrip('/')
+    return {
+        'CELERY_BROKER_URL': f'{base}/0',
+        'CELERY_RESULT_BACKEND': f'{base}/1',
+        'CACHE_REDIS_URL': f'{base}/2',
+        'QUEUE_REDIS_URL': f'{base}/2',
+        'BROKER_STATS_REDIS_URL': f'{base}/0',
+        'IDEMPOTENCY_REDIS_URL': f'{base}/2',
+        'RATE_LIMIT_REDIS_URL': f'{base}/2',
+    }
+
+
+def base_environment(workdir, log_level):
+    env = dict(os.environ)
+    env.pop('PROMETHEUS_MULTIPROC_DIR', None)
+    env.update({
+        'PYTHONPATH': ROOT,
+        'PYTHONDONTWRITEBYTECODE': '1',
+        'API_KEYS_DIR': os.path.join(workdir, 'api_keys'),
+        'OUTPUT_DIR': workdir,
+        'RESULT_DIR': os.path.join(workdir, 'results'),
+        # The suite measures throughput; the per-key limits would cap it instead
+        'RATE_LIMIT_ENABLED': 'false',
+        'LOG_LEVEL': log_level,
+    })
+    return env
+
+
+@contextmanager
+def redis_server(redis_url=None):
+    """Yield the URL of a reachable Redis: ``redis_url``, or a throwaway redis-server on a free port."""
+    import redis
+    if redis_url:
+        try:
+            redis.Redis.from_url(redis_url, socket_connect_timeout=1).ping()
+        except redis.RedisError as e:
+            raise Unavailable(f"Redis at {redis_url} is not reachable: {e}")
+        yield redis_url
+        return
+    binary = shutil.which('redis-server')
+    if binary is None:
+        raise Unavailable("no --redis-url given and redis-server is not on PATH")
+    port = free_port()
+    process = subprocess.Popen(
+        [binary, '--port', str(port), '--bind', '127.0.0.1', '--save', '', '--appendonly', 'no'],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f'redis://127.0.0.1:{port}'
+    try:
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                redis.Redis.from_url(url, socket_connect_timeout=1).ping()
+                break
+            except redis.ConnectionError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    raise Unavailable("redis-server did not start")
+                time.sleep(0.1)
+        yield url
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+@contextmanager
+def celery_worker(env, concurrency, broker_url):
+    """Run the production worker entry point (celery/tasks.py) until the block exits."""
+    from celery import Celery
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'celery', '-A', 'tasks', 'worker', '-Q', WORKER_QUEUES,
+         '--concurrency', str(concurrency), '--loglevel', 'WARNING', '--without-gossip', '--without-mingle'],
+        cwd=os.path.join(ROOT, 'celery'), env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    control = Celery('bench_suite_control', broker=broker_url, set_as_current=False)
+    try:
+        deadline = time.monotonic() + 60
+        while not control.control.ping(timeout=1):
+            if process.poll() is not None:
+                raise RuntimeError(f"celery worker exited with status {process.returncode}")
+            if time.monotonic() > deadline:
+                raise RuntimeError("celery worker did not start in time")
+        yield process
+    finally:
+        process.terminate()
+        process.wait(timeout=60)
+        control.close()
+
+
+class InProcessTarget:
+    """``create_app(config)`` in this process, driven through one test client per thread."""
+
+    name = 'inprocess'
+
+    def __init__(self, config):
+        from app.main import create_app
+        self.app = create_app(config)
+
+    def make_client(self):
+        client = self.app.test_client()
+        headers = {"x-api-key": API_KEY, "Content-Type": "application/json"}
+
+        def send(body):
+            response = client.post(ENDPOINT, data=body, headers=headers)
+            task_id = response.get_json(silent=True) or {}
+            return response.status_code, task_id.get("task_id")
+
+        return send
+
+    def memory(self):
+        return {"web": [peak_rss_mb(os.getpid())]}
+
+    def close(self):
+        pass
+
+
+class HttpTarget:
+    """app.wsgi under gunicorn on a free local port, driven over keep-alive connections."""
+
+    name = 'http'
+
+    def __init__(self, env, workers, threads):
+        port = free_port()
+        self.base = f'http://127.0.0.1:{port}'
+        self.process = subprocess.Popen(
+            server_command('gunicorn', port, workers, threads), cwd=os.path.join(ROOT, 'app'), env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_until_ready(f'{self.base}/docs', self.process)
+        except Exception:
+            self.close()
+            raise
+
+    def make_client(self):
+        session = requests.Session()
+        session.headers.update({"x-api-key": API_KEY, "Content-Type": "application/json"})
+        url = self.base + ENDPOINT
+
+        def send(body):
+            response = session.post(url, data=body)
+            try:
+                task_id = response.json().get("task_id")
+            except ValueError:
+                task_id = None
+            return response.status_code, task_id
+
+        return send
+
+    def memory(self):
+        # gunicorn's workers are the master's children
+        return {"web": process_memory(self.process.pid)["children"]}
+
+    def close(self):
+        self.process.terminate()
+        self.process.wait(timeout=30)
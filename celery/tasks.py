@@ -3,8 +3,8 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-@celery.task(name='app.main.process_task')
-def process_task(data):
-    # Placeholder for processing logic
-    logger.debug(f"Processing task with data: {data}")
-    pass
+# The worker runs the same process_task as the web app, including webhook delivery
+from app.tasks import process_task  # noqa: E402,F401
+# app.tasks defers this import for the web process; load it at boot here so
+# the first task doesn't pay for it
+import app.webhooks  # noqa: E402,F401
@@ -1,11 +1,19 @@
 #!/usr/bin/env python3
 
+import argparse
+import glob
+import hashlib
 import json
 import re
 import sys
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from jsonschema import Draft7Validator
 
+DEFAULT_OUTPUT_DIRECTORY = os.path.join(os.path.dirname(__file__), '../app/tests/test_files')
+MANIFEST_NAME = '.json_to_jsonschema_manifest.json'
+
 def infer_type(value):
     """Infers the JSON Schema type for a given value."""
     if value == "text" or value == "url":
@@ -23,8 +31,12 @@ def infer_type(value):
     else:
         return "null"
 
-def generate_property_schema(property, is_required):
-    """Generates a JSON Schema for a single property."""
+def generate_property_schema(property, is_required, pending=None):
+    """Generates a JSON Schema for a single property.
+
+    A collection's ``spec`` is converted by ``generate_schema``; when ``pending``
+    is given it is queued there instead (see ``_object_schema``).
+    """
     schema = {
         "type": infer_type(property.get("type", "string"))
     }
@@ -44,45 +56,46 @@ def generate_property_schema(property, is_required):
                 ]
             }
     if property.get("type") == "collection" and "spec" in property:
-        schema = generate_schema(property["spec"], is_required)
+        if pending is None:
+            return generate_schema(property["spec"], is_required)
+        schema = {}
+        pending.append((property["spec"], is_required, schema))
     return schema
 
-def generate_schema(json_data, is_parent_required=False):
-    """Generates a JSON Schema for the provided JSON data."""
+def _property_schema(item, is_required, pending):
+    """Schema for one entry of a spec; nested specs are queued on ``pending``."""
+    if "grouped" in item and item["grouped"]:
+        nested = item.get("properties", [])
+    elif item.get("type") == "collection" and "spec" in item:
+        nested = item.get("spec", [])
+    elif item.get("type") == "array" and "items" in item:
+        if not isinstance(item["items"], list):
+            return {"type": "array", "items": generate_property_schema(item["items"], is_required, pending)}
+        items = {}
+        pending.append((item["items"], is_required, items))
+        return {"type": "array", "items": items}
+    else:
+        return generate_property_schema(item, is_required, pending)
+    schema = {}
+    pending.append((nested, is_required, schema))
+    return schema
+
+def _object_schema(json_data, is_parent_required, pending):
+    """Schema for one level of a spec: a list of named entries or a dict of them.
+
+    Nested specs are not recursed into. Each gets an empty placeholder dict in
+    the result and ``(spec, is_required, placeholder)`` is appended to
+    ``pending``, to be filled in by the caller.
+    """
     if isinstance(json_data, list):
         if not json_data:
             return {"type": "array", "items": {}}
-        if isinstance(json_data[0], dict):
-            schema = {
-                "type": "object",
-                "properties": {},
-                "required": []
-            }
-            for item in json_data:
-                if not isinstance(item, dict):
-                    raise TypeError(f"Expected each item in json_data to be a dictionary, but got {type(item)}. Content: {item}")
-                property_name = item["name"]
-                is_required = item.get("required", is_parent_required)
-                if "grouped" in item and item["grouped"]:
-                    schema["properties"][property_name] = generate_schema(item.get("properties", []), is_required)
-                elif item.get("type") == "collection" and "spec" in item:
-                    schema["properties"][property_name] = generate_schema(item.get("spec", []), is_required)
-                elif item.get("type") == "array" and "items" in item:
-                    schema["properties"][property_name] = {
-                        "type": "array",
-                        "items": generate_schema(item.get("items", []), is_required) if isinstance(item["items"], list) else generate_property_schema(item["items"], is_required)
-                    }
-                else:
-                    schema["properties"][property_name] = generate_property_schema(item, is_required)
-                if is_required:
-                    schema["required"].append(property_name)
-            if not schema["required"]:
-                del schema["required"]
-            return schema
-        else:
+        if not isinstance(json_data[0], dict):
             raise TypeError(f"Expected first item in json_data list to be a dictionary, but got {type(json_data[0])}. Content: {json_data[0]}")
-    
-    if not isinstance(json_data, dict):
+        entries = ((None, item) for item in json_data)
+    elif isinstance(json_data, dict):
+        entries = json_data.items()
+    else:
         raise TypeError(f"Expected json_data to be a dictionary or list of dictionaries, but got {type(json_data)}. Content: {json_data}")
 
     schema = {
@@ -90,29 +103,31 @@ def generate_schema(json_data, is_parent_required=False):
         "properties": {},
         "required": []
     }
-
-    for key, item in json_data.items():
+    for property_name, item in entries:
         if not isinstance(item, dict):
             raise TypeError(f"Expected each item in json_data to be a dictionary, but got {type(item)}. Content: {item}")
-        property_name = key
+        if property_name is None:
+            property_name = item["name"]
         is_required = item.get("required", is_parent_required)
-        if "grouped" in item and item["grouped"]:
-            schema["properties"][property_name] = generate_schema(item.get("properties", []), is_required)
-        elif item.get("type") == "collection" and "spec" in item:
-            schema["properties"][property_name] = generate_schema(item.get("spec", []), is_required)
-        elif item.get("type") == "array" and "items" in item:
-            schema["properties"][property_name] = {
-                "type": "array",
-                "items": generate_schema(item.get("items", []), is_required) if isinstance(item["items"], list) else generate_property_schema(item["items"], is_required)
-            }
-        else:
-            schema["properties"][property_name] = generate_property_schema(item, is_required)
+        schema["properties"][property_name] = _property_schema(item, is_required, pending)
         if is_required:
             schema["required"].append(property_name)
-
     if not schema["required"]:
         del schema["required"]
+    return schema
+
+def generate_schema(json_data, is_parent_required=False):
+    """Generates a JSON Schema for the provided JSON data.
 
+    Nested ``collection``/``spec`` and grouped trees are converted from a work
+    list rather than by recursion, so nesting depth is not bounded by the
+    interpreter's recursion limit.
+    """
+    pending = []
+    schema = _object_schema(json_data, is_parent_required, pending)
+    while pending:
+        nested, is_required, placeholder = pending.pop()
+        placeholder.update(_object_schema(nested, is_required, pending))
     return schema
 
 def convert_to_jsonschema(json_data):
@@ -123,6 +138,82 @@ def convert_to_jsonschema(json_data):
     schema.update(generate_schema(json_data))
     return schema
 
+_SCHEMA_MAPS = ("properties", "patternProperties", "definitions")
+_SCHEMA_VALUES = ("items", "additionalItems", "additionalProperties", "contains", "propertyNames",
+                  "not", "if", "then", "else")
+_SCHEMA_LISTS = ("items", "allOf", "anyOf", "oneOf")
+
+def _split_schema(schema):
+    """``schema`` with the schemas nested in it replaced by ``{}``, and those nested schemas."""
+    shallow = dict(schema)
+    children = []
+    for keyword in _SCHEMA_MAPS:
+        if isinstance(schema.get(keyword), dict):
+            children.extend(schema[keyword].values())
+            shallow[keyword] = {name: {} for name in schema[keyword]}
+    for keyword in _SCHEMA_VALUES:
+        if isinstance(schema.get(keyword), dict):
+            children.append(schema[keyword])
+            shallow[keyword] = {}
+    for keyword in _SCHEMA_LISTS:
+        if isinstance(schema.get(keyword), list):
+            children.extend(schema[keyword])
+            shallow[keyword] = [{} for _ in schema[keyword]]
+    return shallow, children
+
+def check_schema(schema):
+    """``Draft7Validator.check_schema`` that also works on schemas nested too deeply for it.
+
+    The metaschema applies the same rules at every level, so when the whole
+    check runs out of stack each subschema is checked on its own instead.
+    """
+    try:
+        Draft7Validator.check_schema(schema)
+        return
+    except RecursionError:
+        pass
+    stack = [schema]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            node, children = _split_schema(node)
+            stack.extend(children)
+        Draft7Validator.check_schema(node)
+
+def dumps_schema(schema, indent=2):
+    """``json.dumps(schema, indent=indent)`` without recursion, for arbitrarily deep schemas."""
+    parts = []
+    # Each frame: (iterator over the container's items, is_dict, depth, first item still to come)
+    stack = []
+
+    def open_value(value, depth):
+        if isinstance(value, dict) and value:
+            parts.append("{")
+            stack.append([iter(value.items()), True, depth + 1, True])
+        elif isinstance(value, list) and value:
+            parts.append("[")
+            stack.append([iter(value), False, depth + 1, True])
+        else:
+            parts.append(json.dumps(value))
+
+    open_value(schema, 0)
+    while stack:
+        frame = stack[-1]
+        iterator, is_dict, depth, first = frame
+        item = next(iterator, frame)
+        if item is frame:
+            stack.pop()
+            parts.append("\n" + " " * (indent * (depth - 1)) + ("}" if is_dict else "]"))
+            continue
+        parts.append(("" if first else ",") + "\n" + " " * (indent * depth))
+        frame[3] = False
+        if is_dict:
+            key, item = item
+            # Non-string keys are written the way json.dumps writes them
+            parts.append(json.dumps(key if isinstance(key, str) else json.dumps(key)) + ": ")
+        open_value(item, depth)
+    return "".join(parts)
+
 def validate_filename(name):
     """Validates the filename and type according to the specified rules."""
     if not re.match(r'^\w+$', name):
@@ -141,7 +232,7 @@ def main(input_filename, file_type):
     validate_filename(file_type)
 
     #output_directory = os.path.join(os.path.dirname(__file__), '../app/json_schemas')
-    output_directory = os.path.join(os.path.dirname(__file__), '../app/tests/test_files')
+    output_directory = DEFAULT_OUTPUT_DIRECTORY
     os.makedirs(output_directory, exist_ok=True)
     output_filename = os.path.join(output_directory, f"{base_name}_{file_type}.json")
 
@@ -165,7 +256,7 @@ def main(input_filename, file_type):
 
     # Validate generated schema to ensure it is correct
     try:
-        Draft7Validator.check_schema(json_schema)
+        check_schema(json_schema)
         print("Generated JSON Schema is valid.")
     except Exception as e:
         print("Generated JSON Schema is invalid.")
@@ -173,22 +264,184 @@ def main(input_filename, file_type):
         sys.exit(1)
 
     with open(output_filename, 'w') as f:
-        json.dump(json_schema, f, indent=2)
+        f.write(dumps_schema(json_schema))
 
     relative_output_path = os.path.relpath(output_filename)
     print(relative_output_path)
 
+# Batch mode
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+# Outputs are regenerated for every input when this script changes
+GENERATOR_VERSION = sha256_file(__file__)[:12]
+
+def write_atomically(path, content):
+    tmp = f"{path}.tmp-{os.getpid()}"
+    try:
+        with open(tmp, 'w') as f:
+            f.write(content)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+def expand_inputs(source):
+    """The .json files in a directory, or the files matching a glob, sorted."""
+    if os.path.isdir(source):
+        paths = glob.glob(os.path.join(source, '*.json'))
+    else:
+        paths = glob.glob(source, recursive=True)
+    return sorted(os.path.abspath(path) for path in paths if os.path.isfile(path))
+
+def output_path_for(input_path, file_type, output_directory):
+    base_name = validate_input_filename(os.path.basename(input_path))
+    return os.path.join(output_directory, f"{base_name}_{file_type}.json")
+
+def convert_file(input_path, output_path):
+    """Convert one spec file; runs in a worker process.
+
+    The schema is only checked and written when it differs from the existing
+    output. Returns the outcome as a dict for the manifest and report.
+    """
+    result = {"input": input_path, "output": output_path}
+    try:
+        with open(input_path, 'rb') as f:
+            content = f.read()
+        result["input_sha256"] = hashlib.sha256(content).hexdigest()
+        output = dumps_schema(convert_to_jsonschema(json.loads(content)))
+        encoded = output.encode()
+        result["output_sha256"] = hashlib.sha256(encoded).hexdigest()
+        try:
+            with open(output_path, 'rb') as f:
+                unchanged = f.read() == encoded
+        except FileNotFoundError:
+            unchanged = False
+        if unchanged:
+            result["status"] = "unchanged"
+            return result
+        check_schema(json.loads(output))
+        write_atomically(output_path, output)
+        result["status"] = "converted"
+    except Exception as e:
+        result.update(status="failed", error=f"{type(e).__name__}: {e}")
+    return result
+
+def load_manifest(path):
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return {}
+    # Outputs from another version of this script may differ; rebuild them all
+    if manifest.get("generator") != GENERATOR_VERSION:
+        return {}
+    return manifest.get("files", {})
+
+def is_up_to_date(entry, input_sha256, output_path):
+    if not entry or entry.get("input_sha256") != input_sha256 or entry.get("output") != output_path:
+        return False
+    try:
+        return sha256_file(output_path) == entry.get("output_sha256")
+    except FileNotFoundError:
+        return False
+
+def run_batch(source, file_type, output_directory=DEFAULT_OUTPUT_DIRECTORY, jobs=None, manifest_path=None, force=False):
+    """Convert every spec matching ``source``, skipping the ones unchanged since the last run.
+
+    Inputs are skipped when their content hash and their output still match the
+    manifest (``<output_directory>/.json_to_jsonschema_manifest.json`` by
+    default). The rest are converted on a pool of ``jobs`` processes. Returns
+    the summary report.
+    """
+    validate_filename(file_type)
+    started = time.perf_counter()
+    output_directory = os.path.abspath(output_directory)
+    os.makedirs(output_directory, exist_ok=True)
+    manifest_path = manifest_path or os.path.join(output_directory, MANIFEST_NAME)
+    files = {} if force else load_manifest(manifest_path)
+
+    results = []
+    todo = []
+    for input_path in expand_inputs(source):
+        try:
+            output_path = output_path_for(input_path, file_type, output_directory)
+        except ValueError as e:
+            results.append({"input": input_path, "status": "failed", "error": str(e)})
+            continue
+        input_sha256 = sha256_file(input_path)
+        if is_up_to_date(files.get(input_path), input_sha256, output_path):
+            results.append({"input": input_path, "output": output_path, "status": "skipped"})
+        else:
+            todo.append((input_path, output_path))
+
+    jobs = jobs or os.cpu_count() or 1
+    if jobs > 1 and len(todo) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(todo))) as pool:
+            results.extend(pool.map(convert_file, *zip(*todo), chunksize=max(len(todo) // (jobs * 4), 1)))
+    else:
+        results.extend(convert_file(input_path, output_path) for input_path, output_path in todo)
+
+    for result in results:
+        if result["status"] in ("converted", "unchanged"):
+            files[result["input"]] = {key: result[key] for key in ("input_sha256", "output", "output_sha256")}
+        elif result["status"] == "failed":
+            # Retried on the next run
+            files.pop(result["input"], None)
+    write_atomically(manifest_path, json.dumps({"generator": GENERATOR_VERSION, "files": files}, indent=2, sort_keys=True))
+
+    counts = {status: 0 for status in ("converted", "unchanged", "skipped", "failed")}
+    for result in results:
+        counts[result["status"]] += 1
+    return {
+        "source": source,
+        "total": len(results),
+        **counts,
+        "failures": [{"input": r["input"], "error": r["error"]} for r in results if r["status"] == "failed"],
+        "elapsed_s": round(time.perf_counter() - started, 3),
+    }
+
+def print_report(report):
+    print(f"{report['total']} specs from {report['source']} in {report['elapsed_s']:.2f}s: "
+          f"{report['converted']} converted, {report['unchanged']} unchanged, "
+          f"{report['skipped']} skipped, {report['failed']} failed")
+    for failure in report["failures"]:
+        print(f"  {failure['input']}: {failure['error']}")
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        usage="%(prog)s <input_filename> <type>\n       %(prog)s --batch <directory|glob> <type> [options]",
+        description="Convert Make.com-style module specs to JSON Schema.",
+    )
+    parser.add_argument("input", help="spec file, or with --batch a directory or glob of spec files")
+    parser.add_argument("type", help="suffix of the output name, e.g. request")
+    parser.add_argument("--batch", action="store_true",
+                        help="convert many files in parallel without prompting, skipping unchanged ones")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIRECTORY)
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--manifest", help=f"content-hash manifest (default: <output-dir>/{MANIFEST_NAME})")
+    parser.add_argument("--force", action="store_true", help="ignore the manifest and convert everything")
+    parser.add_argument("--report", help="also write the summary report to this JSON file")
+    return parser.parse_args(argv)
+
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: ./json-to-jsonschema.py <input_filename> <type>")
-        sys.exit(1)
+    args = parse_args(sys.argv[1:])
 
-    input_filename = sys.argv[1]
-    file_type = sys.argv[2]
+    if args.batch:
+        report = run_batch(args.input, args.type, args.output_dir, args.jobs, args.manifest, args.force)
+        print_report(report)
+        if args.report:
+            write_atomically(args.report, json.dumps(report, indent=2))
+        sys.exit(1 if report["failed"] else 0)
 
-    if not os.path.exists(input_filename):
-        print(f"Error: File {input_filename} does not exist.")
+    if not os.path.exists(args.input):
+        print(f"Error: File {args.input} does not exist.")
         sys.exit(1)
 
-    main(input_filename, file_type)
-
+    main(args.input, args.type)
@@ -1,13 +1,25 @@
 #!/usr/bin/env python3
 
+import argparse
+import collections
+import csv
+import glob
+import io
 import json
-import sys
 import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from jsonschema import validate, ValidationError, SchemaError
+from jsonschema.validators import validator_for
+
+SCHEMA_DIRECTORY = os.path.join(os.path.dirname(__file__), '../app/json_schemas')
+NDJSON_SUFFIXES = ('.ndjson', '.jsonl')
+DEFAULT_CHUNK_SIZE = 2000
 
 def validate_json_payload(schema_filename, payload_filename):
-    schema_directory = os.path.join(os.path.dirname(__file__), '../app/json_schemas')
-    schema_filepath = os.path.join(schema_directory, schema_filename)
+    schema_filepath = os.path.join(SCHEMA_DIRECTORY, schema_filename)
 
     if not os.path.exists(schema_filepath):
         print(f"Error: Schema file {schema_filepath} does not exist.")
@@ -36,13 +48,214 @@ def validate_json_payload(schema_filename, payload_filename):
         print(f"Schema error: {e.message}")
         sys.exit(1)
 
-if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: ./validate_json_payload.py <schema_filename> <payload_filename>")
-        sys.exit(1)
+# Bulk mode
+
+def load_schema(schema):
+    """A schema file name in app/json_schemas, or a path to one."""
+    schema_filepath = schema if os.path.exists(schema) else os.path.join(SCHEMA_DIRECTORY, schema)
+    with open(schema_filepath, 'r') as schema_file:
+        return json.load(schema_file)
+
+def expand_sources(source):
+    """Payload files from a file, a directory or a glob, sorted. '-' is stdin."""
+    if source == '-' or os.path.isfile(source):
+        return [source]
+    if os.path.isdir(source):
+        paths = [os.path.join(source, name) for name in os.listdir(source)]
+    else:
+        paths = glob.glob(source, recursive=True)
+    return sorted(path for path in paths if os.path.isfile(path) and path.endswith(('.json',) + NDJSON_SUFFIXES))
+
+def expand_all(sources):
+    paths = []
+    for source in sources:
+        expanded = expand_sources(source)
+        if not expanded:
+            raise FileNotFoundError(f"No payload files match {source}")
+        paths.extend(expanded)
+    return paths
+
+def iter_records(paths):
+    """Yield ``(source, line, text)`` for every record: each NDJSON line, or each whole .json file.
+
+    Files are read line by line, so NDJSON input of any size is streamed.
+    """
+    for path in paths:
+        if path == '-':
+            yield from _iter_lines('<stdin>', sys.stdin)
+        elif path.endswith(NDJSON_SUFFIXES):
+            with open(path, 'r') as lines:
+                yield from _iter_lines(path, lines)
+        else:
+            with open(path, 'r') as payload_file:
+                yield path, None, payload_file.read()
+
+def _iter_lines(source, lines):
+    for number, line in enumerate(lines, 1):
+        if line.strip():
+            yield source, number, line
+
+def iter_chunks(records, chunk_size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+# One compiled validator per worker process, built by the pool initializer
+_validator = None
+
+def init_worker(schema):
+    global _validator
+    cls = validator_for(schema)
+    cls.check_schema(schema)
+    _validator = cls(schema)
 
-    schema_filename = sys.argv[1]
-    payload_filename = sys.argv[2]
+def _aggregate_path(path):
+    # Array positions differ per record; count $.items[3].id and $.items[7].id together
+    return re.sub(r'\[\d+\]', '[*]', path)
+
+def validate_chunk(chunk):
+    """Validate one chunk of records; runs in a worker process.
+
+    Returns ``(records, invalid, parse_errors, counts, failures)`` where
+    ``counts`` maps ``(path, keyword)`` to the number of errors and
+    ``failures`` lists every error of every invalid record.
+    """
+    counts = collections.Counter()
+    failures = []
+    invalid = parse_errors = 0
+    for source, line, text in chunk:
+        try:
+            payload = json.loads(text)
+        except ValueError as e:
+            parse_errors += 1
+            errors = [{"path": "$", "keyword": "json", "message": str(e)}]
+        else:
+            errors = [
+                {"path": error.json_path, "keyword": error.validator, "message": error.message}
+                for error in _validator.iter_errors(payload)
+            ]
+            if not errors:
+                continue
+            invalid += 1
+        for error in errors:
+            counts[(_aggregate_path(error["path"]), error["keyword"])] += 1
+        failures.append({"source": source, "line": line, "errors": errors})
+    return len(chunk), invalid, parse_errors, counts, failures
+
+def run_bulk(schema, sources, jobs=None, chunk_size=DEFAULT_CHUNK_SIZE, on_failure=None):
+    """Validate every record in ``sources`` against ``schema`` on a pool of ``jobs`` processes.
+
+    Chunks are submitted as the input is read, with at most two per worker in
+    flight, so memory stays flat however large the input is. ``on_failure`` is
+    called with each invalid record's errors, in input order. Returns the
+    aggregated report.
+    """
+    started = time.perf_counter()
+    jobs = jobs or os.cpu_count() or 1
+    records = invalid = parse_errors = 0
+    counts = collections.Counter()
+
+    def collect(result):
+        nonlocal records, invalid, parse_errors
+        chunk_records, chunk_invalid, chunk_parse_errors, chunk_counts, failures = result
+        records += chunk_records
+        invalid += chunk_invalid
+        parse_errors += chunk_parse_errors
+        counts.update(chunk_counts)
+        if on_failure is not None:
+            for failure in failures:
+                on_failure(failure)
+
+    chunks = iter_chunks(iter_records(expand_all(sources)), chunk_size)
+    if jobs == 1:
+        init_worker(schema)
+        for chunk in chunks:
+            collect(validate_chunk(chunk))
+    else:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=(schema,)) as pool:
+            in_flight = collections.deque()
+            for chunk in chunks:
+                in_flight.append(pool.submit(validate_chunk, chunk))
+                if len(in_flight) >= jobs * 2:
+                    collect(in_flight.popleft().result())
+            while in_flight:
+                collect(in_flight.popleft().result())
+
+    elapsed = time.perf_counter() - started
+    return {
+        "records": records,
+        "valid": records - invalid - parse_errors,
+        "invalid": invalid,
+        "parse_errors": parse_errors,
+        "errors": [
+            {"path": path, "keyword": keyword, "count": count}
+            for (path, keyword), count in sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+        ],
+        "elapsed_s": round(elapsed, 3),
+        "records_per_s": round(records / elapsed, 1) if elapsed else None,
+    }
+
+def format_report(report, fmt):
+    if fmt == 'json':
+        return json.dumps(report, indent=2) + '\n'
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(["path", "keyword", "count"])
+    for row in report["errors"]:
+        writer.writerow([row["path"], row["keyword"], row["count"]])
+    return output.getvalue()
+
+def bulk_main(args):
+    schema = load_schema(args.schema)
+    errors_file = open(args.errors, 'w') if args.errors else None
+    try:
+        on_failure = (lambda failure: errors_file.write(json.dumps(failure) + '\n')) if errors_file else None
+        report = run_bulk(schema, args.payloads, args.jobs, args.chunk_size, on_failure)
+    finally:
+        if errors_file:
+            errors_file.close()
+
+    text = format_report(report, args.format)
+    if args.report:
+        with open(args.report, 'w') as report_file:
+            report_file.write(text)
+    else:
+        sys.stdout.write(text)
+    print(f"{report['records']} records in {report['elapsed_s']:.2f}s ({report['records_per_s'] or 0:,.0f}/s): "
+          f"{report['valid']} valid, {report['invalid']} invalid, {report['parse_errors']} unparseable",
+          file=sys.stderr)
+    return 1 if report['invalid'] or report['parse_errors'] else 0
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        usage="%(prog)s <schema_filename> <payload_filename>\n"
+              "       %(prog)s --bulk <schema> <ndjson|directory|glob> [...] [options]",
+        description="Validate payloads against a JSON schema from app/json_schemas (or a path).",
+    )
+    parser.add_argument("schema")
+    parser.add_argument("payloads", nargs='+',
+                        help="payload file, or with --bulk NDJSON files, directories or globs ('-' for stdin)")
+    parser.add_argument("--bulk", action="store_true",
+                        help="validate every record, reporting all errors instead of stopping at the first")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="records sent to a worker at a time")
+    parser.add_argument("--format", choices=("json", "csv"), default="json", help="format of the aggregated report")
+    parser.add_argument("--report", help="write the aggregated report here instead of stdout")
+    parser.add_argument("--errors", help="write every invalid record's errors here as NDJSON")
+    args = parser.parse_args(argv)
+    if not args.bulk and len(args.payloads) != 1:
+        parser.error("validating several payloads needs --bulk")
+    return args
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
 
-    validate_json_payload(schema_filename, payload_filename)
+    if args.bulk:
+        sys.exit(bulk_main(args))
 
+    validate_json_payload(args.schema, args.payloads[0])